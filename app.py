@@ -1,18 +1,55 @@
-from flask import Flask
+import base64
+import binascii
+import bisect
+import csv
+import functools
+import gzip
+import hashlib
+import heapq
+import html
+import io
+import json
+import math
+import operator
+import os
+import queue
+import re
+import secrets
+import signal
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+import brotli
+import click
+import numpy as np
+import orjson
+from flask import Flask, request, jsonify, session, g, Response, send_file
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from PIL import Image, ImageOps
+from werkzeug.http import parse_accept_header
+from werkzeug.security import generate_password_hash, check_password_hash
 
 # 1. First create the Flask application
 app = Flask(__name__)
 
-# 2. Then configure CORS
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost:3000"],  # Your frontend URL
-        "methods": ["GET", "POST", "PUT", "DELETE"],
-        "allow_headers": ["Content-Type", "Authorization"],
-        "supports_credentials": True
-    }
-})
+# 2. Then configure CORS (asgi.py applies the same policy to its native routes)
+API_CORS = {
+    "origins": ["http://localhost:3000"],  # Your frontend URL
+    "methods": ["GET", "POST", "PUT", "DELETE"],
+    "allow_headers": ["Content-Type", "Authorization"],
+    # Paged listings carry the next page in headers the browser must expose
+    "expose_headers": ["X-Next-Cursor", "Link", "ETag"],
+    "supports_credentials": True
+}
+CORS(app, resources={r"/api/*": API_CORS})
 
 # Your routes go here
 @app.route('/')
@@ -21,119 +58,3940 @@ def home():
 
 # Database and other configurations...
 
-if __name__ == '__main__':
-    app.run(debug=True)
-    import secrets
-app.secret_key = secrets.token_hex(32)  # For session security
+# Sessions are signed with SECRET_KEY; set it when running more than one
+# worker process, or each one signs with its own random key
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+
+# Database setup
+DATABASE = 'skill_swap.db'
+
+# Connection tuning, applied once when a pooled connection is opened
+DB_POOL_SIZE = 8
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 16384
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_STATEMENT_CACHE_SIZE = 256
+
+def init_db():
+    """Initialize the database, applying any pending schema migrations"""
+    conn = connect_db()
+    migrate_db(conn)
+    
+    # Create default admin user
+    conn.execute('''
+        INSERT OR IGNORE INTO users (name, email, password_hash, is_admin)
+        VALUES ('Admin', 'admin@skillswap.com', ?, 1)
+    ''', (generate_password_hash('admin123', PASSWORD_HASH_METHOD),))
+    
+    conn.commit()
+    conn.close()
+
+# Schema migrations. Each entry upgrades the schema by one version; the
+# current version is tracked in PRAGMA user_version. Databases created
+# before versioning report version 0, so every step must tolerate objects
+# that already exist.
+def migration_base_schema(conn):
+    """Users and swap requests tables"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            location TEXT,
+            profile_photo TEXT,
+            skills_offered TEXT,
+            skills_wanted TEXT,
+            availability TEXT,
+            is_public BOOLEAN DEFAULT 1,
+            is_admin BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS swap_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_user_id INTEGER NOT NULL,
+            to_user_id INTEGER NOT NULL,
+            my_skill TEXT NOT NULL,
+            wanted_skill TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            rating INTEGER,
+            feedback TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (from_user_id) REFERENCES users (id),
+            FOREIGN KEY (to_user_id) REFERENCES users (id)
+        )
+    ''')
+
+def migration_skill_tables(conn):
+    """Normalized skills with a skill -> user index, backfilled from the CSV columns"""
+    needs_backfill = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_skills'"
+    ).fetchone() is None
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS skills (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL COLLATE NOCASE
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_skills (
+            user_id INTEGER NOT NULL,
+            skill_id INTEGER NOT NULL,
+            direction TEXT NOT NULL CHECK (direction IN ('offered', 'wanted')),
+            position INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, direction, skill_id),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (skill_id) REFERENCES skills (id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Inverted index: skill -> users, used by the skill filter on /api/users
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_skills_skill
+        ON user_skills (skill_id, direction, user_id)
+    ''')
+    
+    if needs_backfill:
+        migrate_csv_skills(conn)
+
+def migration_stats_counters(conn):
+    """Trigger-maintained dashboard statistics"""
+    needs_rebuild = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_counters'"
+    ).fetchone() is None
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS swap_daily_counts (
+            day TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, status)
+        ) WITHOUT ROWID
+    ''')
+    
+    for statement in STATS_TRIGGERS:
+        conn.execute(statement)
+    
+    if needs_rebuild:
+        rebuild_stats(conn)
+
+def migration_access_path_indexes(conn):
+    """Indexes behind the swap request and user listing queries"""
+    # Inbox listings: WHERE from/to_user_id = ? ORDER BY created_at, id.
+    # The rowid is the implicit last column, so these also cover the id tiebreak.
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_swap_requests_from
+        ON swap_requests (from_user_id, created_at)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_swap_requests_to
+        ON swap_requests (to_user_id, created_at)
+    ''')
+    # Duplicate check in create_swap_request, answered from the index alone
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_swap_requests_pending
+        ON swap_requests (from_user_id, to_user_id) WHERE status = 'pending'
+    ''')
+    # Admin listing of every request, newest first
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_swap_requests_created
+        ON swap_requests (created_at)
+    ''')
+    # Browse and admin user listings, newest first
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_public_created
+        ON users (is_public, created_at)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_admin_created
+        ON users (is_admin, created_at)
+    ''')
+
+def migration_resource_versions(conn):
+    """Version counters behind the ETags on profile and user listings"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS resource_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    
+    for statement in RESOURCE_VERSION_TRIGGERS:
+        conn.execute(statement)
+
+def migration_user_search(conn):
+    """Full-text index over names, locations and skills, behind /api/users/search"""
+    needs_rebuild = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'"
+    ).fetchone() is None
+    
+    # Prefix indexes keep search-as-you-type on short prefixes cheap
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5 (
+            name, location, skills_offered, skills_wanted,
+            content = 'users', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+        )
+    ''')
+    # Term list for typo correction
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS users_fts_terms USING fts5vocab (users_fts, 'row')")
+    
+    for statement in USER_SEARCH_TRIGGERS:
+        conn.execute(statement)
+    
+    if needs_rebuild:
+        conn.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO users_fts (users_fts, rank) VALUES ('rank', 'bm25({SEARCH_COLUMN_WEIGHTS})')")
+
+def migration_user_locations(conn):
+    """Bundled gazetteer and an R*Tree of user coordinates, behind /api/users?near="""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS places (
+            key TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            country TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    
+    # One point per user whose location resolves (min = max on both axes)
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS user_locations
+        USING rtree (id, min_lat, max_lat, min_lon, max_lon)
+    ''')
+    
+    for statement in USER_LOCATION_TRIGGERS:
+        conn.execute(statement)
+    
+    load_places(conn)
+
+def migration_availability_slots(conn):
+    """Weekly availability bitmaps, behind /api/users/by-availability"""
+    columns = [column[1] for column in conn.execute('PRAGMA table_info(users)')]
+    if 'availability_slots' not in columns:
+        conn.execute('ALTER TABLE users ADD COLUMN availability_slots BLOB')
+    
+    # Existing profiles start from the hours of their availability preset
+    conn.executemany('''
+        UPDATE users SET availability_slots = ?
+        WHERE availability_slots IS NULL AND lower(trim(availability)) = ?
+    ''', [(encode_slots(slots), preset) for preset, slots in AVAILABILITY_PRESETS.items()])
+    
+    # Slot changes have to bump the profile and listing ETags too
+    conn.execute('DROP TRIGGER IF EXISTS versions_users_update')
+    for statement in RESOURCE_VERSION_TRIGGERS:
+        conn.execute(statement)
+
+def migration_photo_store(conn):
+    """Move inline data: URI profile photos out of the users table into PHOTO_DIR"""
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE profile_photo LIKE 'data:%'")]
+    for user_id in user_ids:
+        photo = conn.execute('SELECT profile_photo FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+        try:
+            # Thumbnails are cut on first request
+            photo = store_profile_photo(photo, make_thumbnails=False)
+        except ValueError:
+            photo = ''
+        conn.execute('UPDATE users SET profile_photo = ? WHERE id = ?', (photo, user_id))
+
+def migration_job_queue(conn):
+    """Persistent queue for background jobs"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_after TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            locked_until TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            finished_at TEXT
+        )
+    ''')
+    # Workers claim the highest priority, then oldest, queued job
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_queued
+        ON jobs (priority DESC, id) WHERE status = 'queued'
+    ''')
+    # Expired leases
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_running
+        ON jobs (locked_until) WHERE status = 'running'
+    ''')
+    # Admin listings, newest first, with or without a status filter
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_created
+        ON jobs (status, created_at)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_created
+        ON jobs (created_at)
+    ''')
+
+def migration_rating_aggregates(conn):
+    """Per-user and per-skill rating aggregates, behind /api/leaderboard and ?sort=rating"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS user_ratings (
+            user_id INTEGER PRIMARY KEY,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            score REAL GENERATED ALWAYS AS ({RATING_SCORE}) STORED
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS skill_ratings (
+            skill_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            score REAL GENERATED ALWAYS AS ({RATING_SCORE}) STORED,
+            PRIMARY KEY (skill_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+    # Best first; user_id, the rowid or last key column, breaks ties
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_ratings_score
+        ON user_ratings (score DESC)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_skill_ratings_score
+        ON skill_ratings (skill_id, score DESC)
+    ''')
+    # The overall leaderboard skips the unrated
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_ratings_rated
+        ON user_ratings (score DESC) WHERE rating_count > 0
+    ''')
+    # Cleanup when a user is deleted
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_skill_ratings_user
+        ON skill_ratings (user_id)
+    ''')
+    
+    for statement in RATING_TRIGGERS:
+        conn.execute(statement)
+    rebuild_ratings(conn)
+
+def migration_unique_pending_requests(conn):
+    """One pending request per sender and recipient, enforced by the schema"""
+    # Duplicates that slipped through the old check-then-insert race; the
+    # oldest one stays
+    duplicates = conn.execute('''
+        DELETE FROM swap_requests
+        WHERE status = 'pending' AND id NOT IN (
+            SELECT MIN(id) FROM swap_requests WHERE status = 'pending'
+            GROUP BY from_user_id, to_user_id
+        )
+        RETURNING id, from_user_id, to_user_id
+    ''').fetchall()
+    if duplicates:
+        app.logger.warning('Deleted %d duplicate pending swap requests (id, from, to): %s',
+                           len(duplicates), sorted(tuple(row) for row in duplicates))
+    conn.execute('DROP INDEX IF EXISTS idx_swap_requests_pending')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_swap_requests_pending
+        ON swap_requests (from_user_id, to_user_id) WHERE status = 'pending'
+    ''')
+
+def migration_idempotency_keys(conn):
+    """Stored responses for requests sent with an Idempotency-Key"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            status INTEGER,
+            response BLOB,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, key)
+        ) WITHOUT ROWID
+    ''')
+    # Expiry
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created
+        ON idempotency_keys (created_at)
+    ''')
+
+def migration_swap_request_archive(conn):
+    """Index of swap requests moved to the monthly archive tables"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_swap_requests (
+            id INTEGER PRIMARY KEY,
+            month TEXT NOT NULL
+        )
+    ''')
+    # What the compaction job moves next
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_swap_requests_closed
+        ON swap_requests (created_at) WHERE status != 'pending'
+    ''')
+    for name in ('stats_swaps_insert', 'stats_swaps_delete', 'ratings_swaps_insert', 'ratings_swaps_delete'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    for statement in SWAP_ARCHIVE_TRIGGERS:
+        conn.execute(statement)
+
+MIGRATIONS = [
+    migration_base_schema,
+    migration_skill_tables,
+    migration_stats_counters,
+    migration_access_path_indexes,
+    migration_resource_versions,
+    migration_user_search,
+    migration_user_locations,
+    migration_availability_slots,
+    migration_photo_store,
+    migration_job_queue,
+    migration_rating_aggregates,
+    migration_unique_pending_requests,
+    migration_idempotency_keys,
+    migration_swap_request_archive,
+]
+
+def migrate_db(conn):
+    """Apply pending migrations, each in its own transaction"""
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute('BEGIN')
+        try:
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(MIGRATIONS)
+
+def connect_db():
+    """Open a new database connection with the pragmas every connection needs"""
+    conn = sqlite3.connect(
+        DATABASE,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=DB_STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+        factory=InstrumentedConnection
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in connection_pragmas():
+        conn.execute(pragma)
+    return conn
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection that counts and times the statements executed through it.
+
+    Timing covers execute() itself, which for a SELECT includes finding
+    the first row but not fetching the rest.
+    """
+
+    statements = 0
+    sql_seconds = 0.0
+    slow_statements = 0
+
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            self._record(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            self._record(sql, time.perf_counter() - start)
+
+    def _record(self, sql, elapsed):
+        self.statements += 1
+        self.sql_seconds += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            self.slow_statements += 1
+            app.logger.warning('Slow query (%.1f ms): %s', elapsed * 1000, ' '.join(sql.split())[:300])
+
+    def stats(self):
+        return self.statements, self.sql_seconds, self.slow_statements
+
+def connection_pragmas():
+    """PRAGMA statements applied to every new connection, sync or async"""
+    return [
+        # WAL lets readers proceed while a writer holds the lock, which is
+        # what used to surface as "database is locked" under several workers
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        f'PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}',
+        f'PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}',
+        f'PRAGMA mmap_size = {int(DB_MMAP_SIZE)}',
+    ]
+
+class ConnectionPool:
+    """Keeps configured connections open between requests.
+
+    Connections are handed out to one request at a time and returned on
+    app context teardown, so setup and pragmas are paid once per connection
+    rather than once per request.
+    """
+
+    def __init__(self, max_idle):
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return connect_db()
+
+    def release(self, conn):
+        # Never hand a half-finished transaction to the next request
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+db_pool = ConnectionPool(DB_POOL_SIZE)
+
+def get_db():
+    """Get the database connection for the current app context"""
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+        g.db_stats_before = g.db.stats()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Return the context's connection to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
+
+# Request and SQL instrumentation. Every request records its latency by
+# route, method and status, plus the statements and SQL time it spent on
+# its get_db() connection. Values live in this process; with several
+# workers, each scrape of /metrics sees the worker that answered it.
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+# Set SKILL_SWAP_SERVER_TIMING=1 to add a Server-Timing header to responses
+SERVER_TIMING = os.environ.get('SKILL_SWAP_SERVER_TIMING') == '1'
+# Set SKILL_SWAP_COUNT_QUERIES=1 to report how many SQL statements each
+# request ran in an X-Query-Count response header (used by benchmarks.loadgen)
+COUNT_QUERIES = os.environ.get('SKILL_SWAP_COUNT_QUERIES') == '1'
+# /metrics is for admins; set METRICS_TOKEN to let a scraper in with
+# "Authorization: Bearer <token>" instead
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+METRICS = {
+    'skillswap_http_request_duration_seconds': ('histogram', 'Time to build a response, by route, method and status'),
+    'skillswap_sql_statements_total': ('counter', 'SQL statements executed, by route'),
+    'skillswap_sql_duration_seconds_total': ('counter', 'Time spent executing SQL, by route'),
+    'skillswap_sql_slow_statements_total': ('counter', f'SQL statements slower than {SLOW_QUERY_MS:g} ms, by route'),
+    'skillswap_jobs_total': ('counter', 'Background job attempts, by kind and outcome'),
+    'skillswap_job_duration_seconds': ('histogram', 'Time to run a background job attempt, by kind and outcome'),
+    'skillswap_cache_lookups_total': ('counter', 'Result cache lookups, by cache and hit or miss'),
+}
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms rendered in Prometheus text format"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts, then +Inf, then the running sum
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{format_labels(labels)} {value:g}')
+                continue
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), histogram):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f'{name}_sum{format_labels(labels)} {histogram[-1]:g}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+metrics = MetricsRegistry(METRICS_LATENCY_BUCKETS)
+
+def record_request(route, method, status, seconds, statements=0, sql_seconds=0.0, slow_statements=0):
+    """Record one finished request; also used by the async serving mode"""
+    metrics.observe('skillswap_http_request_duration_seconds',
+                    (('route', route), ('method', method), ('status', str(status))), seconds)
+    if statements:
+        labels = (('route', route),)
+        metrics.inc('skillswap_sql_statements_total', labels, statements)
+        metrics.inc('skillswap_sql_duration_seconds_total', labels, sql_seconds)
+        if slow_statements:
+            metrics.inc('skillswap_sql_slow_statements_total', labels, slow_statements)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+
+    statements, sql_seconds, slow_statements = 0, 0.0, 0
+    if 'db' in g:
+        statements, sql_seconds, slow_statements = (
+            now - before for now, before in zip(g.db.stats(), g.db_stats_before)
+        )
+    # The URL rule, not the path, so ids don't explode the label set
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    record_request(route, request.method, response.status_code, elapsed,
+                   statements, sql_seconds, slow_statements)
+
+    if COUNT_QUERIES:
+        response.headers['X-Query-Count'] = str(statements)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={sql_seconds * 1000:.1f};desc="{statements} statements"'
+        )
+    return response
+
+# Response encoding. JSON goes through orjson, for jsonify and request bodies
+# alike; keys stay sorted as with Flask's default encoder. Large responses
+# are compressed with brotli or gzip, whichever the client prefers. The
+# bytes differ per coding, so a compressed response's strong ETag gets the
+# coding as a suffix, which conditional requests ignore when comparing.
+JSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies aren't worth a content coding
+COMPRESS_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv'}
+COMPRESS_ENCODINGS = ('br', 'gzip')  # preferred first when quality ties
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # about as fast as gzip -6 on these payloads, and smaller
+ETAG_ENCODING_SUFFIXES = {'br': '-br', 'gzip': '-gz'}
+
+def dump_json(obj):
+    """Encode a response body as compact, key-sorted JSON bytes"""
+    return orjson.dumps(obj, option=JSON_OPTIONS)
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return dump_json(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dump_json(obj) + b'\n', mimetype='application/json')
+
+app.json = OrjsonProvider(app)
+
+def negotiate_encoding(accept_encoding):
+    """Content coding to compress with for an Accept-Encoding value, or None"""
+    accepted = parse_accept_header(accept_encoding)
+    best = max(COMPRESS_ENCODINGS, key=accepted.quality)
+    return best if accepted.quality(best) > 0 else None
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+class StreamCompressor:
+    """Incremental brotli or gzip encoder for streamed bodies.
+
+    Every chunk is flushed, so clients still get rows batch by batch.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk):
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+def streaming_response(chunks, mimetype, headers=None):
+    """Response for a generator of byte chunks, compressed if the client accepts it"""
+    headers = dict(headers or {}, Vary='Accept-Encoding')
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        chunks = compress_stream(chunks, encoding)
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+def compress_stream(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.finish()
+
+def encoded_etag(etag, encoding):
+    """The ETag of a resource's representation in a content coding (None for identity)"""
+    return etag + ETAG_ENCODING_SUFFIXES.get(encoding, '')
+
+def decoded_etag(etag):
+    """Undo encoded_etag, for comparing a client's ETag with the resource's"""
+    for suffix in ETAG_ENCODING_SUFFIXES.values():
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)]
+    return etag
+
+@app.after_request
+def compress_response(response):
+    # Streamed listings are compressed as they are generated, so may already carry an encoding
+    if (response.status_code == 200 and not response.is_streamed and not response.direct_passthrough
+            and response.mimetype in COMPRESS_MIMETYPES and 'Content-Encoding' not in response.headers):
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+        body = response.get_data()
+        if encoding and len(body) >= COMPRESS_MIN_SIZE:
+            response.set_data(compress_body(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+    
+    etag, weak = response.get_etag()
+    encoding = response.headers.get('Content-Encoding')
+    if response.status_code == 200 and etag and encoding:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+    return response
+
+# Stay under SQLite's default limit of 999 bound parameters per statement
+SQL_PARAM_CHUNK = 900
+
+def parse_skills(skills):
+    """Normalize a list (or comma-separated string) of skill names.
+
+    Strips whitespace and drops blanks and case-insensitive duplicates,
+    keeping the order the user gave them in.
+    """
+    if not skills:
+        return []
+    if isinstance(skills, str):
+        skills = skills.split(',')
+
+    seen = set()
+    parsed = []
+    for skill in skills:
+        name = str(skill).strip()
+        key = name.casefold()
+        if name and key not in seen:
+            seen.add(key)
+            parsed.append(name)
+    return parsed
+
+def get_skill_ids(conn, names):
+    """Return skill ids for the given names, creating any missing skills"""
+    if not names:
+        return []
+    conn.executemany('INSERT OR IGNORE INTO skills (name) VALUES (?)', [(name,) for name in names])
+    return [
+        conn.execute('SELECT id FROM skills WHERE name = ?', (name,)).fetchone()[0]
+        for name in names
+    ]
+
+def set_user_skills(conn, user_id, direction, skills):
+    """Replace a user's offered or wanted skills, returning the stored names"""
+    names = parse_skills(skills)
+    conn.execute('DELETE FROM user_skills WHERE user_id = ? AND direction = ?', (user_id, direction))
+    skill_ids = get_skill_ids(conn, names)
+    conn.executemany('''
+        INSERT INTO user_skills (user_id, skill_id, direction, position)
+        VALUES (?, ?, ?, ?)
+    ''', [(user_id, skill_id, direction, position) for position, skill_id in enumerate(skill_ids)])
+    return names
+
+# Skills for a batch of users; format with one placeholder per user id
+USER_SKILLS_QUERY = '''
+    SELECT us.user_id, us.direction, s.name
+    FROM user_skills us
+    JOIN skills s ON s.id = us.skill_id
+    WHERE us.user_id IN ({placeholders})
+    ORDER BY us.user_id, us.direction, us.position
+'''
+
+def get_user_skills(conn, user_ids):
+    """Fetch offered/wanted skills for many users at once.
+
+    Returns a dict mapping user id to {'offered': [...], 'wanted': [...]}.
+    """
+    skills = {user_id: {'offered': [], 'wanted': []} for user_id in user_ids}
+    user_ids = list(skills)
+
+    for start in range(0, len(user_ids), SQL_PARAM_CHUNK):
+        chunk = user_ids[start:start + SQL_PARAM_CHUNK]
+        rows = conn.execute(
+            USER_SKILLS_QUERY.format(placeholders=','.join('?' * len(chunk))), chunk
+        ).fetchall()
+        for user_id, direction, name in rows:
+            skills[user_id][direction].append(name)
+
+    return skills
+
+def migrate_csv_skills(conn):
+    """Copy skills from the legacy comma-joined users columns into user_skills"""
+    users = conn.execute('''
+        SELECT id, skills_offered, skills_wanted FROM users
+        WHERE skills_offered != '' OR skills_wanted != ''
+    ''').fetchall()
+    for user_id, skills_offered, skills_wanted in users:
+        set_user_skills(conn, user_id, 'offered', skills_offered)
+        set_user_skills(conn, user_id, 'wanted', skills_wanted)
+
+# Triggers that keep stats_counters and swap_daily_counts in step with writes.
+# Counter names: total_users, active_users, total_swaps and swaps:<status>.
+STATS_TRIGGERS = (
+    '''
+        CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('total_users', NEW.is_admin IS 0)
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+            INSERT INTO stats_counters (name, value) VALUES ('active_users', NEW.is_public IS 1 AND NEW.is_admin IS 0)
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS stats_users_delete AFTER DELETE ON users BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('total_users', -(OLD.is_admin IS 0))
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+            INSERT INTO stats_counters (name, value) VALUES ('active_users', -(OLD.is_public IS 1 AND OLD.is_admin IS 0))
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS stats_users_update AFTER UPDATE OF is_public, is_admin ON users BEGIN
+            INSERT INTO stats_counters (name, value)
+                VALUES ('total_users', (NEW.is_admin IS 0) - (OLD.is_admin IS 0))
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+            INSERT INTO stats_counters (name, value)
+                VALUES ('active_users', (NEW.is_public IS 1 AND NEW.is_admin IS 0) - (OLD.is_public IS 1 AND OLD.is_admin IS 0))
+                ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS stats_swaps_insert AFTER INSERT ON swap_requests BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('total_swaps', 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+            INSERT INTO stats_counters (name, value) VALUES ('swaps:' || COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+            INSERT INTO swap_daily_counts (day, status, count)
+                VALUES (date(NEW.created_at), COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (day, status) DO UPDATE SET count = count + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS stats_swaps_delete AFTER DELETE ON swap_requests BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('total_swaps', -1)
+                ON CONFLICT (name) DO UPDATE SET value = value - 1;
+            INSERT INTO stats_counters (name, value) VALUES ('swaps:' || COALESCE(OLD.status, ''), -1)
+                ON CONFLICT (name) DO UPDATE SET value = value - 1;
+            INSERT INTO swap_daily_counts (day, status, count)
+                VALUES (date(OLD.created_at), COALESCE(OLD.status, ''), -1)
+                ON CONFLICT (day, status) DO UPDATE SET count = count - 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS stats_swaps_update AFTER UPDATE OF status, created_at ON swap_requests BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('swaps:' || COALESCE(OLD.status, ''), -1)
+                ON CONFLICT (name) DO UPDATE SET value = value - 1;
+            INSERT INTO stats_counters (name, value) VALUES ('swaps:' || COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+            INSERT INTO swap_daily_counts (day, status, count)
+                VALUES (date(OLD.created_at), COALESCE(OLD.status, ''), -1)
+                ON CONFLICT (day, status) DO UPDATE SET count = count - 1;
+            INSERT INTO swap_daily_counts (day, status, count)
+                VALUES (date(NEW.created_at), COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (day, status) DO UPDATE SET count = count + 1;
+        END
+    ''',
+)
+
+# Triggers that bump the version of the users collection and of the changed
+# profile (user:<id>) on every write that shows up in profiles or listings.
+RESOURCE_VERSION_TRIGGERS = (
+    '''
+        CREATE TRIGGER IF NOT EXISTS versions_users_insert AFTER INSERT ON users BEGIN
+            INSERT INTO resource_versions (name, version, updated_at) VALUES ('users', 1, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+            INSERT INTO resource_versions (name, version, updated_at) VALUES ('user:' || NEW.id, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS versions_users_update AFTER UPDATE OF name, location, profile_photo, skills_offered, skills_wanted,
+            availability, availability_slots, is_public ON users BEGIN
+            INSERT INTO resource_versions (name, version, updated_at) VALUES ('users', 1, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+            INSERT INTO resource_versions (name, version, updated_at) VALUES ('user:' || NEW.id, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS versions_users_delete AFTER DELETE ON users BEGIN
+            INSERT INTO resource_versions (name, version, updated_at) VALUES ('users', 1, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+            INSERT INTO resource_versions (name, version, updated_at) VALUES ('user:' || OLD.id, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+        END
+    ''',
+)
+
+# Triggers that keep users_fts, an external-content index over users, in step
+# with the columns it covers. FTS5 needs the old values to remove a row.
+USER_SEARCH_TRIGGERS = (
+    '''
+        CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+            INSERT INTO users_fts (rowid, name, location, skills_offered, skills_wanted)
+                VALUES (NEW.id, NEW.name, NEW.location, NEW.skills_offered, NEW.skills_wanted);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, name, location, skills_offered, skills_wanted)
+                VALUES ('delete', OLD.id, OLD.name, OLD.location, OLD.skills_offered, OLD.skills_wanted);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF name, location, skills_offered, skills_wanted
+            ON users BEGIN
+            INSERT INTO users_fts (users_fts, rowid, name, location, skills_offered, skills_wanted)
+                VALUES ('delete', OLD.id, OLD.name, OLD.location, OLD.skills_offered, OLD.skills_wanted);
+            INSERT INTO users_fts (rowid, name, location, skills_offered, skills_wanted)
+                VALUES (NEW.id, NEW.name, NEW.location, NEW.skills_offered, NEW.skills_wanted);
+        END
+    ''',
+)
+
+# Triggers that keep user_locations in step with users.location. A location
+# resolves through places as typed, or else by the part before its first
+# comma ("Berlin, Germany" -> "berlin").
+PLACE_KEY_FOR = '''COALESCE(
+    (SELECT key FROM places WHERE key = lower(trim({location}))),
+    lower(trim(substr({location}, 1, instr({location} || ',', ',') - 1)))
+)'''
+
+USER_LOCATION_TRIGGERS = (
+    f'''
+        CREATE TRIGGER IF NOT EXISTS user_locations_insert AFTER INSERT ON users BEGIN
+            INSERT INTO user_locations (id, min_lat, max_lat, min_lon, max_lon)
+                SELECT NEW.id, latitude, latitude, longitude, longitude FROM places
+                WHERE key = {PLACE_KEY_FOR.format(location='NEW.location')};
+        END
+    ''',
+    f'''
+        CREATE TRIGGER IF NOT EXISTS user_locations_update AFTER UPDATE OF location ON users BEGIN
+            DELETE FROM user_locations WHERE id = OLD.id;
+            INSERT INTO user_locations (id, min_lat, max_lat, min_lon, max_lon)
+                SELECT NEW.id, latitude, latitude, longitude, longitude FROM places
+                WHERE key = {PLACE_KEY_FOR.format(location='NEW.location')};
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS user_locations_delete AFTER DELETE ON users BEGIN
+            DELETE FROM user_locations WHERE id = OLD.id;
+        END
+    ''',
+)
+
+# Rating aggregates. A swap request's rating scores its recipient
+# (to_user_id), the one teaching wanted_skill. Triggers keep a count and sum
+# of ratings per user and per (skill, user) in step with every write that
+# sets, changes or removes one, in the same transaction. score is a Bayesian
+# average: each user starts with RATING_PRIOR_WEIGHT ratings of
+# RATING_PRIOR_MEAN, so a single 5 doesn't outrank a long record of 4.8s.
+# It is stored with the row so rankings walk an index; changing the prior
+# means a migration that recreates the tables.
+RATING_MIN = 1
+RATING_MAX = 5
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 5
+RATING_SCORE = f'({RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN!r} + rating_sum) / ({RATING_PRIOR_WEIGHT} + rating_count)'
+
+# Every user has a user_ratings row, so sorting by score covers unrated users
+# too; skill_ratings only has rows for skills someone was rated for.
+RATING_TRIGGERS = (
+    '''
+        CREATE TRIGGER IF NOT EXISTS ratings_users_insert AFTER INSERT ON users BEGIN
+            INSERT OR IGNORE INTO user_ratings (user_id) VALUES (NEW.id);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS ratings_users_delete AFTER DELETE ON users BEGIN
+            DELETE FROM user_ratings WHERE user_id = OLD.id;
+            DELETE FROM skill_ratings WHERE user_id = OLD.id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS ratings_swaps_insert AFTER INSERT ON swap_requests
+        WHEN NEW.rating IS NOT NULL BEGIN
+            INSERT INTO user_ratings (user_id, rating_count, rating_sum) VALUES (NEW.to_user_id, 1, NEW.rating)
+                ON CONFLICT (user_id) DO UPDATE
+                SET rating_count = rating_count + 1, rating_sum = rating_sum + excluded.rating_sum;
+            INSERT INTO skill_ratings (skill_id, user_id, rating_count, rating_sum)
+                SELECT id, NEW.to_user_id, 1, NEW.rating FROM skills WHERE name = NEW.wanted_skill
+                ON CONFLICT (skill_id, user_id) DO UPDATE
+                SET rating_count = rating_count + 1, rating_sum = rating_sum + excluded.rating_sum;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS ratings_swaps_delete AFTER DELETE ON swap_requests
+        WHEN OLD.rating IS NOT NULL BEGIN
+            UPDATE user_ratings SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+                WHERE user_id = OLD.to_user_id;
+            UPDATE skill_ratings SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+                WHERE skill_id = (SELECT id FROM skills WHERE name = OLD.wanted_skill) AND user_id = OLD.to_user_id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS ratings_swaps_update AFTER UPDATE OF rating, to_user_id, wanted_skill ON swap_requests
+        WHEN OLD.rating IS NOT NEW.rating
+            OR (NEW.rating IS NOT NULL AND (OLD.to_user_id != NEW.to_user_id OR OLD.wanted_skill IS NOT NEW.wanted_skill))
+        BEGIN
+            UPDATE user_ratings SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+                WHERE user_id = OLD.to_user_id AND OLD.rating IS NOT NULL;
+            UPDATE skill_ratings SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+                WHERE skill_id = (SELECT id FROM skills WHERE name = OLD.wanted_skill) AND user_id = OLD.to_user_id
+                AND OLD.rating IS NOT NULL;
+            INSERT INTO user_ratings (user_id, rating_count, rating_sum)
+                SELECT NEW.to_user_id, 1, NEW.rating WHERE NEW.rating IS NOT NULL
+                ON CONFLICT (user_id) DO UPDATE
+                SET rating_count = rating_count + 1, rating_sum = rating_sum + excluded.rating_sum;
+            INSERT INTO skill_ratings (skill_id, user_id, rating_count, rating_sum)
+                SELECT id, NEW.to_user_id, 1, NEW.rating FROM skills
+                WHERE name = NEW.wanted_skill AND NEW.rating IS NOT NULL
+                ON CONFLICT (skill_id, user_id) DO UPDATE
+                SET rating_count = rating_count + 1, rating_sum = rating_sum + excluded.rating_sum;
+        END
+    ''',
+)
+
+# The stats and rating triggers that count swap requests in and out,
+# redone to skip requests moving to or from the archive: those have their
+# id in archived_swap_requests while they move, and stay counted.
+SWAP_ARCHIVE_TRIGGERS = (
+    '''
+        CREATE TRIGGER IF NOT EXISTS stats_swaps_insert AFTER INSERT ON swap_requests
+        WHEN NOT EXISTS (SELECT 1 FROM archived_swap_requests WHERE id = NEW.id) BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('total_swaps', 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+            INSERT INTO stats_counters (name, value) VALUES ('swaps:' || COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1;
+            INSERT INTO swap_daily_counts (day, status, count)
+                VALUES (date(NEW.created_at), COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (day, status) DO UPDATE SET count = count + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS stats_swaps_delete AFTER DELETE ON swap_requests
+        WHEN NOT EXISTS (SELECT 1 FROM archived_swap_requests WHERE id = OLD.id) BEGIN
+            INSERT INTO stats_counters (name, value) VALUES ('total_swaps', -1)
+                ON CONFLICT (name) DO UPDATE SET value = value - 1;
+            INSERT INTO stats_counters (name, value) VALUES ('swaps:' || COALESCE(OLD.status, ''), -1)
+                ON CONFLICT (name) DO UPDATE SET value = value - 1;
+            INSERT INTO swap_daily_counts (day, status, count)
+                VALUES (date(OLD.created_at), COALESCE(OLD.status, ''), -1)
+                ON CONFLICT (day, status) DO UPDATE SET count = count - 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS ratings_swaps_insert AFTER INSERT ON swap_requests
+        WHEN NEW.rating IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM archived_swap_requests WHERE id = NEW.id) BEGIN
+            INSERT INTO user_ratings (user_id, rating_count, rating_sum) VALUES (NEW.to_user_id, 1, NEW.rating)
+                ON CONFLICT (user_id) DO UPDATE
+                SET rating_count = rating_count + 1, rating_sum = rating_sum + excluded.rating_sum;
+            INSERT INTO skill_ratings (skill_id, user_id, rating_count, rating_sum)
+                SELECT id, NEW.to_user_id, 1, NEW.rating FROM skills WHERE name = NEW.wanted_skill
+                ON CONFLICT (skill_id, user_id) DO UPDATE
+                SET rating_count = rating_count + 1, rating_sum = rating_sum + excluded.rating_sum;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS ratings_swaps_delete AFTER DELETE ON swap_requests
+        WHEN OLD.rating IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM archived_swap_requests WHERE id = OLD.id) BEGIN
+            UPDATE user_ratings SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+                WHERE user_id = OLD.to_user_id;
+            UPDATE skill_ratings SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+                WHERE skill_id = (SELECT id FROM skills WHERE name = OLD.wanted_skill) AND user_id = OLD.to_user_id;
+        END
+    ''',
+)
+
+def rebuild_ratings(conn):
+    """Recompute the rating aggregates from scratch"""
+    swaps = all_swap_requests(conn)
+    conn.execute('DELETE FROM user_ratings')
+    conn.execute('DELETE FROM skill_ratings')
+    conn.execute(f'''
+        INSERT INTO user_ratings (user_id, rating_count, rating_sum)
+        SELECT u.id, COUNT(sr.rating), COALESCE(SUM(sr.rating), 0)
+        FROM users u
+        LEFT JOIN {swaps} sr ON sr.to_user_id = u.id
+        GROUP BY u.id
+    ''')
+    conn.execute(f'''
+        INSERT INTO skill_ratings (skill_id, user_id, rating_count, rating_sum)
+        SELECT s.id, sr.to_user_id, COUNT(*), SUM(sr.rating)
+        FROM {swaps} sr
+        JOIN skills s ON s.name = sr.wanted_skill
+        WHERE sr.rating IS NOT NULL
+        GROUP BY s.id, sr.to_user_id
+    ''')
+
+def rebuild_stats(conn):
+    """Recompute the materialized statistics from scratch"""
+    swaps = all_swap_requests(conn)
+    conn.execute('DELETE FROM stats_counters')
+    conn.execute('DELETE FROM swap_daily_counts')
+    conn.execute(f'''
+        INSERT INTO stats_counters (name, value)
+        SELECT 'total_users', COUNT(*) FROM users WHERE is_admin = 0
+        UNION ALL
+        SELECT 'active_users', COUNT(*) FROM users WHERE is_public = 1 AND is_admin = 0
+        UNION ALL
+        SELECT 'total_swaps', COUNT(*) FROM {swaps}
+    ''')
+    conn.execute(f'''
+        INSERT INTO stats_counters (name, value)
+        SELECT 'swaps:' || COALESCE(status, ''), COUNT(*) FROM {swaps}
+        GROUP BY COALESCE(status, '')
+    ''')
+    conn.execute(f'''
+        INSERT INTO swap_daily_counts (day, status, count)
+        SELECT date(created_at), COALESCE(status, ''), COUNT(*) FROM {swaps}
+        GROUP BY date(created_at), COALESCE(status, '')
+    ''')
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the materialized admin statistics and rating aggregates"""
+    conn = connect_db()
+    rebuild_stats(conn)
+    rebuild_ratings(conn)
+    conn.commit()
+    conn.close()
+    print('Statistics rebuilt')
+
+# Conditional GET. Handlers call check_not_modified() before reading any rows;
+# the validators it computes are attached to the eventual 200 response.
+def get_resource_version(conn, name):
+    """Return (version, last modified datetime) for a versioned resource"""
+    row = conn.execute('SELECT version, updated_at FROM resource_versions WHERE name = ?', (name,)).fetchone()
+    if not row:
+        return 0, None
+    return row['version'], parse_timestamp(row['updated_at'])
+
+def parse_timestamp(value):
+    """Parse a CURRENT_TIMESTAMP value, which SQLite stores in UTC"""
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+def make_etag(resource, version, *vary):
+    """Strong ETag for a resource version and whatever else the body depends on"""
+    key = '|'.join(str(part) for part in (resource, version) + vary)
+    return hashlib.sha1(key.encode()).hexdigest()[:24]
+
+def check_not_modified(conn, resource, *vary):
+    """Return a 304 response if the client's cached copy is current, else None.
+
+    The ETag covers the resource version plus anything else the response
+    depends on (`vary`), such as the caller and the query string.
+    """
+    version, last_modified = get_resource_version(conn, resource)
+    etag = make_etag(resource, version, *vary)
+    g.cache_validators = (etag, last_modified)
+    
+    if request.if_none_match:
+        current = matching_etag(request.if_none_match, etag)
+    elif request.if_modified_since and last_modified and last_modified <= request.if_modified_since:
+        current = etag
+    else:
+        current = None
+    
+    if current is None:
+        return None
+    response = Response(status=304)
+    add_cache_validators(response)
+    # Answer with the tag the client has, which names its encoding
+    response.set_etag(current)
+    return response
+
+def matching_etag(if_none_match, etag):
+    """The tag in If-None-Match (werkzeug ETags) naming this version in any encoding, or None"""
+    if if_none_match.star_tag:
+        return etag
+    for tag in if_none_match:
+        if decoded_etag(tag) == etag:
+            return tag
+    return None
+
+def add_cache_validators(response):
+    etag, last_modified = g.cache_validators
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Cached copies must be revalidated, and only by this user's browser
+    response.headers['Cache-Control'] = 'private, no-cache'
+
+@app.after_request
+def apply_cache_validators(response):
+    if 'cache_validators' in g and response.status_code == 200:
+        add_cache_validators(response)
+    return response
+
+# Daily swap breakdown returned by /api/admin/stats
+DEFAULT_STATS_DAYS = 30
+MAX_STATS_DAYS = 366
+
+STATS_DAILY_QUERY = '''
+    SELECT day, status, count FROM swap_daily_counts
+    WHERE day >= date('now', '-' || ? || ' days') AND count != 0
+    ORDER BY day
+'''
+
+def get_stats_days(args):
+    """Read the ?days= window for the daily breakdown, raising ValueError if invalid"""
+    try:
+        days = int(args.get('days', DEFAULT_STATS_DAYS))
+    except ValueError:
+        raise ValueError('days must be an integer')
+    return max(1, min(days, MAX_STATS_DAYS))
+
+def summarize_stats(counters, daily):
+    """Shape stats_counters and swap_daily_counts rows into the stats payload"""
+    counters = {row['name']: row['value'] for row in counters}
+    swaps_by_status = {
+        name[len('swaps:'):]: value
+        for name, value in counters.items()
+        if name.startswith('swaps:') and value
+    }
+    
+    swaps_by_day = {}
+    for row in daily:
+        day = swaps_by_day.setdefault(row['day'], {'day': row['day'], 'total': 0, 'by_status': {}})
+        day['total'] += row['count']
+        day['by_status'][row['status']] = row['count']
+    
+    return {
+        'total_users': counters.get('total_users', 0),
+        'total_swaps': counters.get('total_swaps', 0),
+        'pending_swaps': swaps_by_status.get('pending', 0),
+        'active_users': counters.get('active_users', 0),
+        'swaps_by_status': swaps_by_status,
+        'swaps_by_day': list(swaps_by_day.values())
+    }
+
+# Listing endpoints page with a keyset cursor on (created_at, id), newest first
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json'
+}
+
+def encode_cursor(row):
+    """Build an opaque cursor pointing just past the given row"""
+    raw = json.dumps([row['created_at'], row['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Turn a cursor back into (created_at, id), raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError('Invalid cursor')
+    if not isinstance(created_at, str) or not isinstance(row_id, int):
+        raise ValueError('Invalid cursor')
+    return created_at, row_id
+
+def get_page_args(args):
+    """Read limit, cursor and stream query parameters, raising ValueError if invalid"""
+    stream = args.get('stream')
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise ValueError(f"stream must be one of: {', '.join(STREAM_FORMATS)}")
+
+    limit = args.get('limit')
+    if limit is None:
+        # Streams return everything after the cursor unless a limit is given
+        limit = None if stream else DEFAULT_PAGE_SIZE
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        if not stream:
+            limit = min(limit, MAX_PAGE_SIZE)
+
+    cursor = args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+    return limit, after, stream
+
+def build_list_query(query, conditions, params, alias, after=None):
+    """Add the WHERE clause, keyset condition and ordering to a listing query"""
+    conditions = list(conditions)
+    params = list(params)
+    if after:
+        conditions.append(f'({alias}.created_at, {alias}.id) < (?, ?)')
+        params.extend(after)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY {alias}.created_at DESC, {alias}.id DESC'
+    return query, params
+
+def list_response(conn, query, conditions, params, serializer, alias):
+    """Run a listing query one keyset page at a time, or stream it.
+
+    `query` is the SELECT ... FROM part, `conditions` are ANDed into its
+    WHERE clause and `alias` is the table whose (created_at, id) orders the
+    results. `serializer` turns rows into dicts, projected to ?fields=.
+    """
+    try:
+        limit, after, stream = get_page_args(request.args)
+        fields = serializer.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, params = build_list_query(query, conditions, params, alias, after)
+
+    if stream:
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return stream_rows(query, params, serializer, fields, stream)
+
+    # Fetch one extra row to learn whether there is a next page
+    rows = conn.execute(query + ' LIMIT ?', params + [limit + 1]).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    response = jsonify(serializer.serialize(conn, rows, fields))
+    if has_more:
+        next_cursor = encode_cursor(rows[-1])
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response, 200
+
+def stream_rows(query, params, serializer, fields, fmt):
+    """Stream query results as NDJSON or a chunked JSON array.
+
+    The generator uses its own pooled connection and reads the cursor in
+    batches, so memory stays flat no matter how many rows match.
+    """
+    def generate():
+        conn = db_pool.acquire()
+        try:
+            cursor = conn.execute(query, params)
+            separator = b''
+            if fmt == 'json':
+                yield b'['
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                yield encode_stream_batch(serializer.serialize(conn, rows, fields), fmt, separator)
+                separator = b','
+            if fmt == 'json':
+                yield b']'
+        finally:
+            db_pool.release(conn)
+
+    return streaming_response(generate(), STREAM_FORMATS[fmt])
+
+def encode_stream_batch(items, fmt, separator=b','):
+    """One streamed batch: NDJSON lines, or array items after `separator`"""
+    if fmt == 'ndjson':
+        return b''.join(dump_json(item) + b'\n' for item in items)
+    return separator + b','.join(map(dump_json, items))
+
+# Proximity search. Free-text locations are resolved against gazetteer.csv,
+# bundled with the app: city names, aliases and "city, country" forms, all
+# matched case-insensitively. Distances use an equirectangular approximation,
+# accurate to well under 1% at these radii; searches don't wrap around the
+# 180th meridian.
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+DEFAULT_NEAR_RADIUS_KM = 25
+MAX_NEAR_RADIUS_KM = 500
+KM_PER_DEGREE = 111.195
+
+_gazetteer = None
+
+def place_keys(name, country):
+    """Lookup keys for a place name: as SQLite's lower() and fold_text() see it"""
+    keys = set()
+    for text in (name, f'{name}, {country}'):
+        keys.add(text.strip().lower())
+        keys.add(fold_text(text.strip()))
+    return keys
+
+def load_gazetteer():
+    """Map every lookup key in gazetteer.csv to (name, country, latitude, longitude)"""
+    global _gazetteer
+    if _gazetteer is None:
+        places = {}
+        with open(GAZETTEER_PATH, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                place = (row['name'], row['country'], float(row['latitude']), float(row['longitude']))
+                for name in [row['name']] + [alias for alias in row['aliases'].split('|') if alias]:
+                    for key in place_keys(name, row['country']):
+                        # The first entry wins for ambiguous names
+                        places.setdefault(key, place)
+        _gazetteer = places
+    return _gazetteer
+
+def load_places(conn):
+    """Copy the gazetteer into places and re-resolve every user's location"""
+    conn.execute('DELETE FROM places')
+    conn.executemany('INSERT INTO places (key, name, country, latitude, longitude) VALUES (?, ?, ?, ?, ?)',
+                     [(key,) + place for key, place in load_gazetteer().items()])
+    conn.execute('DELETE FROM user_locations')
+    conn.execute(f'''
+        INSERT INTO user_locations (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT u.id, p.latitude, p.latitude, p.longitude, p.longitude
+        FROM users u
+        JOIN places p ON p.key = {PLACE_KEY_FOR.format(location='u.location')}
+    ''')
+
+def resolve_place(text):
+    """(latitude, longitude) for a place name, or None if the gazetteer doesn't know it"""
+    places = load_gazetteer()
+    text = fold_text(text.strip())
+    place = places.get(text) or places.get(text.split(',', 1)[0].strip())
+    return place[2:] if place else None
+
+def get_near_args(args):
+    """Read near= (a place or "lat,lon") and radius= in km; None without near=.
+
+    Raises ValueError if either is invalid.
+    """
+    near = args.get('near', '').strip()
+    if not near:
+        return None
+    try:
+        radius = float(args.get('radius', DEFAULT_NEAR_RADIUS_KM))
+    except ValueError:
+        raise ValueError('radius must be a number')
+    if not 0 < radius <= MAX_NEAR_RADIUS_KM:
+        raise ValueError(f'radius must be between 0 and {MAX_NEAR_RADIUS_KM} km')
+
+    coordinates = re.fullmatch(r'(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)', near)
+    if coordinates:
+        latitude, longitude = float(coordinates.group(1)), float(coordinates.group(2))
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError('near coordinates out of range')
+    else:
+        place = resolve_place(near)
+        if not place:
+            raise ValueError(f'Unknown location: {near}')
+        latitude, longitude = place
+    return latitude, longitude, radius
+
+def near_condition(latitude, longitude, radius):
+    """Condition on u.id for users within radius km, and its params.
+
+    The R*Tree answers the bounding box; the distance check then runs only
+    on the points inside it.
+    """
+    lat_delta = radius / KM_PER_DEGREE
+    lon_scale = KM_PER_DEGREE * math.cos(math.radians(latitude))
+    lon_delta = radius / lon_scale if lon_scale > radius / 180 else 360
+    condition = '''u.id IN (
+        SELECT id FROM user_locations
+        WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+          AND ((min_lat - ?) * ?) * ((min_lat - ?) * ?)
+            + ((min_lon - ?) * ?) * ((min_lon - ?) * ?) <= ?
+    )'''
+    params = [
+        latitude - lat_delta, latitude + lat_delta,
+        max(-180, longitude - lon_delta), min(180, longitude + lon_delta),
+        latitude, KM_PER_DEGREE, latitude, KM_PER_DEGREE,
+        longitude, lon_scale, longitude, lon_scale,
+        radius * radius
+    ]
+    return condition, params
+
+@app.cli.command('load-gazetteer')
+def load_gazetteer_command():
+    """Reload places from gazetteer.csv and re-resolve user locations"""
+    conn = connect_db()
+    migrate_db(conn)
+    load_places(conn)
+    conn.commit()
+    count = conn.execute('SELECT COUNT(*) FROM user_locations').fetchone()[0]
+    conn.close()
+    print(f'{len(load_gazetteer())} place names loaded, {count} users located')
+
+# Listing queries, shared by the Flask handlers, the async serving mode and
+# the query plan check. Each returns (query, conditions, params) for
+# build_list_query / list_response.
+def users_listing(user_id, search_skill='', near=None):
+    """Public users other than user_id (all of them for None), optionally offering or wanting a skill.
+
+    `near` is a (latitude, longitude, radius in km) tuple from get_near_args.
+    """
+    query = '''
+        SELECT u.id, u.name, u.location, u.profile_photo, u.availability, u.created_at
+        FROM users u
+    '''
+    conditions = ['u.is_public = 1']
+    params = []
+    if user_id is not None:
+        conditions.append('u.id != ?')
+        params.append(user_id)
+    
+    if search_skill:
+        # Walk the skill -> user index instead of scanning every profile
+        conditions.append('''u.id IN (
+            SELECT us.user_id FROM user_skills us
+            JOIN skills s ON s.id = us.skill_id
+            WHERE s.name = ?
+        )''')
+        params.append(search_skill.strip())
+    
+    if near:
+        # Start from the users inside the radius and sort them, rather than
+        # walk every public user newest first looking for nearby ones
+        conditions[0] = '+u.is_public = 1'
+        condition, near_params = near_condition(*near)
+        conditions.append(condition)
+        params.extend(near_params)
+    
+    return query, conditions, params
+
+def availability_candidates(user_id, search_skill='', near=None):
+    """Query for the ids users_listing would list, to rank by availability"""
+    _, conditions, params = users_listing(user_id, search_skill, near)
+    return 'SELECT u.id FROM users u WHERE ' + ' AND '.join(conditions), params
+
+def swap_requests_listing(user_id, request_type, archives=()):
+    """Requests sent by, received by or involving ('all') user_id.
+
+    `archives` are the archive tables to read along with swap_requests.
+    """
+    if request_type == 'sent':
+        query = '''
+            SELECT sr.*, u.name as to_user_name
+            FROM {table} sr
+            JOIN users u ON sr.to_user_id = u.id
+        '''
+        return with_archives(query, archives), ['sr.from_user_id = ?'], [user_id]
+    if request_type == 'received':
+        query = '''
+            SELECT sr.*, u.name as from_user_name
+            FROM {table} sr
+            JOIN users u ON sr.from_user_id = u.id
+        '''
+        return with_archives(query, archives), ['sr.to_user_id = ?'], [user_id]
+    query = '''
+        SELECT sr.*, 
+               u1.name as from_user_name,
+               u2.name as to_user_name
+        FROM {table} sr
+        JOIN users u1 ON sr.from_user_id = u1.id
+        JOIN users u2 ON sr.to_user_id = u2.id
+    '''
+    return with_archives(query, archives), ['(sr.from_user_id = ? OR sr.to_user_id = ?)'], [user_id, user_id]
+
+def admin_users_listing():
+    """Every non-admin user"""
+    query = '''
+        SELECT u.id, u.name, u.email, u.location, u.availability, u.is_public, u.created_at
+        FROM users u
+    '''
+    return query, ['u.is_admin = 0'], []
+
+def admin_swap_requests_listing(archives=()):
+    """Every swap request with both user names, including those in `archives`"""
+    query = '''
+        SELECT sr.*, 
+               u1.name as from_user_name,
+               u2.name as to_user_name
+        FROM {table} sr
+        JOIN users u1 ON sr.from_user_id = u1.id
+        JOIN users u2 ON sr.to_user_id = u2.id
+    '''
+    return with_archives(query, archives), [], []
+
+# Response serializers, one per entity. Output fields are read from the
+# row column of the same name, except the skill lists, which come from
+# user_skills in one query per page and are skipped if ?fields= leaves
+# them out. Columns a query didn't select come out as null.
+SKILL_FIELDS = {'skills_offered': 'offered', 'skills_wanted': 'wanted'}
+
+class RowSerializer:
+    """Turns result rows into response dicts, optionally projected to some fields.
+
+    A mapper is compiled once per projection and result column layout and
+    then reused, so each row costs one itemgetter call and a dict build.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._mappers = {}
+
+    def parse_fields(self, value):
+        """Projection from a ?fields= value (None for all), raising ValueError if invalid"""
+        if not value:
+            return None
+        names = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        if not names or any(name not in self.fields for name in names):
+            raise ValueError(f"fields must be a comma-separated list of: {', '.join(self.fields)}")
+        return names
+
+    def mapper(self, fields, columns):
+        """(row, skills) -> dict for a projection (None for all) of rows with these columns.
+
+        Returns the function and whether it needs get_user_skills for the rows.
+        """
+        key = (fields, tuple(columns))
+        compiled = self._mappers.get(key)
+        if compiled is None:
+            compiled = self._mappers[key] = self._compile(fields or self.fields, columns)
+        return compiled
+
+    @staticmethod
+    def _compile(fields, columns):
+        positions = {column: index for index, column in enumerate(columns)}
+        selected = [field for field in fields if field in positions and field not in SKILL_FIELDS]
+        missing = dict.fromkeys(field for field in fields if field not in positions and field not in SKILL_FIELDS)
+        skill_fields = [(field, SKILL_FIELDS[field]) for field in fields if field in SKILL_FIELDS]
+        get_values = tuple_getter([positions[field] for field in selected])
+        id_index = positions.get('id')
+
+        def to_dict(row, skills):
+            item = dict(zip(selected, get_values(row)))
+            if missing:
+                item.update(missing)
+            if skill_fields:
+                user_skills = skills[row[id_index]]
+                for field, direction in skill_fields:
+                    item[field] = user_skills[direction]
+            return item
+
+        return to_dict, bool(skill_fields)
+
+    def serialize(self, conn, rows, fields=None):
+        if not rows:
+            return []
+        to_dict, needs_skills = self.mapper(fields, rows[0].keys())
+        skills = get_user_skills(conn, [row['id'] for row in rows]) if needs_skills else None
+        return [to_dict(row, skills) for row in rows]
+
+def tuple_getter(indexes):
+    """Like operator.itemgetter, but always returning a tuple"""
+    if len(indexes) > 1:
+        return operator.itemgetter(*indexes)
+    if indexes:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return lambda row: ()
+
+# Public profile fields for the browse listing
+user_serializer = RowSerializer((
+    'id', 'name', 'location', 'profile_photo', 'skills_offered', 'skills_wanted', 'availability'
+))
+
+# Profile fields shown to admins
+admin_user_serializer = RowSerializer((
+    'id', 'name', 'email', 'location', 'skills_offered', 'skills_wanted', 'availability',
+    'is_public', 'created_at'
+))
+
+# Public profile fields plus rating aggregates, for rated listings
+rated_user_serializer = RowSerializer(user_serializer.fields + ('rating_count', 'rating_average', 'rating_score'))
+
+# Swap request fields, with whichever user names the query joined in
+swap_request_serializer = RowSerializer((
+    'id', 'from_user_id', 'to_user_id', 'from_user_name', 'to_user_name', 'my_skill',
+    'wanted_skill', 'status', 'rating', 'feedback', 'created_at'
+))
+
+# Background job fields for the admin listing
+job_serializer = RowSerializer((
+    'id', 'kind', 'priority', 'status', 'attempts', 'max_attempts', 'run_after', 'error',
+    'created_at', 'finished_at'
+))
+
+def hot_queries():
+    """Representative shape of every query the endpoints run, for plan checks.
+
+    Listing queries come from the same builders the handlers use; keep the
+    rest in step with the handlers when adding or changing a query.
+    """
+    after = ('2024-01-01 00:00:00', 1)
+
+    def listing(builder_result, alias):
+        query, conditions, params = builder_result
+        return build_list_query(query, conditions, params, alias, after)[0]
+
+    return [
+        ('login / register lookup', 'SELECT * FROM users WHERE email = ?'),
+        ('profile / admin check', 'SELECT * FROM users WHERE id = ?'),
+        ('skill id lookup', 'SELECT id FROM skills WHERE name = ?'),
+        ('replace user skills', 'DELETE FROM user_skills WHERE user_id = ? AND direction = ?'),
+        ('skills for listed users', USER_SKILLS_QUERY.format(placeholders='?, ?, ?')),
+        ('resource version', 'SELECT version, updated_at FROM resource_versions WHERE name = ?'),
+        ('browse users', listing(users_listing(None), 'u')),
+        ('browse users by skill', listing(users_listing(None, 'Python'), 'u')),
+        ('browse users nearby', listing(users_listing(None, near=(52.52, 13.405, 25)), 'u')),
+        ('browse users nearby by skill', listing(users_listing(None, 'Python', (52.52, 13.405, 25)), 'u')),
+        ('browse cache tags', 'SELECT DISTINCT skill_id FROM user_skills WHERE user_id IN (?, ?, ?)'),
+        ('browse cache tag versions', CACHE_TAG_VERSIONS_QUERY.format(placeholders='?, ?')),
+        ('search candidate threshold', SEARCH_THRESHOLD_QUERY),
+        ('search users', SEARCH_QUERY),
+        ('search results', SEARCH_RESULTS_QUERY.format(placeholders='?, ?, ?')),
+        ('match details', 'SELECT id, name, location, profile_photo, availability FROM users WHERE id IN (?, ?, ?)'),
+        ('set profile photo', 'UPDATE users SET profile_photo = ? WHERE id = ?'),
+        ('availability candidates by skill', availability_candidates(1, 'Python')[0]),
+        ('availability candidates nearby', availability_candidates(1, near=(52.52, 13.405, 25))[0]),
+        ('users by rating', rated_users_listing(1)[0]),
+        ('users by rating with skill', rated_users_listing(1, 'Python')[0]),
+        ('leaderboard', leaderboard_listing()[0]),
+        ('leaderboard by skill', leaderboard_listing('Python')[0]),
+        ('availability results', AVAILABILITY_RESULTS_QUERY.format(placeholders='?, ?, ?')),
+        ('idempotency key', 'SELECT fingerprint, status, response FROM idempotency_keys WHERE user_id = ? AND key = ?'),
+        ('prune idempotency keys', "DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)"),
+        ('sent requests', listing(swap_requests_listing(1, 'sent'), 'sr')),
+        ('received requests', listing(swap_requests_listing(1, 'received'), 'sr')),
+        ('all requests for a user', listing(swap_requests_listing(1, 'all'), 'sr')),
+        ('swap request by id', 'SELECT * FROM swap_requests WHERE id = ?'),
+        ('archived request lookup', 'SELECT id, month FROM archived_swap_requests WHERE id IN (?, ?, ?)'),
+        ('archive candidates', ARCHIVE_CANDIDATES_QUERY),
+        ('archive job pending', ARCHIVE_JOB_PENDING_QUERY),
+        ('admin stats counters', 'SELECT name, value FROM stats_counters'),
+        ('admin stats by day', STATS_DAILY_QUERY),
+        ('admin users', listing(admin_users_listing(), 'u')),
+        ('admin swap requests', listing(admin_swap_requests_listing(), 'sr')),
+        ('delete user swap requests', 'DELETE FROM swap_requests WHERE from_user_id = ? OR to_user_id = ?'),
+        ('ready job check', READY_JOB_QUERY),
+        ('claim job', CLAIM_JOB_QUERY),
+        ('expire job leases', RELEASE_JOB_QUERY + " WHERE status = 'running' AND locked_until < datetime('now')"),
+        ('prune done jobs', "DELETE FROM jobs WHERE status = 'done' AND created_at < datetime('now', ?)"),
+        ('admin jobs', listing(jobs_listing(), 'j')),
+        ('admin jobs by status', listing(jobs_listing('failed'), 'j')),
+        ('bulk delete swap requests', '''
+            DELETE FROM swap_requests
+            WHERE from_user_id IN (?, ?, ?) OR to_user_id IN (?, ?, ?)
+        '''),
+    ]
+
+# Tables whose size doesn't grow with users or requests; scanning them is fine
+BOUNDED_TABLES = {'stats_counters'}
+
+@app.cli.command('explain-queries')
+def explain_queries_command():
+    """Print EXPLAIN QUERY PLAN for every hot query and flag full table scans"""
+    conn = connect_db()
+    migrate_db(conn)
+    
+    scans = []
+    for name, query in hot_queries():
+        # Placeholder values only need the right count; plans don't depend on them
+        params = [1] * query.count('?')
+        plan = conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+        print(f'-- {name}')
+        for row in plan:
+            detail = row['detail']
+            flagged = (
+                detail.startswith('SCAN ')
+                and ' USING ' not in detail
+                and ' VIRTUAL TABLE ' not in detail
+                and detail.split()[1] not in BOUNDED_TABLES
+            )
+            if flagged:
+                scans.append(name)
+            print(f"   {'!! ' if flagged else ''}{detail}")
+    conn.close()
+    
+    if scans:
+        print(f"\nFull table scans in: {', '.join(sorted(set(scans)))}")
+        raise SystemExit(1)
+    print('\nNo full table scans')
+
+# Full-text user search. Queries match whole words, except the last one, which
+# matches as a prefix so results update while the user types. When nothing
+# matches, words missing from the index are swapped for indexed words a typo
+# or two away (same first letter) and the search runs again.
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_SEARCH_OFFSET = 1000
+MAX_SEARCH_TERMS = 8
+SEARCH_TYPO_ALTERNATIVES = 5
+# BM25 scores every matching row, which for a word half the users list costs
+# far more than the rest of the request. Beyond this many matches, only the
+# newest are ranked; it also bounds how deep offset paging can reach.
+SEARCH_MAX_CANDIDATES = MAX_SEARCH_OFFSET + MAX_SEARCH_LIMIT
+# BM25 weights for name, location, skills offered and skills wanted
+SEARCH_COLUMN_WEIGHTS = '10.0, 2.0, 5.0, 3.0'
+SEARCH_COLUMNS = ['name', 'location', 'skills_offered', 'skills_wanted']
+
+SEARCH_THRESHOLD_QUERY = '''
+    SELECT rowid FROM users_fts WHERE users_fts MATCH ?
+    ORDER BY rowid DESC LIMIT 1 OFFSET ?
+'''
+
+SEARCH_QUERY = '''
+    SELECT u.id
+    FROM users_fts
+    JOIN users u ON u.id = users_fts.rowid
+    WHERE users_fts MATCH ? AND users_fts.rowid >= ?
+      AND u.is_public = 1 AND u.is_admin = 0 AND u.id != ?
+    ORDER BY users_fts.rank
+    LIMIT ? OFFSET ?
+'''
+
+# One page of results; format with one placeholder per user id
+SEARCH_RESULTS_QUERY = '''
+    SELECT id, name, location, profile_photo, availability, skills_offered, skills_wanted
+    FROM users
+    WHERE id IN ({placeholders})
+'''
+
+# Word characters as FTS5's unicode61 tokenizer sees them
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+def get_offset_args(args, default_limit, max_limit, max_offset):
+    """Read limit and offset for a ranked listing, raising ValueError if invalid"""
+    try:
+        limit = int(args.get('limit', default_limit))
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        raise ValueError('limit and offset must be integers')
+    if limit < 1 or offset < 0:
+        raise ValueError('limit must be positive and offset not negative')
+    if offset > max_offset:
+        raise ValueError(f'offset must be at most {max_offset}')
+    return min(limit, max_limit), offset
+
+def get_search_args(args):
+    """Read q, limit and offset for /api/users/search, raising ValueError if invalid"""
+    q = args.get('q', '').strip()
+    if not q:
+        raise ValueError('q is required')
+    limit, offset = get_offset_args(args, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, MAX_SEARCH_OFFSET)
+    return q, limit, offset
+
+def fold_text(text):
+    """Lowercase and strip diacritics, like the index does"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+def search_terms(q):
+    """Split a search box string into indexable words"""
+    return TOKEN_PATTERN.findall(fold_text(q))[:MAX_SEARCH_TERMS]
+
+def match_expression(alternatives):
+    """FTS5 MATCH expression: every group must match, any word within a group.
+
+    `alternatives` holds one list of words per search term; the last term
+    matches as a prefix. Words are TOKEN_PATTERN runs, so quoting escapes them.
+    """
+    groups = []
+    for position, words in enumerate(alternatives):
+        suffix = '*' if position == len(alternatives) - 1 else ''
+        groups.append('(' + ' OR '.join(f'"{word}"{suffix}' for word in words) + ')')
+    return ' AND '.join(groups)
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance counting transpositions as one edit; stops early past `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, previous2[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def max_typos(term):
+    if len(term) < 4 or not term.isalpha():
+        return 0
+    return 1 if len(term) < 8 else 2
+
+def similar_terms(conn, term, prefix):
+    """Indexed words within max_typos(term) edits of term, most common first.
+
+    For the prefix term, the same-length start of each indexed word is
+    compared instead, so "pyht" finds "pyth" and with it "python".
+    """
+    limit = max_typos(term)
+    if not limit:
+        return []
+    # Every character is below U+10FFFF, so this bounds the words starting with term[0]
+    candidates = conn.execute('''
+        SELECT term, doc FROM users_fts_terms
+        WHERE term >= ? AND term < ? AND length(term) >= ?
+    ''', (term[0], term[0] + '\U0010ffff', len(term) - limit)).fetchall()
+
+    scored = {}
+    for candidate, docs in candidates:
+        if prefix:
+            candidate = candidate[:len(term)]
+        elif len(candidate) > len(term) + limit:
+            continue
+        distance = edit_distance(term, candidate, limit)
+        if distance <= limit:
+            best_distance, total_docs = scored.get(candidate, (limit, 0))
+            scored[candidate] = (min(best_distance, distance), total_docs + docs)
+    ranked = sorted(scored, key=lambda candidate: (scored[candidate][0], -scored[candidate][1]))
+    return ranked[:SEARCH_TYPO_ALTERNATIVES]
+
+def correct_terms(conn, terms):
+    """Alternatives per term, replacing any term that matches no user; None if one can't be fixed"""
+    alternatives = []
+    for position, term in enumerate(terms):
+        prefix = position == len(terms) - 1
+        matched = conn.execute('SELECT rowid FROM users_fts WHERE users_fts MATCH ? LIMIT 1',
+                               (match_expression([[term]]) if prefix else f'"{term}"',)).fetchone()
+        words = [term] if matched else similar_terms(conn, term, prefix)
+        if not words:
+            return None
+        alternatives.append(words)
+    return alternatives
+
+def rank_search_results(conn, match, user_id, limit, offset):
+    """Ids of the best public matches for one page, plus one to detect a next page"""
+    threshold = conn.execute(SEARCH_THRESHOLD_QUERY, (match, SEARCH_MAX_CANDIDATES - 1)).fetchone()
+    rows = conn.execute(SEARCH_QUERY, (match, threshold[0] if threshold else 0, user_id, limit + 1, offset))
+    return [row[0] for row in rows]
+
+def search_users(conn, user_id, q, limit, offset):
+    """Rank public users by BM25 against q.
+
+    Returns (rows, alternatives, has_more), where `alternatives` are the
+    words searched for per term after any typo correction.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return [], [], False
+    alternatives = [[term] for term in terms]
+    user_ids = rank_search_results(conn, match_expression(alternatives), user_id, limit, offset)
+    if not user_ids and offset == 0:
+        corrected = correct_terms(conn, terms)
+        if corrected and corrected != alternatives:
+            alternatives = corrected
+            user_ids = rank_search_results(conn, match_expression(alternatives), user_id, limit, offset)
+
+    has_more = len(user_ids) > limit
+    user_ids = user_ids[:limit]
+    if not user_ids:
+        return [], alternatives, False
+    rows = conn.execute(SEARCH_RESULTS_QUERY.format(placeholders=','.join('?' * len(user_ids))), user_ids)
+    rows = {row['id']: row for row in rows}
+    return [rows[user_id] for user_id in user_ids if user_id in rows], alternatives, has_more
+
+def highlight(text, alternatives):
+    """HTML-escape text and wrap the words the search matched in <mark> tags"""
+    if not text:
+        return text
+    exact = {word for words in alternatives[:-1] for word in words}
+    prefixes = tuple(alternatives[-1])
+    parts = []
+    end = 0
+    for token in TOKEN_PATTERN.finditer(text):
+        folded = fold_text(token.group())
+        if folded in exact or folded.startswith(prefixes):
+            parts.append(html.escape(text[end:token.start()]))
+            parts.append(f'<mark>{html.escape(token.group())}</mark>')
+            end = token.end()
+    parts.append(html.escape(text[end:]))
+    return ''.join(parts)
+
+def serialize_search_results(conn, rows, alternatives, fields=None):
+    results = user_serializer.serialize(conn, rows, fields)
+    for row, result in zip(rows, results):
+        result['highlights'] = {column: highlight(row[column], alternatives) for column in SEARCH_COLUMNS}
+    return results
+
+# Skill matching
+MATCH_AVAILABILITY_BONUS = 1.5  # when they are free in all of my hours
+MATCH_INDEX_MAX_AGE = 300  # seconds; picks up writes made by other worker processes
+DEFAULT_MATCH_LIMIT = 20
+MAX_MATCH_LIMIT = 100
+
+class BackgroundLoadedIndex:
+    """Base for the per-process indexes rebuilt from the database.
+
+    The first lookup loads synchronously. Once the copy is older than
+    MATCH_INDEX_MAX_AGE, lookups keep answering from it while a background
+    thread builds a fresh one on its own connection and swaps it in; writes
+    patched in meanwhile are replayed onto the new copy. Subclasses provide
+    _build(conn), which must not touch the live structures, and
+    _install(state), called with the lock held.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()  # one load at a time
+        self._loaded_at = None
+        self._generation = 0
+        self._replay = None  # writes to repeat on the copy being built
+        self._reloader = None
+
+    def ensure_loaded(self, conn):
+        if self._loaded_at is None:
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self._load(conn)
+        elif time.monotonic() - self._loaded_at >= MATCH_INDEX_MAX_AGE:
+            self._start_reload()
+
+    def load(self, conn):
+        """Rebuild the whole index from the database"""
+        with self._load_lock:
+            self._load(conn)
+
+    def _load(self, conn):
+        with self._lock:
+            generation = self._generation
+            self._replay = []
+        try:
+            state = self._build(conn)
+        finally:
+            with self._lock:
+                replay, self._replay = self._replay, None
+        with self._lock:
+            if generation != self._generation:
+                return  # invalidated meanwhile; the next lookup loads again
+            self._install(state)
+            for method, args in replay:
+                method(*args)
+            self._loaded_at = time.monotonic()
+
+    def _start_reload(self):
+        with self._lock:
+            if self._reloader is not None:
+                return
+            self._reloader = threading.Thread(target=self._reload, name=f'{type(self).__name__}-reload', daemon=True)
+        self._reloader.start()
+
+    def _reload(self):
+        try:
+            conn = connect_db()
+            try:
+                self.load(conn)
+            finally:
+                conn.close()
+        except Exception:
+            app.logger.exception('Reloading %s failed', type(self).__name__)
+        finally:
+            with self._lock:
+                self._reloader = None
+
+    def _patch(self, method, *args):
+        """Apply a write to the live copy, and to the one being built if any"""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((method, args))
+            if self._loaded_at is not None:
+                method(*args)
+
+    def invalidate(self):
+        """Drop the index so the next lookup reloads it"""
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = None
+
+def slot_mask(bitmap):
+    """Availability bitmap as an int, for popcounts of shared hours"""
+    return int.from_bytes(bitmap or b'', 'little')
+
+class SkillMatchIndex(BackgroundLoadedIndex):
+    """In-memory bipartite index from skills to the users offering/wanting them.
+
+    Loaded from the database on first use and kept current by the write
+    endpoints in this process, so finding reciprocal matches touches only
+    the users sharing a skill with the caller instead of every profile.
+    Each process holds its own copy and reloads it in the background after
+    MATCH_INDEX_MAX_AGE seconds to pick up changes made elsewhere.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._offered = {}    # skill key -> set of user ids offering it
+        self._wanted = {}     # skill key -> set of user ids wanting it
+        self._profiles = {}   # user id -> (offered keys, wanted keys, slot mask, is_public)
+        self._names = {}      # skill key -> display name
+
+    def _build(self, conn):
+        built = SkillMatchIndex()
+        skills = {}
+        for user_id, direction, name in conn.execute('''
+            SELECT us.user_id, us.direction, s.name
+            FROM user_skills us
+            JOIN skills s ON s.id = us.skill_id
+        '''):
+            skills.setdefault(user_id, {'offered': [], 'wanted': []})[direction].append(name)
+        for user_id, availability_slots, is_public in conn.execute(
+                'SELECT id, availability_slots, is_public FROM users'):
+            user_skills = skills.get(user_id, {'offered': [], 'wanted': []})
+            built._add(user_id, user_skills['offered'], user_skills['wanted'], availability_slots, is_public)
+        return built
+
+    def _install(self, built):
+        self._offered, self._wanted = built._offered, built._wanted
+        self._profiles, self._names = built._profiles, built._names
+
+    def _add(self, user_id, offered, wanted, availability_slots, is_public):
+        offered_keys = set()
+        for name in offered:
+            key = name.casefold()
+            self._names.setdefault(key, name)
+            self._offered.setdefault(key, set()).add(user_id)
+            offered_keys.add(key)
+        wanted_keys = set()
+        for name in wanted:
+            key = name.casefold()
+            self._names.setdefault(key, name)
+            self._wanted.setdefault(key, set()).add(user_id)
+            wanted_keys.add(key)
+        self._profiles[user_id] = (offered_keys, wanted_keys, slot_mask(availability_slots), bool(is_public))
+
+    def _remove(self, user_id):
+        profile = self._profiles.pop(user_id, None)
+        if not profile:
+            return
+        for postings, keys in ((self._offered, profile[0]), (self._wanted, profile[1])):
+            for key in keys:
+                users = postings.get(key)
+                if users:
+                    users.discard(user_id)
+                    if not users:
+                        del postings[key]
+
+    def _replace(self, user_id, offered, wanted, availability_slots, is_public):
+        self._remove(user_id)
+        self._add(user_id, offered, wanted, availability_slots, is_public)
+
+    def _set_public(self, user_id, is_public):
+        profile = self._profiles.get(user_id)
+        if profile:
+            self._profiles[user_id] = profile[:3] + (bool(is_public),)
+
+    def update_user(self, user_id, offered, wanted, availability_slots, is_public):
+        """Replace one user's entries after a profile write"""
+        self._patch(self._replace, user_id, offered, wanted, availability_slots, is_public)
+
+    def set_public(self, user_id, is_public):
+        self._patch(self._set_public, user_id, is_public)
+
+    def remove_user(self, user_id):
+        self._patch(self._remove, user_id)
+
+    def matches(self, user_id, limit):
+        """Rank public users who offer what user_id wants and want what it offers.
+
+        Returns (user id, score, skills they offer, skills they want) tuples,
+        best first.
+        """
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if not profile:
+                return []
+            my_offered, my_wanted, my_slots, _ = profile
+            my_hours = my_slots.bit_count()
+
+            # Skills each candidate can teach me
+            gives = {}
+            for key in my_wanted:
+                for other in self._offered.get(key, ()):
+                    gives.setdefault(other, []).append(key)
+
+            # Skills each candidate wants that I can teach; only users already
+            # in `gives` can be mutual matches
+            takes = {}
+            for key in my_offered:
+                for other in self._wanted.get(key, ()):
+                    if other in gives:
+                        takes.setdefault(other, []).append(key)
+
+            scored = []
+            for other, taken in takes.items():
+                if other == user_id:
+                    continue
+                _, _, slots, is_public = self._profiles[other]
+                if not is_public:
+                    continue
+                score = len(gives[other]) + len(taken)
+                if my_hours:
+                    # Scaled by the share of my hours they are free too
+                    score += round(MATCH_AVAILABILITY_BONUS * (slots & my_slots).bit_count() / my_hours, 2)
+                scored.append((score, other))
+
+            best = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))
+            return [(
+                other,
+                score,
+                [self._names[key] for key in gives[other]],
+                [self._names[key] for key in takes[other]]
+            ) for score, other in best]
+
+match_index = SkillMatchIndex()
+
+# Weekly availability. Free hours are a bitmap of the 168 hours of the week
+# (bit 0 = Monday 00:00-01:00 UTC), stored as 21 bytes in
+# users.availability_slots. The availability presets map onto fixed slots.
+HOURS_PER_WEEK = 168
+AVAILABILITY_BYTES = HOURS_PER_WEEK // 8
+AVAILABILITY_WORDS = 3  # uint64 words per bitmap, padded to 24 bytes
+DEFAULT_AVAILABILITY_LIMIT = 20
+MAX_AVAILABILITY_LIMIT = 100
+MAX_AVAILABILITY_OFFSET = 1000
+
+# One page of ranked users; format with one placeholder per user id
+AVAILABILITY_RESULTS_QUERY = '''
+    SELECT id, name, location, profile_photo, availability
+    FROM users
+    WHERE id IN ({placeholders})
+'''
+
+def weekly_slots(days, start_hour, end_hour):
+    """Slot numbers for the same hours on each of the given days (0 = Monday)"""
+    return [day * 24 + hour for day in days for hour in range(start_hour, end_hour)]
+
+AVAILABILITY_PRESETS = {
+    'weekends': weekly_slots([5, 6], 9, 21),
+    'weekdays': weekly_slots(range(5), 9, 17),
+    'evenings': weekly_slots(range(5), 18, 22),
+    'flexible': weekly_slots(range(7), 8, 22),
+}
+
+def encode_slots(slots):
+    bitmap = bytearray(AVAILABILITY_BYTES)
+    for slot in slots:
+        bitmap[slot // 8] |= 1 << (slot % 8)
+    return bytes(bitmap)
+
+def decode_slots(bitmap):
+    if not bitmap:
+        return []
+    return [index * 8 + bit for index, byte in enumerate(bitmap) for bit in range(8) if byte >> bit & 1]
+
+def parse_availability_slots(value):
+    """Bitmap from a list (or comma-separated string) of slot numbers, raising ValueError if invalid"""
+    if isinstance(value, str):
+        value = [part for part in value.split(',') if part.strip()]
+    if not isinstance(value, list):
+        raise ValueError('availability_slots must be a list of hours of the week')
+    try:
+        slots = [int(slot) for slot in value]
+    except (TypeError, ValueError):
+        raise ValueError('availability_slots must be a list of hours of the week')
+    if any(not 0 <= slot < HOURS_PER_WEEK for slot in slots):
+        raise ValueError(f'availability_slots must be between 0 and {HOURS_PER_WEEK - 1}')
+    return encode_slots(slots)
+
+def availability_bitmap(data):
+    """Bitmap for a profile: its availability_slots if given, else its availability preset"""
+    if data.get('availability_slots') not in (None, ''):
+        return parse_availability_slots(data['availability_slots'])
+    preset = AVAILABILITY_PRESETS.get(str(data.get('availability') or 'weekends').strip().lower())
+    return encode_slots(preset) if preset else None
+
+def pack_bitmaps(bitmaps):
+    """(n, AVAILABILITY_WORDS) uint64 matrix from 21-byte bitmaps (None for no slots)"""
+    width = AVAILABILITY_WORDS * 8
+    packed = b''.join((bitmap or b'').ljust(width, b'\0') for bitmap in bitmaps)
+    return np.frombuffer(packed, dtype='<u8').reshape(-1, AVAILABILITY_WORDS).astype(np.uint64)
+
+class AvailabilityIndex(BackgroundLoadedIndex):
+    """Every user's availability bitmap, packed for ranking by schedule overlap.
+
+    Bitmaps live in one (users, 3) uint64 matrix sorted by user id, so
+    scoring thousands of candidates is one vectorized AND and popcount.
+    Kept current like match_index: write endpoints in this process patch
+    it, and it reloads in the background after MATCH_INDEX_MAX_AGE seconds.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._slots = np.empty((0, AVAILABILITY_WORDS), dtype=np.uint64)
+        self._public = np.empty(0, dtype=bool)
+
+    def _build(self, conn):
+        rows = conn.execute('SELECT id, availability_slots, is_public FROM users ORDER BY id').fetchall()
+        return (
+            np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+            pack_bitmaps(row[1] for row in rows),
+            np.fromiter((bool(row[2]) for row in rows), dtype=bool, count=len(rows))
+        )
+
+    def _install(self, built):
+        self._ids, self._slots, self._public = built
+
+    def _position(self, user_id):
+        position = int(np.searchsorted(self._ids, user_id))
+        if position < len(self._ids) and self._ids[position] == user_id:
+            return position
+        return None
+
+    def _replace(self, user_id, bitmap, is_public):
+        position = self._position(user_id)
+        if position is None:
+            position = int(np.searchsorted(self._ids, user_id))
+            self._ids = np.insert(self._ids, position, user_id)
+            self._slots = np.insert(self._slots, position, 0, axis=0)
+            self._public = np.insert(self._public, position, False)
+        self._slots[position] = pack_bitmaps([bitmap])[0]
+        self._public[position] = bool(is_public)
+
+    def _set_public(self, user_id, is_public):
+        position = self._position(user_id)
+        if position is not None:
+            self._public[position] = bool(is_public)
+
+    def _remove(self, user_id):
+        position = self._position(user_id)
+        if position is not None:
+            self._slots[position] = 0
+            self._public[position] = False
+
+    def update_user(self, user_id, bitmap, is_public):
+        """Replace one user's entry after a profile write"""
+        self._patch(self._replace, user_id, bitmap, is_public)
+
+    def set_public(self, user_id, is_public):
+        self._patch(self._set_public, user_id, is_public)
+
+    def remove_user(self, user_id):
+        self._patch(self._remove, user_id)
+
+    def rank(self, user_id, limit, offset, candidate_ids=None):
+        """Rank public users by hours shared with user_id, most first.
+
+        Only `candidate_ids` are considered when given. Users sharing no
+        hours are left out. Returns ([(user id, shared hours)], has_more).
+        """
+        with self._lock:
+            position = self._position(user_id)
+            if position is None:
+                return [], False
+            mine = self._slots[position]
+            if candidate_ids is None:
+                rows = np.flatnonzero(self._public)
+            else:
+                candidates = np.asarray(candidate_ids, dtype=np.int64)
+                rows = np.searchsorted(self._ids, candidates)
+                found = rows < len(self._ids)
+                rows = rows[found][self._ids[rows[found]] == candidates[found]]
+                rows = rows[self._public[rows]]
+            ids = self._ids[rows]
+            overlap = np.bitwise_count(self._slots[rows] & mine).sum(axis=1, dtype=np.int64)
+
+        keep = (overlap > 0) & (ids != user_id)
+        ids, overlap = ids[keep], overlap[keep]
+        # Most shared hours first, newest user first among equals
+        keys = (overlap << 32) | ids
+        wanted = min(offset + limit, len(keys))
+        if not wanted:
+            return [], False
+        top = np.argpartition(keys, len(keys) - wanted)[len(keys) - wanted:]
+        top = top[np.argsort(keys[top])[::-1]][offset:]
+        return [(int(ids[i]), int(overlap[i])) for i in top], len(keys) > offset + limit
+
+availability_index = AvailabilityIndex()
+
+# Rated users. Rankings walk the score indexes on user_ratings and
+# skill_ratings and page with an offset, like the other ranked listings.
+# CROSS JOIN pins the ratings table as the outer loop; the planner would
+# rather sort every public user than trust the index to find a page early.
+DEFAULT_LEADERBOARD_LIMIT = 20
+MAX_LEADERBOARD_LIMIT = 100
+MAX_LEADERBOARD_OFFSET = 1000
+USER_SORTS = ('newest', 'rating')
+
+RATED_USERS_QUERY = '''
+    SELECT u.id, u.name, u.location, u.profile_photo, u.availability,
+           r.rating_count, r.rating_sum * 1.0 / r.rating_count AS rating_average, r.score AS rating_score
+    FROM {table} r
+    {join} users u ON u.id = r.user_id
+    WHERE {conditions}
+    ORDER BY r.score DESC, r.user_id
+    LIMIT ? OFFSET ?
+'''
+
+def rated_users_listing(user_id, search_skill='', near=None):
+    """users_listing's users, best rated first; returns (query, params) for get_offset_args paging"""
+    _, conditions, params = users_listing(user_id, search_skill, near)
+    # A skill or place narrows the users enough that sorting them is cheaper
+    join = 'JOIN' if search_skill or near else 'CROSS JOIN'
+    return RATED_USERS_QUERY.format(table='user_ratings', join=join, conditions=' AND '.join(conditions)), params
+
+def leaderboard_listing(skill=''):
+    """Public users with at least one rating, best first, overall or as teachers of a skill"""
+    conditions = ['r.rating_count > 0', 'u.is_public = 1']
+    if not skill:
+        return RATED_USERS_QUERY.format(table='user_ratings', join='CROSS JOIN', conditions=' AND '.join(conditions)), []
+    conditions.insert(0, 'r.skill_id = (SELECT id FROM skills WHERE name = ?)')
+    query = RATED_USERS_QUERY.format(table='skill_ratings', join='CROSS JOIN', conditions=' AND '.join(conditions))
+    return query, [skill.strip()]
+
+def rated_users_response(conn, query, params):
+    """One offset page of a rated users query, with a Link to the next"""
+    try:
+        limit, offset = get_offset_args(request.args, DEFAULT_LEADERBOARD_LIMIT,
+                                        MAX_LEADERBOARD_LIMIT, MAX_LEADERBOARD_OFFSET)
+        fields = rated_user_serializer.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Fetch one extra row to learn whether there is a next page
+    rows = conn.execute(query, params + [limit + 1, offset]).fetchall()
+    has_more = len(rows) > limit
+    response = jsonify(rated_user_serializer.serialize(conn, rows[:limit], fields))
+    if has_more:
+        args = request.args.to_dict()
+        args['offset'] = offset + limit
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response, 200
+
+# Password hashing. Hashes are computed in a small process pool so a login
+# spike can't pin every request thread on CPU-bound key stretching. The work
+# factor is a Werkzeug method string, e.g. 'pbkdf2:sha256:600000' or
+# 'scrypt:32768:8:1'; run benchmarks/password_hashing.py to pick one.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+# Hash jobs allowed to wait for a worker before new logins are turned away
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', PASSWORD_HASH_WORKERS * 4))
+PASSWORD_HASH_TIMEOUT = 30  # seconds
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash jobs are already queued"""
+
+_hash_executor = None
+_hash_executor_pid = None
+_hash_executor_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+def get_hash_executor():
+    """Process pool for password hashing, recreated after a fork"""
+    global _hash_executor, _hash_executor_pid
+    with _hash_executor_lock:
+        if _hash_executor is None or _hash_executor_pid != os.getpid():
+            _hash_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                                 initializer=reset_hash_worker_signals)
+            _hash_executor_pid = os.getpid()
+        return _hash_executor
+
+def reset_hash_worker_signals():
+    # Forked workers inherit the server's SIGTERM handler (uvicorn's only sets
+    # a flag), which would leave them running after the server shuts down
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+def run_hash_job(fn, *args):
+    """Run a hashing function in the pool, raising PasswordHasherBusy when saturated"""
+    if not _hash_slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        return get_hash_executor().submit(fn, *args).result(timeout=PASSWORD_HASH_TIMEOUT)
+    finally:
+        _hash_slots.release()
+
+def hash_password(password):
+    """Hash a password with the configured work factor"""
+    return run_hash_job(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    """Check a password against its stored hash"""
+    return run_hash_job(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with different parameters than configured"""
+    return password_hash.split('$', 1)[0] != PASSWORD_HASH_METHOD
+
+def upgrade_password_hash(conn, user_id, password_hash, password):
+    """Re-hash with the current parameters after a successful login.
+
+    Best effort: a busy pool just means the upgrade waits for the next login.
+    """
+    if not needs_rehash(password_hash):
+        return
+    try:
+        new_hash = hash_password(password)
+    except PasswordHasherBusy:
+        return
+    conn.execute(
+        'UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+        (new_hash, user_id, password_hash)
+    )
+    conn.commit()
+
+def hasher_busy_response():
+    response = jsonify({'error': 'Server busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Browse listing cache. A page of /api/users is the same for every caller
+# but for the caller's own row, so one result per normalized query (skill,
+# place, cursor and page size) is cached with a row to spare, and the
+# caller is dropped after lookup. Entries are tagged with what they list:
+# 'browse' for the unfiltered listing or 'skill:<id>' for one skill, plus
+# 'users' on all of them. Writes bump the tags of the users they touch,
+# before and after the change, in the transaction that makes it; an entry
+# filled under an older tag version is a miss. Tag versions are rows in
+# resource_versions, so a write made by any process invalidates entries in
+# every process as soon as it commits. USERS_CACHE_BACKEND picks where the
+# entries live: 'memory' keeps them in each process, 'sqlite' shares them
+# between the worker processes on a host through USERS_CACHE_PATH (put it
+# on /dev/shm to keep it in memory).
+USERS_CACHE_BACKEND = os.environ.get('USERS_CACHE_BACKEND', 'memory')
+USERS_CACHE_PATH = os.environ.get('USERS_CACHE_PATH', 'skill_swap_cache.db')
+USERS_CACHE_SIZE = int(os.environ.get('USERS_CACHE_SIZE', 1000))  # entries
+USERS_CACHE_TTL = 60  # seconds
+
+CACHE_TAG_VERSIONS_QUERY = 'SELECT name, version FROM resource_versions WHERE name IN ({placeholders})'
+
+BUMP_CACHE_TAG_QUERY = '''
+    INSERT INTO resource_versions (name, version, updated_at) VALUES (?, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+'''
+
+class MemoryCacheBackend:
+    """Per-process entries in a TTLCache"""
+
+    def __init__(self, maxsize, ttl):
+        self._entries = TTLCache(maxsize, ttl)
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, value):
+        self._entries.set(key, value)
+
+class SqliteCacheBackend:
+    """Entries in a SQLite file shared by worker processes.
+
+    Values are stored as JSON. Least recently used entries past `maxsize`
+    are evicted on write; reads refresh an entry's use time at most once a
+    second, so hot entries don't turn every hit into a write.
+    """
+
+    def __init__(self, path, maxsize, ttl):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            # Losing the cache in a crash is harmless
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_used ON entries (used_at)')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute('SELECT value, expires_at, used_at FROM entries WHERE key = ?', (key,)).fetchone()
+        now = time.time()
+        if row is None or row[1] < now:
+            return None
+        if now - row[2] >= 1:
+            conn.execute('UPDATE entries SET used_at = ? WHERE key = ?', (now, key))
+        return orjson.loads(row[0])
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO entries (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)
+            ''', (key, dump_json(value), now + self.ttl, now))
+            conn.execute('''
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entries ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.maxsize,))
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+
+CACHE_BACKENDS = {
+    'memory': lambda: MemoryCacheBackend(USERS_CACHE_SIZE, USERS_CACHE_TTL),
+    'sqlite': lambda: SqliteCacheBackend(USERS_CACHE_PATH, USERS_CACHE_SIZE, USERS_CACHE_TTL),
+}
+
+class ResultCache:
+    """Read-through cache of query results, invalidated by tag.
+
+    A tag's version is the resource_versions row cache:<name>:<tag>. Each
+    entry keeps the versions its tags had before it was computed, so a
+    write that bumps a tag while an entry is being filled still leaves that
+    entry stale. Hits and misses are counted in /metrics.
+    """
+
+    def __init__(self, name, backend):
+        self.name = name
+        self.backend = backend
+
+    def version_names(self, tags):
+        return [f'cache:{self.name}:{tag}' for tag in tags]
+
+    def lookup(self, key, versions):
+        """The entry under key if it was filled at these tag versions, else None"""
+        entry = self.backend.get(key)
+        hit = entry is not None and entry[0] == versions
+        metrics.inc('skillswap_cache_lookups_total', (('cache', self.name), ('result', 'hit' if hit else 'miss')))
+        return entry[1] if hit else None
+
+    def store(self, key, versions, value):
+        self.backend.set(key, [versions, value])
+
+    def get_or_fill(self, conn, key, tags, fill):
+        names = self.version_names(tags)
+        versions = tag_versions(conn.execute(*cache_versions_query(names)).fetchall(), names)
+        value = self.lookup(key, versions)
+        if value is None:
+            value = fill()
+            self.store(key, versions, value)
+        return value
+
+    def invalidate(self, conn, tags):
+        """Bump tags in conn's current transaction; they take effect when the caller commits"""
+        if tags:
+            conn.executemany(BUMP_CACHE_TAG_QUERY, [(name,) for name in self.version_names(sorted(tags))])
+
+def cache_versions_query(names):
+    """(query, params) reading the version rows of these names"""
+    return CACHE_TAG_VERSIONS_QUERY.format(placeholders=','.join('?' * len(names))), names
+
+def tag_versions(rows, names):
+    """Versions in the order of names, from (name, version) rows; 0 for names never bumped"""
+    versions = dict(rows)
+    return [versions.get(name, 0) for name in names]
+
+users_cache = ResultCache('users', CACHE_BACKENDS[USERS_CACHE_BACKEND]())
+
+def user_listing_tags(conn, user_ids):
+    """Cache tags of the browse pages that list, or could list, these users"""
+    tags = {'browse'}
+    for start in range(0, len(user_ids), SQL_PARAM_CHUNK):
+        chunk = user_ids[start:start + SQL_PARAM_CHUNK]
+        rows = conn.execute(f'''
+            SELECT DISTINCT skill_id FROM user_skills WHERE user_id IN ({','.join('?' * len(chunk))})
+        ''', chunk)
+        tags.update(f'skill:{skill_id}' for skill_id, in rows)
+    return tags
+
+def cached_users_page(conn, user_id, skill, near, limit, after):
+    """(rows, has_more) for a browse page, rows being (id, created_at, item) lists"""
+    skill_id = None
+    if skill:
+        skill_row = conn.execute('SELECT id FROM skills WHERE name = ?', (skill.strip(),)).fetchone()
+        if not skill_row:
+            return [], False
+        skill_id = skill_row[0]
+    
+    def fill():
+        query, conditions, params = users_listing(None, skill, near)
+        query, params = build_list_query(query, conditions, params, 'u', after)
+        # One row for the next-page check, one in case the caller is listed
+        rows = conn.execute(query + ' LIMIT ?', params + [limit + 2]).fetchall()
+        return [
+            [row['id'], row['created_at'], item]
+            for row, item in zip(rows, user_serializer.serialize(conn, rows))
+        ]
+    
+    key, tags = users_page_key(skill_id, near, after, limit)
+    rows = [row for row in users_cache.get_or_fill(conn, key, tags, fill) if row[0] != user_id]
+    return rows[:limit], len(rows) > limit
+
+def users_page_key(skill_id, near, after, limit):
+    """Cache key and tags of a browse page, shared with asgi.py"""
+    key = dump_json(['users', skill_id, near, after, limit]).decode()
+    return key, ['users', f'skill:{skill_id}' if skill_id else 'browse']
+
+# Bulk user import/export. Imports are matched on email: new addresses are
+# created, existing non-admin users are updated in place. Rows run in
+# batches, each one a single executemany upsert with its passwords hashed
+# in parallel. Hashing at the full work factor is by far the slowest part
+# (see benchmarks/password_hashing.py); rows that bring a password_hash,
+# e.g. from export-users --with-password-hashes, skip it entirely, and a
+# cheaper IMPORT_HASH_METHOD is upgraded on each user's first login.
+BULK_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson'
+}
+IMPORT_BATCH_SIZE = 2000
+IMPORT_MAX_ERRORS = 100  # errors listed in the summary; all of them are counted
+IMPORT_HASH_METHOD = os.environ.get('IMPORT_HASH_METHOD', PASSWORD_HASH_METHOD)
+IMPORT_HASH_WORKERS = int(os.environ.get('IMPORT_HASH_WORKERS', os.cpu_count() or 1))
+EXPORT_FIELDS = [
+    'id', 'name', 'email', 'location', 'profile_photo', 'skills_offered',
+    'skills_wanted', 'availability', 'availability_slots', 'is_public', 'created_at'
+]
+
+# An empty password_hash means "keep the current one"; only existing users
+# get here without a hash, since new ones are rejected beforehand. Unchanged
+# rows are skipped so re-imports don't churn the search index and ETags.
+IMPORT_UPSERT = '''
+    INSERT INTO users (name, email, password_hash, location, profile_photo,
+                       skills_offered, skills_wanted, availability, availability_slots, is_public)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (email) DO UPDATE SET
+        name = excluded.name,
+        password_hash = CASE WHEN excluded.password_hash = '' THEN users.password_hash
+                             ELSE excluded.password_hash END,
+        location = excluded.location,
+        profile_photo = excluded.profile_photo,
+        skills_offered = excluded.skills_offered,
+        skills_wanted = excluded.skills_wanted,
+        availability = excluded.availability,
+        availability_slots = excluded.availability_slots,
+        is_public = excluded.is_public
+    WHERE users.is_admin = 0 AND (
+        excluded.password_hash NOT IN ('', users.password_hash)
+        OR excluded.name IS NOT users.name
+        OR excluded.location IS NOT users.location
+        OR excluded.profile_photo IS NOT users.profile_photo
+        OR excluded.skills_offered IS NOT users.skills_offered
+        OR excluded.skills_wanted IS NOT users.skills_wanted
+        OR excluded.availability IS NOT users.availability
+        OR excluded.availability_slots IS NOT users.availability_slots
+        OR excluded.is_public IS NOT users.is_public
+    )
+'''
+
+def bulk_format(requested, filename_or_mimetype):
+    """Pick csv or jsonl from an explicit choice, else a file name or mimetype"""
+    if requested:
+        if requested not in BULK_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(BULK_FORMATS)}")
+        return requested
+    hint = (filename_or_mimetype or '').lower()
+    return 'jsonl' if hint.endswith(('.jsonl', '.ndjson', 'json')) else 'csv'
+
+def read_import_records(stream, fmt):
+    """Yield (line number, row dict or ValueError) from a binary CSV or JSONL stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except csv.Error as e:
+            yield reader.line_num, ValueError(f'malformed CSV: {e}')
+        return
+
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, ValueError('malformed JSON')
+            continue
+        yield line_number, row if isinstance(row, dict) else ValueError('expected a JSON object')
+
+def parse_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() not in ('0', 'false', 'no', 'off')
+    return bool(value)
+
+def parse_import_row(row):
+    """Validate one imported user, raising ValueError if it can't be used"""
+    name = str(row.get('name') or '').strip()
+    email = str(row.get('email') or '').strip()
+    if not name or not email:
+        raise ValueError('name and email are required')
+    if '@' not in email:
+        raise ValueError('invalid email')
+    password_hash = str(row.get('password_hash') or '')
+    if password_hash and '$' not in password_hash:
+        raise ValueError('password_hash must be a Werkzeug password hash')
+    return {
+        'name': name,
+        'email': email,
+        'password': str(row.get('password') or ''),
+        'password_hash': password_hash,
+        'location': str(row.get('location') or ''),
+        'profile_photo': store_profile_photo(row.get('profile_photo')),
+        'skills_offered': parse_skills(row.get('skills_offered')),
+        'skills_wanted': parse_skills(row.get('skills_wanted')),
+        'availability': str(row.get('availability') or 'weekends'),
+        'availability_slots': availability_bitmap(row),
+        'is_public': parse_bool(row.get('is_public'))
+    }
+
+def import_users(conn, records, atomic=False):
+    """Create or update users from (line number, row) records.
+
+    Commits after every batch, or once at the end when `atomic` (other
+    writers then wait for the whole import). Returns a summary with
+    created/updated/failed counts and the first IMPORT_MAX_ERRORS errors.
+    """
+    summary = {'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def fail(line_number, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < IMPORT_MAX_ERRORS:
+            summary['errors'].append({'line': line_number, 'error': message})
+
+    with ProcessPoolExecutor(max_workers=IMPORT_HASH_WORKERS, initializer=reset_hash_worker_signals) as pool:
+        batch = []
+        for line_number, row in records:
+            if isinstance(row, ValueError):
+                fail(line_number, str(row))
+                continue
+            try:
+                batch.append((line_number, parse_import_row(row)))
+            except ValueError as e:
+                fail(line_number, str(e))
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                import_batch(conn, batch, pool, summary, fail)
+                batch = []
+                if not atomic:
+                    conn.commit()
+        if batch:
+            import_batch(conn, batch, pool, summary, fail)
+    conn.commit()
+    summary['errors'].sort(key=lambda error: error['line'])
+
+    # The in-memory indexes can't patch in thousands of users cheaply; reload them
+    match_index.invalidate()
+    availability_index.invalidate()
+    return summary
+
+def import_batch(conn, batch, pool, summary, fail):
+    """Upsert one batch of parsed rows and replace their skills"""
+    emails = list({user['email'] for _, user in batch})
+    existing = {}
+    for start in range(0, len(emails), SQL_PARAM_CHUNK):
+        chunk = emails[start:start + SQL_PARAM_CHUNK]
+        existing.update(conn.execute(
+            f"SELECT email, is_admin FROM users WHERE email IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall())
+
+    # Last row wins when an email repeats within the batch
+    users = {}
+    for line_number, user in batch:
+        is_admin = existing.get(user['email'])
+        if is_admin:
+            fail(line_number, 'admin accounts cannot be imported over')
+        elif is_admin is None and user['email'] not in users and not (user['password'] or user['password_hash']):
+            fail(line_number, 'password or password_hash is required for new users')
+        else:
+            earlier = users.get(user['email'])
+            if earlier and not (user['password'] or user['password_hash']):
+                user['password'], user['password_hash'] = earlier['password'], earlier['password_hash']
+            summary['updated' if is_admin is not None or earlier else 'created'] += 1
+            users[user['email']] = user
+    users = list(users.values())
+
+    to_hash = [user for user in users if user['password'] and not user['password_hash']]
+    chunksize = max(1, len(to_hash) // (IMPORT_HASH_WORKERS * 4))
+    hashes = pool.map(generate_password_hash, [user['password'] for user in to_hash],
+                      [IMPORT_HASH_METHOD] * len(to_hash), chunksize=chunksize)
+    for user, password_hash in zip(to_hash, hashes):
+        user['password_hash'] = password_hash
+
+    conn.executemany(IMPORT_UPSERT, [(
+        user['name'], user['email'], user['password_hash'], user['location'],
+        user['profile_photo'], ','.join(user['skills_offered']), ','.join(user['skills_wanted']),
+        user['availability'], user['availability_slots'], user['is_public']
+    ) for user in users])
+
+    user_ids = {}
+    emails = [user['email'] for user in users]
+    for start in range(0, len(emails), SQL_PARAM_CHUNK):
+        chunk = emails[start:start + SQL_PARAM_CHUNK]
+        user_ids.update(conn.execute(
+            f"SELECT email, id FROM users WHERE email IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall())
+
+    names = list({name for user in users for name in user['skills_offered'] + user['skills_wanted']})
+    skill_ids = dict(zip(names, get_skill_ids(conn, names)))
+    conn.executemany('DELETE FROM user_skills WHERE user_id = ?', [(user_ids[email],) for email in emails])
+    conn.executemany('''
+        INSERT INTO user_skills (user_id, skill_id, direction, position)
+        VALUES (?, ?, ?, ?)
+    ''', [
+        (user_ids[user['email']], skill_ids[name], direction, position)
+        for user in users
+        for direction in ('offered', 'wanted')
+        for position, name in enumerate(user[f'skills_{direction}'])
+    ])
+    users_cache.invalidate(conn, {'users'})
+
+def export_users(conn, include_password_hash=False):
+    """Yield every non-admin user as a dict, reading the table in batches"""
+    cursor = conn.execute('''
+        SELECT id, name, email, password_hash, location, profile_photo,
+               availability, availability_slots, is_public, created_at
+        FROM users
+        WHERE is_admin = 0
+        ORDER BY id
+    ''')
+    while True:
+        rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+        if not rows:
+            break
+        skills = get_user_skills(conn, [row['id'] for row in rows])
+        for row in rows:
+            user = {field: row[field] for field in EXPORT_FIELDS if field in row.keys()}
+            user['skills_offered'] = skills[row['id']]['offered']
+            user['skills_wanted'] = skills[row['id']]['wanted']
+            user['availability_slots'] = decode_slots(row['availability_slots'])
+            if include_password_hash:
+                user['password_hash'] = row['password_hash']
+            yield user
+
+def format_export(users, fmt, include_password_hash=False):
+    """Encode exported users as CSV or JSONL text, one chunk per batch"""
+    fields = EXPORT_FIELDS + (['password_hash'] if include_password_hash else [])
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fields) if fmt == 'csv' else None
+    if writer:
+        writer.writeheader()
+    for count, user in enumerate(users, 1):
+        if writer:
+            writer.writerow(dict(user, skills_offered=','.join(user['skills_offered']),
+                                 skills_wanted=','.join(user['skills_wanted']),
+                                 availability_slots=','.join(map(str, user['availability_slots']))))
+        else:
+            buffer.write(json.dumps(user) + '\n')
+        if count % STREAM_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@app.cli.command('import-users')
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(list(BULK_FORMATS)), help='Defaults to the file extension.')
+@click.option('--atomic', is_flag=True, help='Import everything in one transaction, or nothing.')
+def import_users_command(source, fmt, atomic):
+    """Create or update users from a CSV or JSONL file ('-' for stdin)"""
+    fmt = bulk_format(fmt, source.name)
+    conn = connect_db()
+    migrate_db(conn)
+    start = time.perf_counter()
+    try:
+        summary = import_users(conn, read_import_records(source, fmt), atomic)
+    finally:
+        conn.close()
+    for error in summary['errors']:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    print(f"{summary['created']} created, {summary['updated']} updated, {summary['failed']} failed "
+          f"in {time.perf_counter() - start:.1f}s")
+
+@app.cli.command('export-users')
+@click.argument('target', type=click.File('w'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(list(BULK_FORMATS)), help='Defaults to the file extension.')
+@click.option('--with-password-hashes', is_flag=True, help='Include password hashes, to move users to another instance.')
+def export_users_command(target, fmt, with_password_hashes):
+    """Write every non-admin user to a CSV or JSONL file ('-' for stdout)"""
+    fmt = bulk_format(fmt, target.name)
+    conn = connect_db()
+    try:
+        for chunk in format_export(export_users(conn, with_password_hashes), fmt, with_password_hashes):
+            target.write(chunk)
+    finally:
+        conn.close()
+
+# Bulk admin operations. Each operation applies one change to a list of ids
+# with set-based statements, committing every BULK_CHUNK_SIZE ids so other
+# writers get the database between chunks; a failure leaves the chunks
+# before it applied. Admin accounts are left alone, as in imports.
+BULK_CHUNK_SIZE = SQL_PARAM_CHUNK // 2  # delete_users binds each id twice
+BULK_MAX_IDS = int(os.environ.get('BULK_MAX_IDS', 100000))
+
+def get_bulk_operations(data):
+    """Read [(op, ids)] from a /api/admin/bulk body, raising ValueError if invalid"""
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('operations must be a non-empty list')
+    parsed = []
+    total = 0
+    for operation in operations:
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if op not in BULK_OPERATIONS:
+            raise ValueError(f"op must be one of: {', '.join(BULK_OPERATIONS)}")
+        ids = operation.get('ids')
+        if not isinstance(ids, list) or not all(type(item_id) is int and item_id > 0 for item_id in ids):
+            raise ValueError('ids must be a list of positive integers')
+        ids = list(dict.fromkeys(ids))
+        total += len(ids)
+        if total > BULK_MAX_IDS:
+            raise ValueError(f'at most {BULK_MAX_IDS} ids per request')
+        parsed.append((op, ids))
+    return parsed
+
+def existing_users(conn, user_ids):
+    """Map the given ids that exist to their is_admin flag"""
+    placeholders = ','.join('?' * len(user_ids))
+    return dict(conn.execute(f'SELECT id, is_admin FROM users WHERE id IN ({placeholders})', user_ids).fetchall())
+
+def set_users_public(conn, user_ids, is_public):
+    """Hide or show a chunk of users; return {id: status}"""
+    found = existing_users(conn, user_ids)
+    changed = [user_id for user_id, is_admin in found.items() if not is_admin]
+    if changed:
+        conn.execute(f'''
+            UPDATE users SET is_public = ?
+            WHERE id IN ({','.join('?' * len(changed))}) AND is_public IS NOT ?
+        ''', [int(is_public)] + changed + [int(is_public)])
+        users_cache.invalidate(conn, user_listing_tags(conn, changed))
+    conn.commit()
+    for user_id in changed:
+        match_index.set_public(user_id, is_public)
+        availability_index.set_public(user_id, is_public)
+    return bulk_user_statuses(user_ids, found, 'shown' if is_public else 'hidden')
+
+def delete_users(conn, user_ids):
+    """Delete a chunk of users with their skills and swap requests; return {id: status}"""
+    found = existing_users(conn, user_ids)
+    deleted = [user_id for user_id, is_admin in found.items() if not is_admin]
+    deleted_requests = []
+    if deleted:
+        users_cache.invalidate(conn, user_listing_tags(conn, deleted))
+        restore_user_swap_requests(conn, deleted)
+        placeholders = ','.join('?' * len(deleted))
+        deleted_requests = conn.execute(f'''
+            DELETE FROM swap_requests
+            WHERE from_user_id IN ({placeholders}) OR to_user_id IN ({placeholders})
+            RETURNING id, from_user_id, to_user_id
+        ''', deleted + deleted).fetchall()
+        conn.execute(f'DELETE FROM user_skills WHERE user_id IN ({placeholders})', deleted)
+        conn.execute(f'DELETE FROM users WHERE id IN ({placeholders})', deleted)
+    conn.commit()
+    for user_id in deleted:
+        admin_cache.invalidate(user_id)
+        match_index.remove_user(user_id)
+        availability_index.remove_user(user_id)
+    for req in deleted_requests:
+        publish_swap_request_deleted(req)
+    return bulk_user_statuses(user_ids, found, 'deleted')
+
+def bulk_user_statuses(user_ids, found, done):
+    return {
+        user_id: done if found.get(user_id) == 0 else 'skipped' if user_id in found else 'not_found'
+        for user_id in user_ids
+    }
+
+def delete_swap_requests(conn, request_ids):
+    """Delete a chunk of swap requests and notify their users; return {id: status}"""
+    restore_swap_requests(conn, request_ids)
+    placeholders = ','.join('?' * len(request_ids))
+    found = conn.execute(f'''
+        SELECT id, from_user_id, to_user_id FROM swap_requests WHERE id IN ({placeholders})
+    ''', request_ids).fetchall()
+    if found:
+        conn.execute(f"DELETE FROM swap_requests WHERE id IN ({','.join('?' * len(found))})",
+                     [req['id'] for req in found])
+    conn.commit()
+    for req in found:
+        publish_swap_request_deleted(req)
+    deleted = {req['id'] for req in found}
+    return {request_id: 'deleted' if request_id in deleted else 'not_found' for request_id in request_ids}
+
+BULK_OPERATIONS = {
+    'hide_users': lambda conn, ids: set_users_public(conn, ids, False),
+    'show_users': lambda conn, ids: set_users_public(conn, ids, True),
+    'delete_users': delete_users,
+    'delete_swap_requests': delete_swap_requests,
+}
+
+def run_bulk_operations(conn, operations, lease=None):
+    """Apply [(op, ids)] in order, chunk by chunk; return per-operation results.
+
+    Run as a job, the lease is renewed with each chunk's commit.
+    """
+    results = []
+    for op, ids in operations:
+        statuses = {}
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            if lease:
+                lease.renew(conn)
+            statuses.update(BULK_OPERATIONS[op](conn, ids[start:start + BULK_CHUNK_SIZE]))
+        counts = {}
+        for status in statuses.values():
+            counts[status] = counts.get(status, 0) + 1
+        results.append({
+            'op': op,
+            'counts': counts,
+            'results': [{'id': item_id, 'status': status} for item_id, status in statuses.items()]
+        })
+    return results
+
+# Swap request archive. Closed (accepted or rejected) requests older than
+# SWAP_ARCHIVE_AFTER_DAYS are moved out of swap_requests by a background
+# job, into one table per month they were made in (swap_requests_archive_
+# YYYY_MM), so the inbox queries only walk requests still in play. Listings
+# read the archive too when asked for ?history=1, as one UNION ALL that
+# SQLite merges in index order. archived_swap_requests maps archived ids to
+# their month; the stats and rating triggers skip ids in it, so moving a
+# request either way leaves the counters alone. A request that is changed
+# or deleted is moved back first, in the transaction that changes it, and
+# the handlers then work on swap_requests as before.
+SWAP_ARCHIVE_AFTER_DAYS = int(os.environ.get('SWAP_ARCHIVE_AFTER_DAYS', 180))
+# 0 leaves archiving to `flask archive-swap-requests` and admin-queued jobs
+SWAP_ARCHIVE_SCHEDULED = os.environ.get('SWAP_ARCHIVE_SCHEDULED', '1') == '1'
+SWAP_ARCHIVE_BATCH_SIZE = 5000  # requests moved per transaction
+
+SWAP_REQUEST_COLUMNS = 'id, from_user_id, to_user_id, my_skill, wanted_skill, status, rating, feedback, created_at'
+
+ARCHIVE_PARTITIONS_QUERY = '''
+    SELECT name FROM sqlite_master
+    WHERE type = 'table' AND name GLOB 'swap_requests_archive_[0-9]*'
+    ORDER BY name DESC
+'''
+
+ARCHIVE_CANDIDATES_QUERY = '''
+    SELECT id, strftime('%Y_%m', created_at) AS month FROM swap_requests
+    WHERE status != 'pending' AND created_at < datetime('now', ?)
+    ORDER BY created_at
+    LIMIT ?
+'''
+
+def archive_table(month):
+    return f'swap_requests_archive_{month}'
+
+def archive_partitions(conn):
+    """Archive table names, newest month first"""
+    return [row[0] for row in conn.execute(ARCHIVE_PARTITIONS_QUERY)]
+
+def with_archives(query, archives):
+    """A listing query over swap_requests, or over it and `archives` combined.
+
+    `query` reads `{table} sr`; the union is aliased sr as well, so the
+    listing's conditions and ordering apply to it unchanged.
+    """
+    if not archives:
+        return query.format(table='swap_requests')
+    tables = ('swap_requests',) + tuple(archives)
+    return 'SELECT * FROM (' + ' UNION ALL '.join(query.format(table=table) for table in tables) + ') sr'
+
+def all_swap_requests(conn):
+    """swap_requests with the archive, for use in a FROM clause"""
+    archives = archive_partitions(conn)
+    if not archives:
+        return 'swap_requests'
+    selects = [f'SELECT {SWAP_REQUEST_COLUMNS} FROM {table}' for table in ['swap_requests'] + archives]
+    return '(' + ' UNION ALL '.join(selects) + ')'
+
+def create_archive_partition(conn, month):
+    table = archive_table(month)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            from_user_id INTEGER NOT NULL,
+            to_user_id INTEGER NOT NULL,
+            my_skill TEXT NOT NULL,
+            wanted_skill TEXT NOT NULL,
+            status TEXT,
+            rating INTEGER,
+            feedback TEXT,
+            created_at TIMESTAMP
+        )
+    ''')
+    # The same access paths as the listings use on swap_requests
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_from ON {table} (from_user_id, created_at)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_to ON {table} (to_user_id, created_at)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_created ON {table} (created_at)')
+    return table
+
+def archive_swap_requests(conn, days=SWAP_ARCHIVE_AFTER_DAYS, batch_size=SWAP_ARCHIVE_BATCH_SIZE, lease=None):
+    """Move closed requests older than `days` into the archive; return how many moved.
+
+    Each batch is one write transaction, so a request can't be reopened
+    between being picked and being moved. Run as a job, each batch renews
+    the lease before it commits.
+    """
+    moved = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(ARCHIVE_CANDIDATES_QUERY, (f'-{days} days', batch_size)).fetchall()
+            by_month = {}
+            for request_id, month in rows:
+                by_month.setdefault(month, []).append(request_id)
+            for month, request_ids in by_month.items():
+                table = create_archive_partition(conn, month)
+                for start in range(0, len(request_ids), SQL_PARAM_CHUNK):
+                    chunk = request_ids[start:start + SQL_PARAM_CHUNK]
+                    placeholders = ','.join('?' * len(chunk))
+                    # Indexed first, so the triggers let the rows go uncounted
+                    conn.executemany('INSERT INTO archived_swap_requests (id, month) VALUES (?, ?)',
+                                     [(request_id, month) for request_id in chunk])
+                    conn.execute(f'''
+                        INSERT INTO {table} ({SWAP_REQUEST_COLUMNS})
+                        SELECT {SWAP_REQUEST_COLUMNS} FROM swap_requests WHERE id IN ({placeholders})
+                    ''', chunk)
+                    conn.execute(f'DELETE FROM swap_requests WHERE id IN ({placeholders})', chunk)
+            if lease:
+                lease.renew(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        moved += len(rows)
+        if len(rows) < batch_size:
+            return moved
+
+def restore_swap_requests(conn, request_ids):
+    """Move any of these requests that are archived back to swap_requests; return how many moved.
+
+    The move is left uncommitted, so it lands in the same transaction as
+    the change the caller makes to the restored requests.
+    """
+    by_month = {}
+    for start in range(0, len(request_ids), SQL_PARAM_CHUNK):
+        chunk = request_ids[start:start + SQL_PARAM_CHUNK]
+        rows = conn.execute(f'''
+            SELECT id, month FROM archived_swap_requests WHERE id IN ({','.join('?' * len(chunk))})
+        ''', chunk)
+        for request_id, month in rows:
+            by_month.setdefault(month, []).append(request_id)
+    if not by_month:
+        return 0
+    
+    for month, archived_ids in by_month.items():
+        table = archive_table(month)
+        for start in range(0, len(archived_ids), SQL_PARAM_CHUNK):
+            chunk = archived_ids[start:start + SQL_PARAM_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            conn.execute(f'''
+                INSERT INTO swap_requests ({SWAP_REQUEST_COLUMNS})
+                SELECT {SWAP_REQUEST_COLUMNS} FROM {table} WHERE id IN ({placeholders})
+            ''', chunk)
+            conn.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', chunk)
+            conn.execute(f'DELETE FROM archived_swap_requests WHERE id IN ({placeholders})', chunk)
+    return sum(len(archived_ids) for archived_ids in by_month.values())
+
+def restore_user_swap_requests(conn, user_ids):
+    """Move every archived request sent or received by these users back, uncommitted"""
+    request_ids = []
+    for table in archive_partitions(conn):
+        for start in range(0, len(user_ids), SQL_PARAM_CHUNK // 2):
+            chunk = user_ids[start:start + SQL_PARAM_CHUNK // 2]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(f'''
+                SELECT id FROM {table} WHERE from_user_id IN ({placeholders}) OR to_user_id IN ({placeholders})
+            ''', chunk + chunk)
+            request_ids.extend(request_id for request_id, in rows)
+    return restore_swap_requests(conn, request_ids)
+
+def find_swap_request(conn, request_id):
+    """A swap request whether or not it is archived, without moving it"""
+    swap_request = conn.execute('SELECT * FROM swap_requests WHERE id = ?', (request_id,)).fetchone()
+    if swap_request is None:
+        archived = conn.execute('SELECT month FROM archived_swap_requests WHERE id = ?', (request_id,)).fetchone()
+        if archived is not None:
+            swap_request = conn.execute(f'''
+                SELECT {SWAP_REQUEST_COLUMNS} FROM {archive_table(archived['month'])} WHERE id = ?
+            ''', (request_id,)).fetchone()
+    return swap_request
+
+@app.cli.command('archive-swap-requests')
+@click.option('--days', type=int, default=SWAP_ARCHIVE_AFTER_DAYS, help='Archive closed requests older than this.')
+def archive_swap_requests_command(days):
+    """Move old closed swap requests into the monthly archive tables"""
+    conn = connect_db()
+    migrate_db(conn)
+    
+    start = time.perf_counter()
+    moved = archive_swap_requests(conn, days)
+    conn.close()
+    print(f'{moved} swap requests archived in {time.perf_counter() - start:.1f}s')
+
+# Background jobs. Work that doesn't have to finish inside a request is
+# queued in the jobs table, so it survives restarts, and run by a pool of
+# worker threads in each process (JOB_WORKERS; 0 leaves it to `flask
+# run-jobs`). Claiming a job is one UPDATE ... RETURNING, so two workers
+# never take the same job, and a claim is a lease: a job whose worker died
+# is queued again once the lease runs out. Long handlers renew the lease as
+# they go, and work is only committed together with a renewal, so a worker
+# that lost its lease stops instead of finishing alongside the new one.
+# Handlers may still run more than once and must be safe to repeat. Failed attempts are retried with
+# exponential backoff; higher priorities run first.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_SECONDS = 1.0  # how soon idle workers notice jobs queued by other processes
+JOB_LEASE_SECONDS = 600
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY_SECONDS = 10  # doubled after each failed attempt
+JOB_MAINTENANCE_SECONDS = 60  # how often expired leases and old jobs are cleaned up
+JOB_RETENTION_DAYS = 7  # completed jobs are deleted after this long
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+JOB_PRIORITY_HIGH = 10
+JOB_PRIORITY_LOW = -10
+# Queue bulk requests with more ids than this instead of running them inline
+BULK_INLINE_MAX_IDS = int(os.environ.get('BULK_INLINE_MAX_IDS', 1000))
+
+READY_JOB_QUERY = '''
+    SELECT 1 FROM jobs
+    WHERE status = 'queued' AND run_after <= datetime('now')
+    LIMIT 1
+'''
+
+CLAIM_JOB_QUERY = '''
+    UPDATE jobs
+    SET status = 'running', attempts = attempts + 1, locked_until = datetime('now', ?)
+    WHERE id = (
+        SELECT id FROM jobs
+        WHERE status = 'queued' AND run_after <= datetime('now')
+        ORDER BY priority DESC, id
+        LIMIT 1
+    )
+    RETURNING id, kind, payload, attempts, max_attempts
+'''
+
+ARCHIVE_JOB_PENDING_QUERY = '''
+    SELECT 1 FROM jobs
+    WHERE status IN ('queued', 'running') AND kind = 'archive_swap_requests'
+    LIMIT 1
+'''
+
+# Out of attempts -> failed, otherwise back in the queue after run_after
+RELEASE_JOB_QUERY = '''
+    UPDATE jobs
+    SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+        finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END,
+        run_after = datetime('now', ?),
+        error = ?,
+        locked_until = NULL
+'''
+
+# Extends the lease; matches no row once the job was released or reclaimed
+RENEW_JOB_LEASE_QUERY = '''
+    UPDATE jobs SET locked_until = datetime('now', ?)
+    WHERE id = ? AND attempts = ? AND status = 'running'
+'''
+
+class JobLeaseLost(Exception):
+    """Raised when a job's lease ran out and the job was released or claimed again"""
+
+class JobLease:
+    """A worker's claim on one job attempt.
+
+    renew() runs inside the caller's transaction, so the new expiry and the
+    work done since the last renewal are committed together, and only by
+    the worker still holding the claim.
+    """
+
+    def __init__(self, job):
+        self.job_id = job['id']
+        self.attempts = job['attempts']
+
+    def renew(self, conn):
+        renewed = conn.execute(RENEW_JOB_LEASE_QUERY, (
+            f'+{JOB_LEASE_SECONDS} seconds', self.job_id, self.attempts
+        )).rowcount
+        if not renewed:
+            raise JobLeaseLost(f'Job {self.job_id} lost its lease on attempt {self.attempts}')
+
+def enqueue_job(conn, kind, payload, priority=0, max_attempts=JOB_MAX_ATTEMPTS):
+    """Queue a job and commit it with the rest of the transaction; return its id"""
+    job_id = conn.execute('''
+        INSERT INTO jobs (kind, payload, priority, max_attempts) VALUES (?, ?, ?, ?)
+    ''', (kind, dump_json(payload).decode(), priority, max_attempts)).lastrowid
+    conn.commit()
+    job_queue.notify()
+    return job_id
+
+def retry_delay(attempts):
+    return f'+{JOB_RETRY_DELAY_SECONDS * 2 ** (attempts - 1)} seconds'
+
+def expire_job_leases(conn):
+    """Put jobs whose worker stopped renewing them back in the queue"""
+    conn.execute(RELEASE_JOB_QUERY + " WHERE status = 'running' AND locked_until < datetime('now')",
+                 ('+0 seconds', 'Lease expired before the job finished'))
+    conn.execute("DELETE FROM jobs WHERE status = 'done' AND created_at < datetime('now', ?)",
+                 (f'-{JOB_RETENTION_DAYS} days',))
+    conn.commit()
+
+def schedule_swap_archive(conn):
+    """Queue an archive run if a request is due for it and no run is queued or running"""
+    if not SWAP_ARCHIVE_SCHEDULED:
+        return
+    if conn.execute(ARCHIVE_CANDIDATES_QUERY, (f'-{SWAP_ARCHIVE_AFTER_DAYS} days', 1)).fetchone() is None:
+        return
+    if conn.execute(ARCHIVE_JOB_PENDING_QUERY).fetchone() is None:
+        enqueue_job(conn, 'archive_swap_requests', {}, JOB_PRIORITY_LOW)
+
+def run_job(conn, job):
+    """Run a claimed job and record its outcome: 'done', 'retried', 'failed' or 'lost'"""
+    lease = JobLease(job)
+    try:
+        result = JOB_HANDLERS[job['kind']](conn, json.loads(job['payload']), lease)
+        lease.renew(conn)
+        conn.commit()
+    except JobLeaseLost:
+        # Another worker owns the job now; leave its row alone
+        conn.rollback()
+        app.logger.warning('Job %s (%s) lost its lease on attempt %s', job['id'], job['kind'], job['attempts'])
+        return 'lost'
+    except Exception as e:
+        conn.rollback()
+        app.logger.exception('Job %s (%s) failed on attempt %s', job['id'], job['kind'], job['attempts'])
+        # attempts guards against a worker whose lease expired and was retaken
+        conn.execute(RELEASE_JOB_QUERY + ' WHERE id = ? AND attempts = ?', (
+            retry_delay(job['attempts']), f'{type(e).__name__}: {e}', job['id'], job['attempts']
+        ))
+        conn.commit()
+        return 'retried' if job['attempts'] < job['max_attempts'] else 'failed'
+
+    conn.execute('''
+        UPDATE jobs
+        SET status = 'done', result = ?, error = NULL, locked_until = NULL, finished_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND attempts = ?
+    ''', (None if result is None else dump_json(result).decode(), job['id'], job['attempts']))
+    conn.commit()
+    return 'done'
+
+class JobQueue:
+    """Worker threads draining the jobs table.
+
+    Idle workers sleep until a job is queued in this process or
+    JOB_POLL_SECONDS pass, which is how they notice jobs queued elsewhere.
+    Checking for ready jobs is a read, so idle polling doesn't take the
+    database write lock.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._threads = []
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._maintained_at = None
+
+    def start(self):
+        """Start the worker threads, once per process"""
+        if self._threads or not self.workers:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self.work, name=f'job-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self):
+        self._wake.set()
+
+    def work(self, stop_when_idle=False):
+        """Run jobs until the process exits, or until none are ready"""
+        conn = connect_db()
+        try:
+            while True:
+                try:
+                    ran = self.run_next(conn)
+                except sqlite3.Error:
+                    app.logger.exception('Job worker could not reach the queue')
+                    conn.rollback()
+                    ran = False
+                if ran:
+                    continue
+                if stop_when_idle:
+                    return
+                self._wake.wait(JOB_POLL_SECONDS)
+                self._wake.clear()
+        finally:
+            conn.close()
+
+    def run_next(self, conn):
+        """Claim and run one job; return False if none was ready"""
+        now = time.monotonic()
+        with self._lock:
+            maintain = self._maintained_at is None or now - self._maintained_at >= JOB_MAINTENANCE_SECONDS
+            if maintain:
+                self._maintained_at = now
+        if maintain:
+            expire_job_leases(conn)
+            prune_idempotency_keys(conn)
+            schedule_swap_archive(conn)
+
+        if conn.execute(READY_JOB_QUERY).fetchone() is None:
+            return False
+        job = conn.execute(CLAIM_JOB_QUERY, (f'+{JOB_LEASE_SECONDS} seconds',)).fetchone()
+        conn.commit()
+        if job is None:
+            # Another worker got there first
+            return True
+
+        started = time.perf_counter()
+        outcome = run_job(conn, job)
+        labels = (('kind', job['kind']), ('outcome', outcome))
+        metrics.inc('skillswap_jobs_total', labels)
+        metrics.observe('skillswap_job_duration_seconds', labels, time.perf_counter() - started)
+        return True
+
+job_queue = JobQueue(JOB_WORKERS)
+
+@app.before_request
+def start_job_workers():
+    job_queue.start()
+
+def delete_user_job(conn, payload, lease):
+    """Delete a user with their skills and swap requests, and notify the other party"""
+    user_id = payload['user_id']
+    restore_user_swap_requests(conn, [user_id])
+    deleted_requests = conn.execute('''
+        DELETE FROM swap_requests WHERE from_user_id = ? OR to_user_id = ?
+        RETURNING id, from_user_id, to_user_id
+    ''', (user_id, user_id)).fetchall()
+    conn.execute('DELETE FROM user_skills WHERE user_id = ?', (user_id,))
+    conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+    lease.renew(conn)
+    conn.commit()
+
+    admin_cache.invalidate(user_id)
+    match_index.remove_user(user_id)
+    availability_index.remove_user(user_id)
+    for req in deleted_requests:
+        publish_swap_request_deleted(req)
+    return {'deleted_swap_requests': len(deleted_requests)}
+
+def bulk_job(conn, payload, lease):
+    """Run a queued /api/admin/bulk request"""
+    return {'operations': run_bulk_operations(conn, payload['operations'], lease)}
+
+def archive_swap_requests_job(conn, payload, lease):
+    """Move old closed swap requests into the archive"""
+    return {'archived': archive_swap_requests(conn, payload.get('days', SWAP_ARCHIVE_AFTER_DAYS), lease=lease)}
+
+def rebuild_stats_job(conn, payload, lease):
+    """Recompute the materialized statistics and rating aggregates"""
+    rebuild_stats(conn)
+    rebuild_ratings(conn)
+
+JOB_HANDLERS = {
+    'delete_user': delete_user_job,
+    'bulk': bulk_job,
+    'rebuild_stats': rebuild_stats_job,
+    'archive_swap_requests': archive_swap_requests_job,
+}
+
+# Kinds admins may queue directly through POST /api/admin/jobs
+ADMIN_JOB_KINDS = {'rebuild_stats': JOB_PRIORITY_LOW, 'archive_swap_requests': JOB_PRIORITY_LOW}
+
+def jobs_listing(status=None):
+    """Every job, or those in one status"""
+    query = '''
+        SELECT j.id, j.kind, j.priority, j.status, j.attempts, j.max_attempts, j.run_after,
+               j.error, j.created_at, j.finished_at
+        FROM jobs j
+    '''
+    if status:
+        return query, ['j.status = ?'], [status]
+    return query, [], []
+
+@app.cli.command('run-jobs')
+@click.option('--workers', type=int, default=JOB_WORKERS or 1, help='Worker threads.')
+@click.option('--drain', is_flag=True, help='Exit once no job is ready instead of waiting for more.')
+def run_jobs_command(workers, drain):
+    """Run queued background jobs in the foreground"""
+    conn = connect_db()
+    migrate_db(conn)
+    conn.close()
+    
+    runner = JobQueue(workers)
+    threads = [threading.Thread(target=runner.work, args=(drain,), daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+    except KeyboardInterrupt:
+        pass
+
+# Profile photos. Uploads are stored once per distinct image, named by their
+# SHA-256, under PHOTO_DIR; users.profile_photo only holds the URL a photo is
+# served from. Square JPEG thumbnails are cut in a thread pool right after
+# upload, or on first request if that comes first (e.g. to another worker
+# process). A photo URL always names the same bytes, so clients and proxies
+# may cache responses forever.
+PHOTO_DIR = os.environ.get('PHOTO_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'photos'))
+PHOTO_MAX_BYTES = 5 * 1024 * 1024
+PHOTO_MAX_PIXELS = 40_000_000  # decoded size cap, against decompression bombs
+PHOTO_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+PHOTO_MIMETYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp', 'gif': 'image/gif'}
+THUMBNAIL_SIZES = (64, 256)  # pixels square
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+THUMBNAIL_WAIT_SECONDS = 10
+PHOTO_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+PHOTO_HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
+# Longest profile_photo kept as given; anything longer has to be uploaded
+MAX_PHOTO_REFERENCE_LENGTH = 2048
+DATA_URI_PATTERN = re.compile(r'data:image/[\w.+-]+;base64,(.*)', re.DOTALL)
+
+def photo_url(photo_hash, ext):
+    return f'/api/photos/{photo_hash}.{ext}'
+
+def thumbnail_url(photo_hash, size):
+    return f'/api/photos/{photo_hash}/{size}.jpg'
+
+def photo_path(photo_hash, name):
+    # Fan out over 256 directories so none grows too large
+    return os.path.join(PHOTO_DIR, photo_hash[:2], name)
+
+def find_photo(photo_hash):
+    """Path and extension of a stored original, or (None, None)"""
+    for ext in PHOTO_FORMATS.values():
+        path = photo_path(photo_hash, f'{photo_hash}.{ext}')
+        if os.path.exists(path):
+            return path, ext
+    return None, None
+
+def write_file(path, data):
+    """Write a file atomically, so readers never see it half-written"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+def store_photo(data):
+    """Check and store uploaded image bytes; return (content hash, extension).
+
+    Raises ValueError for anything but a JPEG, PNG, WebP or GIF image
+    within the size limits.
+    """
+    if len(data) > PHOTO_MAX_BYTES:
+        raise ValueError(f'photo must be at most {PHOTO_MAX_BYTES // (1024 * 1024)} MB')
+    try:
+        # Only parses the header; pixels are decoded when thumbnails are cut
+        with Image.open(io.BytesIO(data)) as image:
+            fmt, pixels = image.format, image.width * image.height
+    except (OSError, Image.DecompressionBombError):
+        fmt, pixels = None, 0
+    if fmt not in PHOTO_FORMATS:
+        raise ValueError('photo must be a JPEG, PNG, WebP or GIF image')
+    if pixels > PHOTO_MAX_PIXELS:
+        raise ValueError(f'photo must be at most {PHOTO_MAX_PIXELS} pixels')
+    
+    photo_hash = hashlib.sha256(data).hexdigest()
+    ext = PHOTO_FORMATS[fmt]
+    path = photo_path(photo_hash, f'{photo_hash}.{ext}')
+    if not os.path.exists(path):
+        write_file(path, data)
+    return photo_hash, ext
+
+def make_thumbnail(photo_hash, size):
+    """Cut the square thumbnail of a stored photo, if missing; return its path"""
+    path = photo_path(photo_hash, f'{photo_hash}_{size}.jpg')
+    if os.path.exists(path):
+        return path
+    original, _ = find_photo(photo_hash)
+    with Image.open(original) as image:
+        # Lets JPEGs decode straight at a fraction of their full size
+        image.draft('RGB', (size * 2, size * 2))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            # Flatten transparency onto white rather than JPEG's black
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, 'white')
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+    write_file(path, buffer.getvalue())
+    return path
+
+thumbnail_pool = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+thumbnail_jobs = {}  # (photo hash, size) -> Future, while queued or running
+thumbnail_jobs_lock = threading.Lock()
+
+def thumbnail_job(photo_hash, size):
+    """Future for one thumbnail, queueing it unless it's already on its way"""
+    key = (photo_hash, size)
+    with thumbnail_jobs_lock:
+        job = thumbnail_jobs.get(key)
+        if job is not None:
+            return job
+        job = thumbnail_jobs[key] = thumbnail_pool.submit(make_thumbnail, photo_hash, size)
+
+    def forget(_):
+        with thumbnail_jobs_lock:
+            thumbnail_jobs.pop(key, None)
+
+    job.add_done_callback(forget)
+    return job
+
+def queue_thumbnails(photo_hash):
+    for size in THUMBNAIL_SIZES:
+        thumbnail_job(photo_hash, size)
+
+def store_profile_photo(value, make_thumbnails=True):
+    """The profile_photo to save for a profile write, raising ValueError if unusable.
+
+    Inline data: URI images are moved into the photo store and replaced by
+    their URL; short values such as URLs are kept as given.
+    """
+    value = str(value or '')
+    match = DATA_URI_PATTERN.match(value)
+    if match:
+        try:
+            data = base64.b64decode(match.group(1))
+        except (binascii.Error, ValueError):
+            raise ValueError('profile_photo is not valid base64 image data')
+        photo_hash, ext = store_photo(data)
+        if make_thumbnails:
+            queue_thumbnails(photo_hash)
+        return photo_url(photo_hash, ext)
+    if len(value) > MAX_PHOTO_REFERENCE_LENGTH:
+        raise ValueError('profile_photo must be a URL; upload images to /api/profile/photo')
+    return value
+
+# Admin flag per user id, so admin_required doesn't query on every call.
+# Writes in this process invalidate immediately; other worker processes
+# notice within the TTL.
+ADMIN_CACHE_TTL = 30  # seconds
+admin_cache = TTLCache(maxsize=10000, ttl=ADMIN_CACHE_TTL)
+
+# Swap request creation. A sender has at most one pending request per
+# recipient (a unique partial index); creating another is a no-op that
+# returns no row.
+MAX_SWAP_REQUEST_BATCH = 100
+
+INSERT_SWAP_REQUEST = '''
+    INSERT INTO swap_requests (from_user_id, to_user_id, my_skill, wanted_skill)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (from_user_id, to_user_id) WHERE status = 'pending' DO NOTHING
+    RETURNING id
+'''
+
+def get_swap_request_batch(data):
+    """Read the requests list of a batch body, raising ValueError if invalid"""
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError('requests must be a non-empty list')
+    if len(items) > MAX_SWAP_REQUEST_BATCH:
+        raise ValueError(f'at most {MAX_SWAP_REQUEST_BATCH} requests per batch')
+    for item in items:
+        if not isinstance(item, dict) or not item.get('my_skill') or not item.get('wanted_skill'):
+            raise ValueError('each request needs to_user_id, my_skill and wanted_skill')
+        if type(item.get('to_user_id')) is not int or item['to_user_id'] < 1:
+            raise ValueError('to_user_id must be a positive integer')
+    return items
+
+# Swap request push notifications
+SSE_QUEUE_SIZE = 100
+SSE_KEEPALIVE_SECONDS = 15
+SSE_RETRY_MS = 3000  # reconnect delay suggested to clients
+# In the sync mode every open stream holds a server thread for as long as
+# the client stays connected, so only this many per process are accepted
+# and the rest get a 503. Deployments with many clients should route
+# /api/swap-requests/stream to the async mode (asgi.py), where a stream is
+# a parked coroutine, and keep the sync workers for everything else.
+SSE_MAX_SYNC_STREAMS = int(os.environ.get('SSE_MAX_SYNC_STREAMS', 4))
 
-from flask_jwt_extended import JWTManager, create_access_token
-app.config['JWT_SECRET_KEY'] = secrets.token_hex(32)
-jwt = JWTManager(app)
+class SwapEventBroker:
+    """In-process pub/sub that fans swap request changes out to SSE clients.
 
-app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
-CORS(app)
+    Each connected client gets its own bounded queue, keyed by user id. A
+    client that falls too far behind has its backlog replaced with a single
+    'resync' event telling it to refetch the listing. Only clients connected
+    to this process see events published here. Subscribers may bring their
+    own queue.Queue subclass, as asgi.py does to wake its event loop.
+    """
 
-if __name__ == '__main__':
-    app.run(port=5001)  # Use a different port
+    def __init__(self, max_queue):
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
 
-    # ... after creating your Flask app ...
+    def subscribe(self, user_id, events=None):
+        if events is None:
+            events = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(events)
+        return events
 
-# JWT Configuration
-app.config['JWT_SECRET_KEY'] = 'your-secret-key-here'  # Change this to a random secret key
-app.config['JWT_TOKEN_LOCATION'] = ['headers', 'cookies']
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-jwt = JWTManager(app)
+    def unsubscribe(self, user_id, events):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(events)
+                if not subscribers:
+                    del self._subscribers[user_id]
 
-@app.route('/api/login', methods=['POST'])
-def login():
-    data = request.get_json()
+    def publish(self, user_ids, event):
+        with self._lock:
+            targets = [events for user_id in set(user_ids) for events in self._subscribers.get(user_id, ())]
+        for events in targets:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                self._resync(events)
 
-    if not data or not data.get('email') or not data.get('password'):
-        return jsonify({'error': 'Email and password are required'}), 400
-    
-    conn = get_db()
-    user = conn.execute('SELECT * FROM users WHERE email = ?', (data['email'],)).fetchone()
-    conn.close()
-    
-    if not user or not check_password_hash(user['password_hash'], data['password']):
-        return jsonify({'error': 'Invalid credentials'}), 401
-    
-    # Create JWT token
-    access_token = create_access_token(identity={
-        'id': user['id'],
-        'email': user['email'],
-        'is_admin': user['is_admin']
-    })
-    
-    return jsonify({
-        'message': 'Login successful',
-        'access_token': access_token,
-        'user': {
-            'id': user['id'],
-            'name': user['name'],
-            'email': user['email'],
-            'is_admin': user['is_admin']
-        }
-    }), 200
+    @staticmethod
+    def _resync(events):
+        try:
+            while True:
+                events.get_nowait()
+        except queue.Empty:
+            pass
+        events.put_nowait({'type': 'resync'})
 
-# Database setup
-DATABASE = 'skill_swap.db'
+swap_events = SwapEventBroker(SSE_QUEUE_SIZE)
+sync_stream_slots = threading.BoundedSemaphore(SSE_MAX_SYNC_STREAMS)
 
-def init_db():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            location TEXT,
-            profile_photo TEXT,
-            skills_offered TEXT,
-            skills_wanted TEXT,
-            availability TEXT,
-            is_public BOOLEAN DEFAULT 1,
-            is_admin BOOLEAN DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Swap requests table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS swap_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            from_user_id INTEGER NOT NULL,
-            to_user_id INTEGER NOT NULL,
-            my_skill TEXT NOT NULL,
-            wanted_skill TEXT NOT NULL,
-            status TEXT DEFAULT 'pending',
-            rating INTEGER,
-            feedback TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (from_user_id) REFERENCES users (id),
-            FOREIGN KEY (to_user_id) REFERENCES users (id)
+def publish_swap_request(conn, event_type, request_id):
+    """Push the current state of a swap request to both of its users"""
+    req = conn.execute('''
+        SELECT sr.*, 
+               u1.name as from_user_name,
+               u2.name as to_user_name
+        FROM swap_requests sr
+        JOIN users u1 ON sr.from_user_id = u1.id
+        JOIN users u2 ON sr.to_user_id = u2.id
+        WHERE sr.id = ?
+    ''', (request_id,)).fetchone()
+    if req:
+        swap_events.publish(
+            [req['from_user_id'], req['to_user_id']],
+            {'type': event_type, 'request': swap_request_serializer.serialize(conn, [req])[0]}
         )
-    ''')
-    
-    # Create default admin user
-    cursor.execute('''
-        INSERT OR IGNORE INTO users (name, email, password_hash, is_admin)
-        VALUES ('Admin', 'admin@skillswap.com', ?, 1)
-    ''', (generate_password_hash('admin123'),))
-    
-    conn.commit()
-    conn.close()
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+def publish_swap_request_deleted(swap_request):
+    """Tell both users a swap request is gone"""
+    swap_events.publish(
+        [swap_request['from_user_id'], swap_request['to_user_id']],
+        {'type': 'deleted', 'request_id': swap_request['id']}
+    )
 
 def login_required(f):
     """Decorator to require login for certain endpoints"""
@@ -150,16 +4008,111 @@ def admin_required(f):
         if 'user_id' not in session:
             return jsonify({'error': 'Login required'}), 401
         
-        conn = get_db()
-        user = conn.execute('SELECT is_admin FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-        conn.close()
+        is_admin = admin_cache.get(session['user_id'])
+        if is_admin is None:
+            conn = get_db()
+            user = conn.execute('SELECT is_admin FROM users WHERE id = ?', (session['user_id'],)).fetchone()
+            is_admin = bool(user and user['is_admin'])
+            admin_cache.set(session['user_id'], is_admin)
         
-        if not user or not user['is_admin']:
+        if not is_admin:
             return jsonify({'error': 'Admin privileges required'}), 403
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+# Idempotency keys. A POST sent with an Idempotency-Key header runs once per
+# user and key; retries within IDEMPOTENCY_KEY_TTL get the stored response
+# back without running the handler, from whichever worker process they
+# reach. A key reused for a different request, or while the first one is
+# still running, is refused. Server errors aren't stored, so those retries
+# run again. A claim still in progress after IDEMPOTENCY_CLAIM_LEASE was
+# left by a worker that died mid-request, and can be taken over. The job
+# workers delete expired keys.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # seconds
+IDEMPOTENCY_CLAIM_LEASE = 60  # seconds
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Claim a key, taking over an expired or abandoned one; returns a row only if claimed
+CLAIM_IDEMPOTENCY_KEY_QUERY = '''
+    INSERT INTO idempotency_keys (user_id, key, fingerprint) VALUES (?, ?, ?)
+    ON CONFLICT (user_id, key) DO UPDATE
+    SET fingerprint = excluded.fingerprint, status = NULL, response = NULL, created_at = CURRENT_TIMESTAMP
+    WHERE created_at < datetime('now', ?) OR (status IS NULL AND created_at < datetime('now', ?))
+    RETURNING user_id
+'''
+
+# Only while the claim is still open: a request whose claim was taken over
+# must not overwrite or drop the new owner's outcome
+FINISH_IDEMPOTENCY_KEY_QUERY = '''
+    UPDATE idempotency_keys SET status = ?, response = ?
+    WHERE user_id = ? AND key = ? AND status IS NULL
+'''
+RELEASE_IDEMPOTENCY_KEY_QUERY = '''
+    DELETE FROM idempotency_keys WHERE user_id = ? AND key = ? AND status IS NULL
+'''
+
+def request_fingerprint():
+    """Hash of what makes a request the same request: method, path and body"""
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+def prune_idempotency_keys(conn):
+    """Delete keys older than IDEMPOTENCY_KEY_TTL"""
+    conn.execute("DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)",
+                 (f'-{IDEMPOTENCY_KEY_TTL} seconds',))
+    conn.commit()
+
+def idempotent(f):
+    """Decorator replaying the stored response for a repeated Idempotency-Key"""
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return f(*args, **kwargs)
+        if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH or not key.isprintable():
+            return jsonify({'error': f'Idempotency-Key must be 1 to {MAX_IDEMPOTENCY_KEY_LENGTH} printable characters'}), 400
+        
+        conn = get_db()
+        user_id = session['user_id']
+        fingerprint = request_fingerprint()
+        while True:
+            claimed = conn.execute(CLAIM_IDEMPOTENCY_KEY_QUERY, (
+                user_id, key, fingerprint, f'-{IDEMPOTENCY_KEY_TTL} seconds', f'-{IDEMPOTENCY_CLAIM_LEASE} seconds'
+            )).fetchone()
+            conn.commit()
+            if claimed:
+                break
+            stored = conn.execute('''
+                SELECT fingerprint, status, response FROM idempotency_keys WHERE user_id = ? AND key = ?
+            ''', (user_id, key)).fetchone()
+            if stored is None:
+                # Pruned or released since the claim failed; try again
+                continue
+            if stored['fingerprint'] != fingerprint:
+                return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+            if stored['status'] is None:
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            response = Response(stored['response'], status=stored['status'], mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except Exception:
+            conn.rollback()
+            conn.execute(RELEASE_IDEMPOTENCY_KEY_QUERY, (user_id, key))
+            conn.commit()
+            raise
+        if response.status_code >= 500:
+            conn.execute(RELEASE_IDEMPOTENCY_KEY_QUERY, (user_id, key))
+        else:
+            conn.execute(FINISH_IDEMPOTENCY_KEY_QUERY, (response.status_code, response.get_data(), user_id, key))
+        conn.commit()
+        return response
+    return decorated_function
+
 # Authentication endpoints
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -174,30 +4127,44 @@ def register():
     # Check if user already exists
     existing_user = conn.execute('SELECT id FROM users WHERE email = ?', (data['email'],)).fetchone()
     if existing_user:
-        conn.close()
         return jsonify({'error': 'User already exists'}), 409
     
     # Create new user
-    password_hash = generate_password_hash(data['password'])
+    try:
+        password_hash = hash_password(data['password'])
+    except PasswordHasherBusy:
+        return hasher_busy_response()
+    skills_offered = parse_skills(data.get('skills_offered', []))
+    skills_wanted = parse_skills(data.get('skills_wanted', []))
+    try:
+        availability_slots = availability_bitmap(data)
+        profile_photo = store_profile_photo(data.get('profile_photo', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     cursor = conn.execute('''
         INSERT INTO users (name, email, password_hash, location, profile_photo, 
-                          skills_offered, skills_wanted, availability, is_public)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                          skills_offered, skills_wanted, availability, availability_slots, is_public)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
         data['name'],
         data['email'],
         password_hash,
         data.get('location', ''),
-        data.get('profile_photo', ''),
-        ','.join(data.get('skills_offered', [])),
-        ','.join(data.get('skills_wanted', [])),
+        profile_photo,
+        ','.join(skills_offered),
+        ','.join(skills_wanted),
         data.get('availability', 'weekends'),
+        availability_slots,
         data.get('is_public', True)
     ))
     
     user_id = cursor.lastrowid
+    set_user_skills(conn, user_id, 'offered', skills_offered)
+    set_user_skills(conn, user_id, 'wanted', skills_wanted)
+    users_cache.invalidate(conn, user_listing_tags(conn, [user_id]))
     conn.commit()
-    conn.close()
+    match_index.update_user(user_id, skills_offered, skills_wanted, availability_slots, data.get('is_public', True))
+    availability_index.update_user(user_id, availability_slots, data.get('is_public', True))
     
     session['user_id'] = user_id
     return jsonify({'message': 'User registered successfully', 'user_id': user_id}), 201
@@ -212,12 +4179,16 @@ def login():
     
     conn = get_db()
     user = conn.execute('SELECT * FROM users WHERE email = ?', (data['email'],)).fetchone()
-    conn.close()
     
-    if not user or not check_password_hash(user['password_hash'], data['password']):
-        return jsonify({'error': 'Invalid credentials'}), 401
+    try:
+        if not user or not verify_password(user['password_hash'], data['password']):
+            return jsonify({'error': 'Invalid credentials'}), 401
+        upgrade_password_hash(conn, user['id'], user['password_hash'], data['password'])
+    except PasswordHasherBusy:
+        return hasher_busy_response()
     
     session['user_id'] = user['id']
+    admin_cache.set(user['id'], bool(user['is_admin']))
     return jsonify({
         'message': 'Login successful',
         'user': {
@@ -241,21 +4212,27 @@ def logout():
 def get_profile():
     """Get current user's profile"""
     conn = get_db()
+    not_modified = check_not_modified(conn, f"user:{session['user_id']}")
+    if not_modified:
+        return not_modified
+    
     user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-    conn.close()
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
+    skills = get_user_skills(conn, [user['id']])[user['id']]
+    
     return jsonify({
         'id': user['id'],
         'name': user['name'],
         'email': user['email'],
         'location': user['location'],
         'profile_photo': user['profile_photo'],
-        'skills_offered': user['skills_offered'].split(',') if user['skills_offered'] else [],
-        'skills_wanted': user['skills_wanted'].split(',') if user['skills_wanted'] else [],
+        'skills_offered': skills['offered'],
+        'skills_wanted': skills['wanted'],
         'availability': user['availability'],
+        'availability_slots': decode_slots(user['availability_slots']),
         'is_public': user['is_public'],
         'created_at': user['created_at']
     }), 200
@@ -269,68 +4246,264 @@ def update_profile():
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
+    skills_offered = parse_skills(data.get('skills_offered', []))
+    skills_wanted = parse_skills(data.get('skills_wanted', []))
+    try:
+        availability_slots = availability_bitmap(data)
+        profile_photo = store_profile_photo(data.get('profile_photo', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     conn = get_db()
+    # Pages listing the user under a skill they drop go stale too
+    cache_tags = user_listing_tags(conn, [session['user_id']])
     conn.execute('''
         UPDATE users SET 
             name = ?, location = ?, profile_photo = ?, 
             skills_offered = ?, skills_wanted = ?, 
-            availability = ?, is_public = ?
+            availability = ?, availability_slots = ?, is_public = ?
         WHERE id = ?
     ''', (
         data.get('name'),
         data.get('location', ''),
-        data.get('profile_photo', ''),
-        ','.join(data.get('skills_offered', [])),
-        ','.join(data.get('skills_wanted', [])),
+        profile_photo,
+        ','.join(skills_offered),
+        ','.join(skills_wanted),
         data.get('availability', 'weekends'),
+        availability_slots,
         data.get('is_public', True),
         session['user_id']
     ))
+    set_user_skills(conn, session['user_id'], 'offered', skills_offered)
+    set_user_skills(conn, session['user_id'], 'wanted', skills_wanted)
+    users_cache.invalidate(conn, cache_tags | user_listing_tags(conn, [session['user_id']]))
     
     conn.commit()
-    conn.close()
+    match_index.update_user(session['user_id'], skills_offered, skills_wanted, availability_slots, data.get('is_public', True))
+    availability_index.update_user(session['user_id'], availability_slots, data.get('is_public', True))
     
     return jsonify({'message': 'Profile updated successfully'}), 200
 
+@app.route('/api/profile/photo', methods=['POST'])
+@login_required
+def upload_profile_photo():
+    """Upload a profile photo, as a multipart 'photo' file or a raw image body"""
+    upload = request.files.get('photo')
+    stream = upload.stream if upload else request.stream
+    try:
+        photo_hash, ext = store_photo(stream.read(PHOTO_MAX_BYTES + 1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    url = photo_url(photo_hash, ext)
+    conn = get_db()
+    conn.execute('UPDATE users SET profile_photo = ? WHERE id = ?', (url, session['user_id']))
+    users_cache.invalidate(conn, user_listing_tags(conn, [session['user_id']]))
+    conn.commit()
+    queue_thumbnails(photo_hash)
+    
+    return jsonify({
+        'profile_photo': url,
+        'thumbnails': {str(size): thumbnail_url(photo_hash, size) for size in THUMBNAIL_SIZES}
+    }), 201
+
+@app.route('/api/photos/<photo_hash>.<ext>', methods=['GET'])
+def get_photo(photo_hash, ext):
+    """Serve an uploaded photo as stored"""
+    path = photo_path(photo_hash, f'{photo_hash}.{ext}')
+    if not PHOTO_HASH_PATTERN.fullmatch(photo_hash) or ext not in PHOTO_MIMETYPES or not os.path.exists(path):
+        return jsonify({'error': 'Photo not found'}), 404
+    return send_photo(path, PHOTO_MIMETYPES[ext], photo_hash)
+
+@app.route('/api/photos/<photo_hash>/<int:size>.jpg', methods=['GET'])
+def get_thumbnail(photo_hash, size):
+    """Serve a square thumbnail of an uploaded photo, cutting it if needed"""
+    if not PHOTO_HASH_PATTERN.fullmatch(photo_hash) or size not in THUMBNAIL_SIZES or not find_photo(photo_hash)[0]:
+        return jsonify({'error': 'Photo not found'}), 404
+    
+    path = photo_path(photo_hash, f'{photo_hash}_{size}.jpg')
+    if not os.path.exists(path):
+        try:
+            path = thumbnail_job(photo_hash, size).result(THUMBNAIL_WAIT_SECONDS)
+        except FutureTimeoutError:
+            response = jsonify({'error': 'Thumbnail not ready yet'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+    return send_photo(path, 'image/jpeg', f'{photo_hash}-{size}')
+
+def send_photo(path, mimetype, etag):
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True)
+    response.headers['Cache-Control'] = PHOTO_CACHE_CONTROL
+    return response
+
 # User browsing endpoints
 @app.route('/api/users', methods=['GET'])
 @login_required
 def get_users():
     """Get all public users except current user"""
-    search_skill = request.args.get('skill', '')
+    try:
+        near = get_near_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    sort = request.args.get('sort', 'newest')
+    if sort not in USER_SORTS:
+        return jsonify({'error': f"sort must be one of: {', '.join(USER_SORTS)}"}), 400
     
     conn = get_db()
-    query = '''
-        SELECT id, name, location, profile_photo, skills_offered, skills_wanted, availability
-        FROM users 
-        WHERE is_public = 1 AND id != ?
-    '''
-    params = [session['user_id']]
+    if sort == 'rating':
+        # Ratings don't bump the users version, so there is no ETag to check
+        query, params = rated_users_listing(session['user_id'], request.args.get('skill', ''), near)
+        return rated_users_response(conn, query, params)
     
-    if search_skill:
-        query += ' AND (skills_offered LIKE ? OR skills_wanted LIKE ?)'
-        params.extend([f'%{search_skill}%', f'%{search_skill}%'])
+    not_modified = check_not_modified(conn, 'users', session['user_id'], request.query_string.decode())
+    if not_modified:
+        return not_modified
     
-    users = conn.execute(query, params).fetchall()
-    conn.close()
+    try:
+        limit, after, stream = get_page_args(request.args)
+        fields = user_serializer.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if stream:
+        query, conditions, params = users_listing(session['user_id'], request.args.get('skill', ''), near)
+        return list_response(conn, query, conditions, params, user_serializer, 'u')
+    
+    rows, has_more = cached_users_page(conn, session['user_id'], request.args.get('skill', ''), near, limit, after)
+    if fields:
+        users = [{field: item[field] for field in fields} for _, _, item in rows]
+    else:
+        users = [item for _, _, item in rows]
+    response = jsonify(users)
+    if has_more:
+        next_cursor = encode_cursor({'id': rows[-1][0], 'created_at': rows[-1][1]})
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response, 200
+
+@app.route('/api/users/search', methods=['GET'])
+@login_required
+def search_users_endpoint():
+    """Full-text search over public profiles, best matches first"""
+    try:
+        q, limit, offset = get_search_args(request.args)
+        fields = user_serializer.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db()
+    not_modified = check_not_modified(conn, 'users', session['user_id'], request.query_string.decode())
+    if not_modified:
+        return not_modified
+    
+    rows, alternatives, has_more = search_users(conn, session['user_id'], q, limit, offset)
+    response = jsonify(serialize_search_results(conn, rows, alternatives, fields))
+    if has_more:
+        args = request.args.to_dict()
+        args['offset'] = offset + limit
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response, 200
+
+@app.route('/api/users/by-availability', methods=['GET'])
+@login_required
+def get_users_by_availability():
+    """Public users ranked by how many weekly hours they share with the current user"""
+    try:
+        near = get_near_args(request.args)
+        limit, offset = get_offset_args(request.args, DEFAULT_AVAILABILITY_LIMIT,
+                                        MAX_AVAILABILITY_LIMIT, MAX_AVAILABILITY_OFFSET)
+        fields = user_serializer.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db()
+    not_modified = check_not_modified(conn, 'users', session['user_id'], request.query_string.decode())
+    if not_modified:
+        return not_modified
+    
+    # Filters narrow the candidates in SQL; the index scores whatever is left
+    skill = request.args.get('skill', '')
+    candidate_ids = None
+    if skill or near:
+        query, params = availability_candidates(session['user_id'], skill, near)
+        candidate_ids = [row[0] for row in conn.execute(query, params)]
+    
+    availability_index.ensure_loaded(conn)
+    ranked, has_more = availability_index.rank(session['user_id'], limit, offset, candidate_ids)
+    users = []
+    if ranked:
+        user_ids = [user_id for user_id, _ in ranked]
+        rows = conn.execute(AVAILABILITY_RESULTS_QUERY.format(placeholders=','.join('?' * len(user_ids))),
+                            user_ids).fetchall()
+        rows = {row['id']: row for row in rows}
+        ranked = [(rows[user_id], overlap) for user_id, overlap in ranked if user_id in rows]
+        users = user_serializer.serialize(conn, [row for row, _ in ranked], fields)
+        for user, (_, overlap) in zip(users, ranked):
+            user['overlap_hours'] = overlap
     
-    users_list = []
-    for user in users:
-        users_list.append({
+    response = jsonify(users)
+    if has_more:
+        args = request.args.to_dict()
+        args['offset'] = offset + limit
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response, 200
+
+@app.route('/api/leaderboard', methods=['GET'])
+@login_required
+def get_leaderboard():
+    """Best rated public users, overall or as teachers of ?skill="""
+    query, params = leaderboard_listing(request.args.get('skill', ''))
+    return rated_users_response(get_db(), query, params)
+
+@app.route('/api/matches', methods=['GET'])
+@login_required
+def get_matches():
+    """Get users who offer what the current user wants and want what they offer"""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_MATCH_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, MAX_MATCH_LIMIT))
+    
+    conn = get_db()
+    match_index.ensure_loaded(conn)
+    matches = match_index.matches(session['user_id'], limit)
+    if not matches:
+        return jsonify([]), 200
+    
+    user_ids = [match[0] for match in matches]
+    users = conn.execute(f'''
+        SELECT id, name, location, profile_photo, availability
+        FROM users
+        WHERE id IN ({','.join('?' * len(user_ids))})
+    ''', user_ids).fetchall()
+    users = {user['id']: user for user in users}
+    
+    matches_list = []
+    for user_id, score, they_offer, they_want in matches:
+        user = users.get(user_id)
+        if not user:
+            continue
+        matches_list.append({
             'id': user['id'],
             'name': user['name'],
             'location': user['location'],
             'profile_photo': user['profile_photo'],
-            'skills_offered': user['skills_offered'].split(',') if user['skills_offered'] else [],
-            'skills_wanted': user['skills_wanted'].split(',') if user['skills_wanted'] else [],
-            'availability': user['availability']
+            'availability': user['availability'],
+            'score': score,
+            'skills_they_offer': they_offer,
+            'skills_they_want': they_want
         })
     
-    return jsonify(users_list), 200
+    return jsonify(matches_list), 200
 
 # Swap request endpoints
 @app.route('/api/swap-requests', methods=['POST'])
 @login_required
+@idempotent
 def create_swap_request():
     """Create a new swap request"""
     data = request.get_json()
@@ -338,88 +4511,110 @@ def create_swap_request():
     if not data or not data.get('to_user_id') or not data.get('my_skill') or not data.get('wanted_skill'):
         return jsonify({'error': 'Missing required fields'}), 400
     
-    # Check if request already exists
+    # The unique index on pending requests turns a duplicate into no row
     conn = get_db()
-    existing = conn.execute('''
-        SELECT id FROM swap_requests 
-        WHERE from_user_id = ? AND to_user_id = ? AND status = 'pending'
-    ''', (session['user_id'], data['to_user_id'])).fetchone()
+    created = conn.execute(INSERT_SWAP_REQUEST, (
+        session['user_id'], data['to_user_id'], data['my_skill'], data['wanted_skill']
+    )).fetchone()
+    conn.commit()
     
-    if existing:
-        conn.close()
+    if not created:
         return jsonify({'error': 'Pending request already exists'}), 409
     
-    # Create new request
-    cursor = conn.execute('''
-        INSERT INTO swap_requests (from_user_id, to_user_id, my_skill, wanted_skill)
-        VALUES (?, ?, ?, ?)
-    ''', (session['user_id'], data['to_user_id'], data['my_skill'], data['wanted_skill']))
+    request_id = created['id']
+    publish_swap_request(conn, 'created', request_id)
+    
+    return jsonify({'message': 'Swap request created', 'request_id': request_id}), 201
+
+@app.route('/api/swap-requests/batch', methods=['POST'])
+@login_required
+@idempotent
+def create_swap_requests_batch():
+    """Send swap requests to several users in one transaction"""
+    try:
+        requests_data = get_swap_request_batch(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db()
+    user_id = session['user_id']
+    to_user_ids = list(dict.fromkeys(item['to_user_id'] for item in requests_data))
+    placeholders = ','.join('?' * len(to_user_ids))
+    existing = {row[0] for row in conn.execute(f'SELECT id FROM users WHERE id IN ({placeholders})', to_user_ids)}
     
-    request_id = cursor.lastrowid
+    results = []
+    for item in requests_data:
+        if item['to_user_id'] not in existing:
+            results.append({'to_user_id': item['to_user_id'], 'status': 'not_found'})
+            continue
+        created = conn.execute(INSERT_SWAP_REQUEST, (
+            user_id, item['to_user_id'], item['my_skill'], item['wanted_skill']
+        )).fetchone()
+        if created:
+            results.append({'to_user_id': item['to_user_id'], 'status': 'created', 'request_id': created['id']})
+        else:
+            results.append({'to_user_id': item['to_user_id'], 'status': 'exists'})
     conn.commit()
-    conn.close()
     
-    return jsonify({'message': 'Swap request created', 'request_id': request_id}), 201
+    for result in results:
+        if result['status'] == 'created':
+            publish_swap_request(conn, 'created', result['request_id'])
+    
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return jsonify({'counts': counts, 'results': results}), 200
 
 @app.route('/api/swap-requests', methods=['GET'])
 @login_required
 def get_swap_requests():
-    """Get swap requests for current user"""
+    """Get swap requests for current user, archived ones too for ?history=1"""
     request_type = request.args.get('type', 'all')  # 'sent', 'received', 'all'
     
     conn = get_db()
+    archives = archive_partitions(conn) if request.args.get('history') == '1' else ()
+    query, conditions, params = swap_requests_listing(session['user_id'], request_type, archives)
+    return list_response(conn, query, conditions, params, swap_request_serializer, 'sr')
+
+@app.route('/api/swap-requests/stream', methods=['GET'])
+@login_required
+def stream_swap_requests():
+    """Server-Sent Events feed of changes to the current user's swap requests.
     
-    if request_type == 'sent':
-        query = '''
-            SELECT sr.*, u.name as to_user_name
-            FROM swap_requests sr
-            JOIN users u ON sr.to_user_id = u.id
-            WHERE sr.from_user_id = ?
-            ORDER BY sr.created_at DESC
-        '''
-        params = [session['user_id']]
-    elif request_type == 'received':
-        query = '''
-            SELECT sr.*, u.name as from_user_name
-            FROM swap_requests sr
-            JOIN users u ON sr.from_user_id = u.id
-            WHERE sr.to_user_id = ?
-            ORDER BY sr.created_at DESC
-        '''
-        params = [session['user_id']]
-    else:  # all
-        query = '''
-            SELECT sr.*, 
-                   u1.name as from_user_name,
-                   u2.name as to_user_name
-            FROM swap_requests sr
-            JOIN users u1 ON sr.from_user_id = u1.id
-            JOIN users u2 ON sr.to_user_id = u2.id
-            WHERE sr.from_user_id = ? OR sr.to_user_id = ?
-            ORDER BY sr.created_at DESC
-        '''
-        params = [session['user_id'], session['user_id']]
+    Each open stream holds a thread here, up to SSE_MAX_SYNC_STREAMS per
+    process; asgi.py serves the same feed without that limit.
+    """
+    if not sync_stream_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many open event streams, try again later'})
+        response.headers['Retry-After'] = str(SSE_RETRY_MS // 1000)
+        return response, 503
     
-    requests = conn.execute(query, params).fetchall()
-    conn.close()
+    user_id = session['user_id']
+    events = swap_events.subscribe(user_id)
     
-    requests_list = []
-    for req in requests:
-        requests_list.append({
-            'id': req['id'],
-            'from_user_id': req['from_user_id'],
-            'to_user_id': req['to_user_id'],
-            'from_user_name': req.get('from_user_name'),
-            'to_user_name': req.get('to_user_name'),
-            'my_skill': req['my_skill'],
-            'wanted_skill': req['wanted_skill'],
-            'status': req['status'],
-            'rating': req['rating'],
-            'feedback': req['feedback'],
-            'created_at': req['created_at']
-        })
+    def generate():
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        while True:
+            try:
+                event = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # A comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    def close():
+        swap_events.unsubscribe(user_id, events)
+        sync_stream_slots.release()
     
-    return jsonify(requests_list), 200
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the server closes the response, even if the client left
+    # before the generator started
+    response.call_on_close(close)
+    return response
 
 @app.route('/api/swap-requests/<int:request_id>', methods=['PUT'])
 @login_required
@@ -430,33 +4625,43 @@ def update_swap_request(request_id):
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
+    rating = data.get('rating')
+    if rating is not None and (type(rating) is not int or not RATING_MIN <= rating <= RATING_MAX):
+        return jsonify({'error': f'rating must be an integer from {RATING_MIN} to {RATING_MAX}'}), 400
+    
     conn = get_db()
     
     # Check if user has permission to update this request
-    swap_request = conn.execute('''
-        SELECT * FROM swap_requests WHERE id = ?
-    ''', (request_id,)).fetchone()
+    swap_request = find_swap_request(conn, request_id)
     
     if not swap_request:
-        conn.close()
         return jsonify({'error': 'Request not found'}), 404
     
     # For status updates, only the recipient can update
-    if 'status' in data:
-        if swap_request['to_user_id'] != session['user_id']:
-            conn.close()
-            return jsonify({'error': 'Permission denied'}), 403
-        
-        conn.execute('''
-            UPDATE swap_requests SET status = ? WHERE id = ?
-        ''', (data['status'], request_id))
+    if 'status' in data and swap_request['to_user_id'] != session['user_id']:
+        return jsonify({'error': 'Permission denied'}), 403
     
-    # For rating updates, either user can rate
+    # Either user can leave feedback, but only the sender rates: the rating
+    # scores the recipient, who mustn't be able to rate themselves
     if 'rating' in data or 'feedback' in data:
         if swap_request['from_user_id'] != session['user_id'] and swap_request['to_user_id'] != session['user_id']:
-            conn.close()
             return jsonify({'error': 'Permission denied'}), 403
-        
+        if 'rating' in data and swap_request['from_user_id'] != session['user_id']:
+            return jsonify({'error': 'Only the sender of a swap request can rate it'}), 403
+    
+    # An archived request moves back in the same transaction as the update
+    restore_swap_requests(conn, [request_id])
+    
+    if 'status' in data:
+        try:
+            conn.execute('''
+                UPDATE swap_requests SET status = ? WHERE id = ?
+            ''', (data['status'], request_id))
+        except sqlite3.IntegrityError:
+            # Reopening it would make a second pending request to the same user
+            return jsonify({'error': 'Pending request already exists'}), 409
+    
+    if 'rating' in data or 'feedback' in data:
         update_fields = []
         params = []
         
@@ -475,7 +4680,7 @@ def update_swap_request(request_id):
         ''', params)
     
     conn.commit()
-    conn.close()
+    publish_swap_request(conn, 'updated', request_id)
     
     return jsonify({'message': 'Request updated successfully'}), 200
 
@@ -486,22 +4691,19 @@ def delete_swap_request(request_id):
     conn = get_db()
     
     # Check if user has permission to delete this request
-    swap_request = conn.execute('''
-        SELECT * FROM swap_requests WHERE id = ?
-    ''', (request_id,)).fetchone()
+    swap_request = find_swap_request(conn, request_id)
     
     if not swap_request:
-        conn.close()
         return jsonify({'error': 'Request not found'}), 404
     
     # Only the sender can delete their own request
     if swap_request['from_user_id'] != session['user_id']:
-        conn.close()
         return jsonify({'error': 'Permission denied'}), 403
     
+    restore_swap_requests(conn, [request_id])
     conn.execute('DELETE FROM swap_requests WHERE id = ?', (request_id,))
     conn.commit()
-    conn.close()
+    publish_swap_request_deleted(swap_request)
     
     return jsonify({'message': 'Request deleted successfully'}), 200
 
@@ -510,52 +4712,24 @@ def delete_swap_request(request_id):
 @admin_required
 def get_admin_stats():
     """Get admin dashboard statistics"""
-    conn = get_db()
+    try:
+        days = get_stats_days(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Get various statistics
-    total_users = conn.execute('SELECT COUNT(*) as count FROM users WHERE is_admin = 0').fetchone()['count']
-    total_swaps = conn.execute('SELECT COUNT(*) as count FROM swap_requests').fetchone()['count']
-    pending_swaps = conn.execute('SELECT COUNT(*) as count FROM swap_requests WHERE status = "pending"').fetchone()['count']
-    active_users = conn.execute('SELECT COUNT(*) as count FROM users WHERE is_public = 1 AND is_admin = 0').fetchone()['count']
-    
-    conn.close()
+    # Counters are maintained by triggers, so this is a single small read
+    conn = get_db()
+    counters = conn.execute('SELECT name, value FROM stats_counters').fetchall()
+    daily = conn.execute(STATS_DAILY_QUERY, (days - 1,)).fetchall()
     
-    return jsonify({
-        'total_users': total_users,
-        'total_swaps': total_swaps,
-        'pending_swaps': pending_swaps,
-        'active_users': active_users
-    }), 200
+    return jsonify(summarize_stats(counters, daily)), 200
 
 @app.route('/api/admin/users', methods=['GET'])
 @admin_required
 def get_admin_users():
     """Get all users for admin management"""
-    conn = get_db()
-    users = conn.execute('''
-        SELECT id, name, email, location, skills_offered, skills_wanted, 
-               availability, is_public, created_at
-        FROM users 
-        WHERE is_admin = 0
-        ORDER BY created_at DESC
-    ''').fetchall()
-    conn.close()
-    
-    users_list = []
-    for user in users:
-        users_list.append({
-            'id': user['id'],
-            'name': user['name'],
-            'email': user['email'],
-            'location': user['location'],
-            'skills_offered': user['skills_offered'].split(',') if user['skills_offered'] else [],
-            'skills_wanted': user['skills_wanted'].split(',') if user['skills_wanted'] else [],
-            'availability': user['availability'],
-            'is_public': user['is_public'],
-            'created_at': user['created_at']
-        })
-    
-    return jsonify(users_list), 200
+    query, conditions, params = admin_users_listing()
+    return list_response(get_db(), query, conditions, params, admin_user_serializer, 'u')
 
 @app.route('/api/admin/users/<int:user_id>', methods=['PUT'])
 @admin_required
@@ -571,15 +4745,18 @@ def update_user_admin(user_id):
     # Check if user exists
     user = conn.execute('SELECT id FROM users WHERE id = ?', (user_id,)).fetchone()
     if not user:
-        conn.close()
         return jsonify({'error': 'User not found'}), 404
     
     # Update user
     if 'is_public' in data:
         conn.execute('UPDATE users SET is_public = ? WHERE id = ?', (data['is_public'], user_id))
+        users_cache.invalidate(conn, user_listing_tags(conn, [user_id]))
     
     conn.commit()
-    conn.close()
+    admin_cache.invalidate(user_id)
+    if 'is_public' in data:
+        match_index.set_public(user_id, data['is_public'])
+        availability_index.set_public(user_id, data['is_public'])
     
     return jsonify({'message': 'User updated successfully'}), 200
 
@@ -592,70 +4769,174 @@ def delete_user_admin(user_id):
     # Check if user exists
     user = conn.execute('SELECT id FROM users WHERE id = ?', (user_id,)).fetchone()
     if not user:
-        conn.close()
         return jsonify({'error': 'User not found'}), 404
     
-    # Delete user and their swap requests
-    conn.execute('DELETE FROM swap_requests WHERE from_user_id = ? OR to_user_id = ?', (user_id, user_id))
-    conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+    # Hide the user right away; deleting them and their swap requests is
+    # queued, since it touches every request they ever sent or received
+    conn.execute('UPDATE users SET is_public = 0 WHERE id = ?', (user_id,))
+    users_cache.invalidate(conn, user_listing_tags(conn, [user_id]))
+    job_id = enqueue_job(conn, 'delete_user', {'user_id': user_id}, JOB_PRIORITY_HIGH)
+    match_index.set_public(user_id, False)
+    availability_index.set_public(user_id, False)
     
-    conn.commit()
-    conn.close()
+    return jsonify({'message': 'User deletion queued', 'job_id': job_id}), 202
+
+@app.route('/api/admin/users/import', methods=['POST'])
+@admin_required
+def import_users_admin():
+    """Create or update users from an uploaded CSV or JSONL body"""
+    try:
+        fmt = bulk_format(request.args.get('format'), request.mimetype)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    summary = import_users(get_db(), read_import_records(request.stream, fmt),
+                           atomic=request.args.get('atomic') == '1')
+    return jsonify(summary), 200
+
+@app.route('/api/admin/users/export', methods=['GET'])
+@admin_required
+def export_users_admin():
+    """Stream every non-admin user as CSV or JSONL"""
+    try:
+        fmt = bulk_format(request.args.get('format'), 'csv')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        # Own connection: the request's is released before the body streams
+        conn = db_pool.acquire()
+        try:
+            for chunk in format_export(export_users(conn), fmt):
+                yield chunk.encode()
+        finally:
+            db_pool.release(conn)
+    
+    return streaming_response(generate(), BULK_FORMATS[fmt], {
+        'Content-Disposition': f'attachment; filename=users.{fmt}'
+    })
+
+@app.route('/api/admin/bulk', methods=['POST'])
+@admin_required
+def bulk_admin():
+    """Hide, show or delete many users, or delete many swap requests, in one call"""
+    try:
+        operations = get_bulk_operations(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Large requests, or any with ?async=1, run as a background job
+    if request.args.get('async') == '1' or sum(len(ids) for _, ids in operations) > BULK_INLINE_MAX_IDS:
+        job_id = enqueue_job(get_db(), 'bulk', {'operations': operations})
+        return jsonify({'message': 'Bulk operations queued', 'job_id': job_id}), 202
     
-    return jsonify({'message': 'User deleted successfully'}), 200
+    return jsonify({'operations': run_bulk_operations(get_db(), operations)}), 200
+
+@app.route('/api/admin/jobs', methods=['GET'])
+@admin_required
+def get_admin_jobs():
+    """List background jobs, newest first, optionally in one ?status="""
+    status = request.args.get('status')
+    if status is not None and status not in JOB_STATUSES:
+        return jsonify({'error': f"status must be one of: {', '.join(JOB_STATUSES)}"}), 400
+    
+    query, conditions, params = jobs_listing(status)
+    return list_response(get_db(), query, conditions, params, job_serializer, 'j')
+
+@app.route('/api/admin/jobs', methods=['POST'])
+@admin_required
+def create_job_admin():
+    """Queue a maintenance job, e.g. {"kind": "rebuild_stats"}"""
+    data = request.get_json(silent=True)
+    kind = data.get('kind') if isinstance(data, dict) else None
+    if kind not in ADMIN_JOB_KINDS:
+        return jsonify({'error': f"kind must be one of: {', '.join(ADMIN_JOB_KINDS)}"}), 400
+    
+    job_id = enqueue_job(get_db(), kind, {}, ADMIN_JOB_KINDS[kind])
+    return jsonify({'message': 'Job queued', 'job_id': job_id}), 202
+
+@app.route('/api/admin/jobs/<int:job_id>', methods=['GET'])
+@admin_required
+def get_job_admin(job_id):
+    """Get a background job with its payload and result"""
+    job = get_db().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    job_dict = dict(job)
+    for field in ('payload', 'result'):
+        if job_dict[field] is not None:
+            job_dict[field] = json.loads(job_dict[field])
+    return jsonify(job_dict), 200
+
+@app.route('/api/admin/jobs/<int:job_id>/retry', methods=['POST'])
+@admin_required
+def retry_job_admin(job_id):
+    """Queue a failed job again with a fresh set of attempts"""
+    conn = get_db()
+    retried = conn.execute('''
+        UPDATE jobs
+        SET status = 'queued', attempts = 0, run_after = CURRENT_TIMESTAMP, finished_at = NULL
+        WHERE id = ? AND status = 'failed'
+    ''', (job_id,)).rowcount
+    if not retried:
+        conn.rollback()
+        exists = conn.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if not exists:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'error': 'Only failed jobs can be retried'}), 409
+    
+    conn.commit()
+    job_queue.notify()
+    return jsonify({'message': 'Job queued', 'job_id': job_id}), 202
 
 @app.route('/api/admin/swap-requests', methods=['GET'])
 @admin_required
 def get_admin_swap_requests():
-    """Get all swap requests for admin management"""
+    """Get all swap requests for admin management, archived ones too for ?history=1"""
     conn = get_db()
-    requests = conn.execute('''
-        SELECT sr.*, 
-               u1.name as from_user_name,
-               u2.name as to_user_name
-        FROM swap_requests sr
-        JOIN users u1 ON sr.from_user_id = u1.id
-        JOIN users u2 ON sr.to_user_id = u2.id
-        ORDER BY sr.created_at DESC
-    ''').fetchall()
-    conn.close()
-    
-    requests_list = []
-    for req in requests:
-        requests_list.append({
-            'id': req['id'],
-            'from_user_id': req['from_user_id'],
-            'to_user_id': req['to_user_id'],
-            'from_user_name': req['from_user_name'],
-            'to_user_name': req['to_user_name'],
-            'my_skill': req['my_skill'],
-            'wanted_skill': req['wanted_skill'],
-            'status': req['status'],
-            'rating': req['rating'],
-            'feedback': req['feedback'],
-            'created_at': req['created_at']
-        })
-    
-    return jsonify(requests_list), 200
+    archives = archive_partitions(conn) if request.args.get('history') == '1' else ()
+    query, conditions, params = admin_swap_requests_listing(archives)
+    return list_response(conn, query, conditions, params, swap_request_serializer, 'sr')
 
 @app.route('/api/admin/swap-requests/<int:request_id>', methods=['DELETE'])
 @admin_required
 def delete_swap_request_admin(request_id):
     """Delete swap request as admin"""
     conn = get_db()
+    restore_swap_requests(conn, [request_id])
     
     # Check if request exists
-    request_exists = conn.execute('SELECT id FROM swap_requests WHERE id = ?', (request_id,)).fetchone()
+    request_exists = conn.execute('''
+        SELECT id, from_user_id, to_user_id FROM swap_requests WHERE id = ?
+    ''', (request_id,)).fetchone()
     if not request_exists:
-        conn.close()
         return jsonify({'error': 'Request not found'}), 404
     
     conn.execute('DELETE FROM swap_requests WHERE id = ?', (request_id,))
     conn.commit()
-    conn.close()
+    publish_swap_request_deleted(request_exists)
     
     return jsonify({'message': 'Request deleted successfully'}), 200
 
+# Metrics endpoint
+def metrics_token_or_admin_required(f):
+    """Decorator admitting METRICS_TOKEN bearers, and otherwise requiring admin privileges"""
+    admin_view = admin_required(f)
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        authorization = request.headers.get('Authorization', '')
+        if METRICS_TOKEN and secrets.compare_digest(authorization.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+            return f(*args, **kwargs)
+        return admin_view(*args, **kwargs)
+    return decorated_function
+
+@app.route('/metrics', methods=['GET'])
+@metrics_token_or_admin_required
+def get_metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -0,0 +1,535 @@
+"""Async serving mode for the Skill Swap backend.
+
+The read-heavy listing endpoints (/api/users, /api/swap-requests and the
+admin listings and stats) run as native coroutines on aiosqlite, and the
+swap request event stream is served from the event loop, so a single
+process can keep many slow clients and open streams in flight without a
+thread per client. Every other route falls through to the Flask app,
+which runs on a bounded thread pool.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Queries, serializers, cursors, ETags and session cookies are shared with
+app.py, so both modes return the same responses and can be mixed behind
+one load balancer.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import queue
+import time
+from urllib.parse import urlencode
+
+import aiosqlite
+from a2wsgi import WSGIMiddleware
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import http_date, parse_date, parse_etags
+
+from app import (
+    app as flask_app, API_CORS, ARCHIVE_PARTITIONS_QUERY, COMPRESS_MIN_SIZE, DATABASE, DB_POOL_SIZE, DEFAULT_LEADERBOARD_LIMIT,
+    MAX_LEADERBOARD_LIMIT, MAX_LEADERBOARD_OFFSET, SQL_PARAM_CHUNK, SSE_KEEPALIVE_SECONDS, SSE_QUEUE_SIZE,
+    SSE_RETRY_MS, STREAM_BATCH_SIZE, STREAM_FORMATS, USER_SKILLS_QUERY, USER_SORTS, STATS_DAILY_QUERY,
+    StreamCompressor, admin_cache, admin_swap_requests_listing, admin_user_serializer,
+    admin_users_listing, build_list_query, cache_versions_query, compress_body, connection_pragmas, dump_json,
+    encode_cursor, encode_stream_batch, encoded_etag, get_near_args, get_offset_args, get_page_args,
+    get_stats_days, make_etag, matching_etag, negotiate_encoding, parse_timestamp, rated_user_serializer,
+    rated_users_listing, record_request, summarize_stats, swap_request_serializer,
+    swap_events, swap_requests_listing, tag_versions, user_serializer, users_cache, users_listing,
+    users_page_key
+)
+
+# Threads serving the routes that fall through to Flask. Keep it bounded so
+# a burst of logins (CPU-heavy hashing) can't starve the event loop.
+ASGI_BLOCKING_WORKERS = int(os.environ.get('ASGI_BLOCKING_WORKERS', 8))
+
+class AsyncConnectionPool:
+    """aiosqlite counterpart of app.ConnectionPool.
+
+    Also caps how many connections are open at once, so callers wait for a
+    free connection instead of piling up threads on a busy database.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = []
+        self._slots = None
+
+    async def acquire(self):
+        # Created lazily so it binds to the server's event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        await self._slots.acquire()
+        try:
+            if self._idle:
+                return self._idle.pop()
+            return await connect_async_db()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, conn):
+        try:
+            # Never hand a half-finished transaction to the next request
+            if conn.in_transaction:
+                await conn.rollback()
+            self._idle.append(conn)
+        except BaseException:
+            await conn.close()
+            raise
+        finally:
+            self._slots.release()
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def close_all(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await conn.close()
+
+async def connect_async_db():
+    """Open an aiosqlite connection configured like app.connect_db"""
+    conn = await aiosqlite.connect(DATABASE)
+    conn.row_factory = aiosqlite.Row
+    for pragma in connection_pragmas():
+        await conn.execute(pragma)
+    return conn
+
+async_db_pool = AsyncConnectionPool(DB_POOL_SIZE)
+
+async def get_user_skills(conn, user_ids):
+    """Async counterpart of app.get_user_skills"""
+    skills = {user_id: {'offered': [], 'wanted': []} for user_id in user_ids}
+    user_ids = list(skills)
+
+    for start in range(0, len(user_ids), SQL_PARAM_CHUNK):
+        chunk = user_ids[start:start + SQL_PARAM_CHUNK]
+        rows = await conn.execute_fetchall(
+            USER_SKILLS_QUERY.format(placeholders=','.join('?' * len(chunk))), chunk
+        )
+        for user_id, direction, name in rows:
+            skills[user_id][direction].append(name)
+
+    return skills
+
+async def serialize(conn, serializer, rows, fields=None):
+    """Async counterpart of app.RowSerializer.serialize"""
+    if not rows:
+        return []
+    to_dict, needs_skills = serializer.mapper(fields, rows[0].keys())
+    skills = await get_user_skills(conn, [row['id'] for row in rows]) if needs_skills else None
+    return [to_dict(row, skills) for row in rows]
+
+# Responses
+def json_response(data, status=200, headers=None, request=None):
+    """Encode like Flask's jsonify so both modes return identical bodies.
+
+    Pass the request to compress large bodies like app.compress_response.
+    """
+    body = dump_json(data) + b'\n'
+    headers = dict(headers or {})
+    if request is not None and status == 200:
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = negotiate_encoding(request.headers.get('accept-encoding', ''))
+        if encoding and len(body) >= COMPRESS_MIN_SIZE:
+            body = compress_body(body, encoding)
+            set_content_encoding(headers, encoding)
+    return Response(body, status_code=status, headers=headers, media_type='application/json')
+
+def set_content_encoding(headers, encoding):
+    """Mark headers as for a compressed body, giving the ETag the coding's suffix"""
+    headers['Content-Encoding'] = encoding
+    if 'ETag' in headers:
+        # Quoted as '"<etag>"'; the suffix goes inside the quotes
+        headers['ETag'] = encoded_etag(headers['ETag'][:-1], encoding) + '"'
+
+def error_response(message, status):
+    return json_response({'error': message}, status)
+
+# Sessions
+session_serializer = SecureCookieSessionInterface().get_signing_serializer(flask_app)
+
+def get_session(request):
+    """Read the Flask session cookie, returning {} if missing or invalid"""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie or session_serializer is None:
+        return {}
+    max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+    try:
+        return session_serializer.loads(cookie, max_age=max_age)
+    except BadSignature:
+        return {}
+
+async def is_admin_user(conn, user_id):
+    """Admin check sharing admin_cache with the Flask decorator"""
+    is_admin = admin_cache.get(user_id)
+    if is_admin is None:
+        async with conn.execute('SELECT is_admin FROM users WHERE id = ?', (user_id,)) as cursor:
+            user = await cursor.fetchone()
+        is_admin = bool(user and user['is_admin'])
+        admin_cache.set(user_id, is_admin)
+    return is_admin
+
+def login_required(f):
+    """Run the endpoint with (request, user_id, conn), or answer 401"""
+    async def endpoint(request):
+        user_id = get_session(request).get('user_id')
+        if user_id is None:
+            return error_response('Login required', 401)
+        async with async_db_pool.connection() as conn:
+            return await f(request, user_id, conn)
+    endpoint.__name__ = f.__name__
+    return endpoint
+
+def admin_required(f):
+    """Like login_required, but also answer 403 for non-admins"""
+    async def endpoint(request):
+        user_id = get_session(request).get('user_id')
+        if user_id is None:
+            return error_response('Login required', 401)
+        async with async_db_pool.connection() as conn:
+            if not await is_admin_user(conn, user_id):
+                return error_response('Admin privileges required', 403)
+            return await f(request, conn)
+    endpoint.__name__ = f.__name__
+    return endpoint
+
+# Conditional GET, mirroring app.check_not_modified
+async def get_cache_validators(conn, resource, *vary):
+    async with conn.execute('SELECT version, updated_at FROM resource_versions WHERE name = ?', (resource,)) as cursor:
+        row = await cursor.fetchone()
+    version, last_modified = (row['version'], parse_timestamp(row['updated_at'])) if row else (0, None)
+    return make_etag(resource, version, *vary), last_modified
+
+def cache_validator_headers(etag, last_modified):
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+def not_modified_etag(request, etag, last_modified):
+    """The ETag to answer 304 with if the client's copy is current, else None"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        return matching_etag(parse_etags(if_none_match), etag)
+    if_modified_since = parse_date(request.headers.get('if-modified-since'))
+    if if_modified_since and last_modified and last_modified <= if_modified_since:
+        return etag
+    return None
+
+# Listings
+async def list_response(request, conn, listing, serializer, alias, headers=None):
+    """Async counterpart of app.list_response"""
+    query, conditions, params = listing
+    try:
+        limit, after, stream = get_page_args(request.query_params)
+        fields = serializer.parse_fields(request.query_params.get('fields'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    query, params = build_list_query(query, conditions, params, alias, after)
+
+    if stream:
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        headers = dict(headers or {}, Vary='Accept-Encoding')
+        chunks = stream_rows(query, params, serializer, fields, stream)
+        encoding = negotiate_encoding(request.headers.get('accept-encoding', ''))
+        if encoding:
+            set_content_encoding(headers, encoding)
+            chunks = compress_stream(chunks, encoding)
+        return StreamingResponse(chunks, media_type=STREAM_FORMATS[stream], headers=headers)
+
+    # Fetch one extra row to learn whether there is a next page
+    rows = await conn.execute_fetchall(query + ' LIMIT ?', params + [limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    headers = dict(headers or {})
+    if has_more:
+        next_cursor = encode_cursor(rows[-1])
+        args = dict(request.query_params)
+        args['cursor'] = next_cursor
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'<{request.url.replace(query="")}?{urlencode(args)}>; rel="next"'
+    return json_response(await serialize(conn, serializer, rows, fields), headers=headers, request=request)
+
+async def history_archives(request, conn):
+    """Archive tables a swap request listing should read, as app.archive_partitions for ?history=1"""
+    if request.query_params.get('history') != '1':
+        return ()
+    return [row[0] for row in await conn.execute_fetchall(ARCHIVE_PARTITIONS_QUERY)]
+
+async def stream_rows(query, params, serializer, fields, fmt):
+    """Async counterpart of app.stream_rows, on its own pooled connection"""
+    async with async_db_pool.connection() as conn:
+        async with conn.execute(query, params) as cursor:
+            separator = b''
+            if fmt == 'json':
+                yield b'['
+            while True:
+                rows = await cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                yield encode_stream_batch(await serialize(conn, serializer, rows, fields), fmt, separator)
+                separator = b','
+            if fmt == 'json':
+                yield b']'
+
+async def rated_users_response(request, conn, query, params):
+    """Async counterpart of app.rated_users_response"""
+    try:
+        limit, offset = get_offset_args(request.query_params, DEFAULT_LEADERBOARD_LIMIT,
+                                        MAX_LEADERBOARD_LIMIT, MAX_LEADERBOARD_OFFSET)
+        fields = rated_user_serializer.parse_fields(request.query_params.get('fields'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    # Fetch one extra row to learn whether there is a next page
+    rows = await conn.execute_fetchall(query, params + [limit + 1, offset])
+    headers = {}
+    if len(rows) > limit:
+        args = dict(request.query_params)
+        args['offset'] = offset + limit
+        headers['Link'] = f'<{request.url.replace(query="")}?{urlencode(args)}>; rel="next"'
+    return json_response(await serialize(conn, rated_user_serializer, rows[:limit], fields),
+                         headers=headers, request=request)
+
+async def cached_users_page(conn, user_id, skill, near, limit, after):
+    """Async counterpart of app.cached_users_page, sharing its cache entries"""
+    skill_id = None
+    if skill:
+        skill_rows = await conn.execute_fetchall('SELECT id FROM skills WHERE name = ?', (skill.strip(),))
+        if not skill_rows:
+            return [], False
+        skill_id = skill_rows[0][0]
+
+    # Both cache backends are in-process or a local file, cheap enough to
+    # call from the event loop
+    key, tags = users_page_key(skill_id, near, after, limit)
+    names = users_cache.version_names(tags)
+    versions = tag_versions(await conn.execute_fetchall(*cache_versions_query(names)), names)
+    page = users_cache.lookup(key, versions)
+    if page is None:
+        query, conditions, params = users_listing(None, skill, near)
+        query, params = build_list_query(query, conditions, params, 'u', after)
+        # One row for the next-page check, one in case the caller is listed
+        rows = await conn.execute_fetchall(query + ' LIMIT ?', params + [limit + 2])
+        items = await serialize(conn, user_serializer, rows)
+        page = [[row['id'], row['created_at'], item] for row, item in zip(rows, items)]
+        users_cache.store(key, versions, page)
+
+    rows = [row for row in page if row[0] != user_id]
+    return rows[:limit], len(rows) > limit
+
+async def compress_stream(chunks, encoding):
+    """Async counterpart of app.compress_stream"""
+    compressor = StreamCompressor(encoding)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.finish()
+
+class LoopEventQueue(queue.Queue):
+    """Swap event queue that wakes a coroutine on the server's event loop.
+
+    The broker publishes from whichever thread ran the write, usually one of
+    the Flask threads, so the wakeup goes through call_soon_threadsafe.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self._loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+
+    def _put(self, item):
+        super()._put(item)
+        # The loop is gone once the server shuts down; nobody is waiting then
+        with contextlib.suppress(RuntimeError):
+            self._loop.call_soon_threadsafe(self.ready.set)
+
+    async def wait(self, timeout):
+        """Next event, or None if nothing arrived within timeout seconds"""
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            self.ready.clear()
+            # Re-check after clearing so an event put in between isn't missed
+            if self.empty():
+                try:
+                    await asyncio.wait_for(self.ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return None
+
+async def swap_event_stream(user_id, events):
+    """Async counterpart of the generator in app.stream_swap_requests"""
+    try:
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        while True:
+            event = await events.wait(SSE_KEEPALIVE_SECONDS)
+            if event is None:
+                # A comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        swap_events.unsubscribe(user_id, events)
+
+# Endpoints
+@login_required
+async def get_users(request, user_id, conn):
+    """Get all public users except current user"""
+    try:
+        near = get_near_args(request.query_params)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    sort = request.query_params.get('sort', 'newest')
+    if sort not in USER_SORTS:
+        return error_response(f"sort must be one of: {', '.join(USER_SORTS)}", 400)
+    if sort == 'rating':
+        query, params = rated_users_listing(user_id, request.query_params.get('skill', ''), near)
+        return await rated_users_response(request, conn, query, params)
+
+    etag, last_modified = await get_cache_validators(conn, 'users', user_id, request.url.query)
+    headers = cache_validator_headers(etag, last_modified)
+    current = not_modified_etag(request, etag, last_modified)
+    if current:
+        return Response(status_code=304, headers=dict(headers, ETag=f'"{current}"'))
+
+    try:
+        limit, after, stream = get_page_args(request.query_params)
+        fields = user_serializer.parse_fields(request.query_params.get('fields'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    if stream:
+        listing = users_listing(user_id, request.query_params.get('skill', ''), near)
+        return await list_response(request, conn, listing, user_serializer, 'u', headers)
+
+    rows, has_more = await cached_users_page(conn, user_id, request.query_params.get('skill', ''),
+                                             near, limit, after)
+    if fields:
+        users = [{field: item[field] for field in fields} for _, _, item in rows]
+    else:
+        users = [item for _, _, item in rows]
+    if has_more:
+        next_cursor = encode_cursor({'id': rows[-1][0], 'created_at': rows[-1][1]})
+        args = dict(request.query_params)
+        args['cursor'] = next_cursor
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'<{request.url.replace(query="")}?{urlencode(args)}>; rel="next"'
+    return json_response(users, headers=headers, request=request)
+
+@login_required
+async def get_swap_requests(request, user_id, conn):
+    """Get swap requests for current user, archived ones too for ?history=1"""
+    archives = await history_archives(request, conn)
+    listing = swap_requests_listing(user_id, request.query_params.get('type', 'all'), archives)
+    return await list_response(request, conn, listing, swap_request_serializer, 'sr')
+
+@login_required
+async def stream_swap_requests(request, user_id, conn):
+    """Server-Sent Events feed of changes to the current user's swap requests.
+
+    Each client is a parked coroutine rather than a thread, so idle streams
+    don't use up the threads serving the Flask routes.
+    """
+    events = swap_events.subscribe(user_id, LoopEventQueue(SSE_QUEUE_SIZE))
+    return StreamingResponse(swap_event_stream(user_id, events), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@admin_required
+async def get_admin_stats(request, conn):
+    """Get admin dashboard statistics"""
+    try:
+        days = get_stats_days(request.query_params)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    counters = await conn.execute_fetchall('SELECT name, value FROM stats_counters')
+    daily = await conn.execute_fetchall(STATS_DAILY_QUERY, (days - 1,))
+    return json_response(summarize_stats(counters, daily), request=request)
+
+@admin_required
+async def get_admin_users(request, conn):
+    """Get all users for admin management"""
+    return await list_response(request, conn, admin_users_listing(), admin_user_serializer, 'u')
+
+@admin_required
+async def get_admin_swap_requests(request, conn):
+    """Get all swap requests for admin management, archived ones too for ?history=1"""
+    listing = admin_swap_requests_listing(await history_archives(request, conn))
+    return await list_response(request, conn, listing, swap_request_serializer, 'sr')
+
+class RequestMetricsMiddleware:
+    """Record native route latencies in the registry behind Flask's /metrics"""
+
+    def __init__(self, app, route):
+        self.app = app
+        self.route = route
+
+    async def __call__(self, scope, receive, send):
+        started = time.perf_counter()
+
+        async def send_and_record(message):
+            # Like the Flask hook, stop the clock once the response starts
+            if message['type'] == 'http.response.start':
+                record_request(self.route, scope['method'], message['status'], time.perf_counter() - started)
+            await send(message)
+
+        await self.app(scope, receive, send_and_record)
+
+@contextlib.asynccontextmanager
+async def lifespan(application):
+    yield
+    await async_db_pool.close_all()
+
+# app.API_CORS spelled the way Starlette's CORSMiddleware takes it
+NATIVE_ROUTE_CORS = {
+    'allow_origins': API_CORS['origins'],
+    'allow_methods': API_CORS['methods'],
+    'allow_headers': API_CORS['allow_headers'],
+    'expose_headers': API_CORS['expose_headers'],
+    'allow_credentials': API_CORS['supports_credentials'],
+}
+
+def native_route(path, endpoint):
+    """GET route with the same CORS policy and metrics as the Flask routes"""
+    return Route(path, endpoint, methods=['GET'], middleware=[
+        Middleware(RequestMetricsMiddleware, route=path),
+        Middleware(CORSMiddleware, **NATIVE_ROUTE_CORS),
+    ])
+
+# Native routes only claim GET; other methods on the same paths (including
+# CORS preflights) fall through to the Flask mount, as does everything else
+application = Starlette(
+    routes=[
+        native_route('/api/users', get_users),
+        native_route('/api/swap-requests', get_swap_requests),
+        native_route('/api/swap-requests/stream', stream_swap_requests),
+        native_route('/api/admin/stats', get_admin_stats),
+        native_route('/api/admin/users', get_admin_users),
+        native_route('/api/admin/swap-requests', get_admin_swap_requests),
+        Mount('/', WSGIMiddleware(flask_app, workers=ASGI_BLOCKING_WORKERS)),
+    ],
+    lifespan=lifespan,
+)
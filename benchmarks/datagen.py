@@ -0,0 +1,187 @@
+"""Fill a database with synthetic users and swap requests for benchmarking.
+
+The data is deterministic for a given --seed: skill popularity follows a
+Zipf-like curve (a few skills everyone lists, a long tail nobody does),
+and most swap requests go to a user who actually offers the wanted skill.
+Rows are written with executemany inside one transaction per table.
+
+    python -m benchmarks.datagen --users 10000 --swaps 50000
+    python -m benchmarks.datagen --db /tmp/bench.db --users 500 --swaps 2000 --seed 7
+
+Every generated user can log in as user<N>@example.com with PASSWORD.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import app as backend
+
+PASSWORD = 'benchmark'
+
+SKILLS = [
+    'Python', 'JavaScript', 'Excel', 'Photography', 'Guitar', 'Spanish', 'Cooking',
+    'Graphic Design', 'SQL', 'Public Speaking', 'Piano', 'French', 'Yoga', 'React',
+    'Video Editing', 'Writing', 'Drawing', 'Java', 'Data Analysis', 'Marketing',
+    'German', 'Baking', 'Machine Learning', 'Knitting', 'Chess', 'UX Design',
+    'Go', 'Rust', 'Statistics', 'Gardening', 'Japanese', 'Woodworking', 'Singing',
+    'Illustrator', 'Photoshop', 'Swimming', 'Accounting', 'Calligraphy', 'Mandarin',
+    'Podcasting', 'Kotlin', 'Swift', 'Pottery', 'Sewing', 'Meditation', 'Violin',
+    'Portuguese', 'Blender', 'Italian', 'Running', 'Figma', 'Negotiation', 'Docker',
+    'Kubernetes', 'Drums', 'Arabic', 'Tennis', 'Bookkeeping', 'Salsa', 'Origami',
+]
+
+LOCATIONS = [
+    ('New York', 8), ('London', 7), ('Berlin', 5), ('Bangalore', 6), ('Toronto', 4),
+    ('Sydney', 3), ('Paris', 4), ('Lagos', 3), ('Sao Paulo', 3), ('Tokyo', 3),
+    ('Mexico City', 2), ('Remote', 10), ('', 6),
+]
+
+AVAILABILITY = [('weekends', 5), ('evenings', 4), ('weekdays', 2), ('flexible', 3)]
+
+STATUSES = [('pending', 40), ('accepted', 35), ('rejected', 20), ('cancelled', 5)]
+
+def zipf_weights(count, exponent=1.1):
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+def weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights)[0]
+
+def pick_skills(rng, weights, count, exclude=()):
+    """Draw `count` distinct skills by popularity"""
+    picked = []
+    while len(picked) < count:
+        skill = rng.choices(SKILLS, weights)[0]
+        if skill not in picked and skill not in exclude:
+            picked.append(skill)
+    return picked
+
+def pick_slots(rng, availability):
+    """Weekly availability bitmap: the preset's hours, some dropped, plus an extra block"""
+    slots = [slot for slot in backend.AVAILABILITY_PRESETS[availability] if rng.random() > 0.2]
+    start = rng.randrange(backend.HOURS_PER_WEEK - 4)
+    slots.extend(range(start, start + rng.randint(2, 4)))
+    return backend.encode_slots(slots)
+
+def timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def generate(path, users, swaps, seed=1, days=365, hash_method=None):
+    """Create the schema at `path` and append synthetic data; return row counts"""
+    backend.DATABASE = path
+    backend.init_db()
+    rng = random.Random(seed)
+    # Separate stream, so adding slots didn't change the rest of a seeded dataset
+    slot_rng = random.Random(f'{seed}:slots')
+    weights = zipf_weights(len(SKILLS))
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    password_hash = backend.generate_password_hash(PASSWORD, hash_method or backend.PASSWORD_HASH_METHOD)
+
+    conn = backend.connect_db()
+    try:
+        first_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+
+        with conn:
+            conn.executemany('INSERT OR IGNORE INTO skills (name) VALUES (?)', [(name,) for name in SKILLS])
+        skill_ids = dict(conn.execute('SELECT name, id FROM skills'))
+
+        user_rows = []
+        skill_rows = []
+        profiles = []
+        for user_id in range(first_id, first_id + users):
+            offered = pick_skills(rng, weights, rng.randint(1, 5))
+            wanted = pick_skills(rng, weights, rng.randint(1, 4), exclude=offered)
+            created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+            location = weighted(rng, LOCATIONS)
+            availability = weighted(rng, AVAILABILITY)
+            user_rows.append((
+                user_id, f'User {user_id}', f'user{user_id}@example.com', password_hash,
+                location, '', ','.join(offered), ','.join(wanted), availability,
+                pick_slots(slot_rng, availability), int(rng.random() > 0.1), timestamp(created_at)
+            ))
+            for direction, names in (('offered', offered), ('wanted', wanted)):
+                skill_rows.extend(
+                    (user_id, skill_ids[name], direction, position) for position, name in enumerate(names)
+                )
+            profiles.append((user_id, offered, wanted, created_at))
+
+        with conn:
+            conn.executemany('''
+                INSERT INTO users (id, name, email, password_hash, location, profile_photo,
+                                   skills_offered, skills_wanted, availability, availability_slots,
+                                   is_public, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', user_rows)
+            conn.executemany('''
+                INSERT INTO user_skills (user_id, skill_id, direction, position)
+                VALUES (?, ?, ?, ?)
+            ''', skill_rows)
+
+        swap_rows = generate_swaps(rng, profiles, swaps, now)
+        with conn:
+            conn.executemany('''
+                INSERT INTO swap_requests (from_user_id, to_user_id, my_skill, wanted_skill,
+                                           status, rating, feedback, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', swap_rows)
+    finally:
+        conn.close()
+
+    return {'users': len(user_rows), 'user_skills': len(skill_rows), 'swap_requests': len(swap_rows)}
+
+def generate_swaps(rng, profiles, count, now):
+    """Swap request rows, mostly sent to someone who offers the wanted skill"""
+    if len(profiles) < 2:
+        return []
+    offered_by = {}
+    for profile in profiles:
+        for skill in profile[1]:
+            offered_by.setdefault(skill, []).append(profile)
+
+    rows = []
+    pending_pairs = set()
+    attempts = 0
+    while len(rows) < count and attempts < count * 3:
+        attempts += 1
+        sender = rng.choice(profiles)
+        wanted = rng.choice(sender[2])
+        candidates = offered_by.get(wanted)
+        receiver = rng.choice(candidates) if candidates and rng.random() < 0.9 else rng.choice(profiles)
+        if receiver is sender:
+            continue
+
+        status = weighted(rng, STATUSES)
+        if status == 'pending':
+            # The app allows one pending request per sender/recipient pair
+            if (sender[0], receiver[0]) in pending_pairs:
+                continue
+            pending_pairs.add((sender[0], receiver[0]))
+        rating = feedback = None
+        if status == 'accepted' and rng.random() < 0.6:
+            rating = rng.choices([1, 2, 3, 4, 5], [1, 2, 5, 12, 14])[0]
+            feedback = rng.choice(['Great session', 'Very helpful', 'Would swap again', None])
+
+        earliest = max(sender[3], receiver[3])
+        created_at = earliest + (now - earliest) * rng.random()
+        rows.append((sender[0], receiver[0], rng.choice(sender[1]), wanted,
+                     status, rating, feedback, timestamp(created_at)))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=backend.DATABASE, help='database file to fill')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--swaps', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--days', type=int, default=365, help='spread created_at over this many days')
+    parser.add_argument('--hash-method', help='password hash method (default: PASSWORD_HASH_METHOD)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.db, args.users, args.swaps, args.seed, args.days, args.hash_method)
+    elapsed = time.perf_counter() - start
+    print(', '.join(f'{count} {name}' for name, count in counts.items()) + f' in {elapsed:.1f}s -> {args.db}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+"""Drive every route of a local server with a weighted request mix.
+
+Generates a fresh database (see benchmarks.datagen), starts the app
+against it, then runs --concurrency virtual users. Each one logs in as its
+own generated user (and as the admin for admin routes) and picks
+operations from the mix until --duration runs out. Reports p50/p95/p99
+latency, throughput and SQL statements per request for each route, and
+saves everything as JSON for comparing runs between commits.
+
+    python -m benchmarks.loadgen --json before.json
+    python -m benchmarks.loadgen --json after.json --compare before.json
+    python -m benchmarks.loadgen --mix users=10,matches=5,create_swap=1 --concurrency 64
+
+Statement counts come from the X-Query-Count header, which the server
+only sends when started with SKILL_SWAP_COUNT_QUERIES=1 (done here).
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from benchmarks import datagen
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADMIN_EMAIL = 'admin@skillswap.com'
+ADMIN_PASSWORD = 'admin123'
+
+# Operation name -> relative weight. Every route in app.py is covered.
+DEFAULT_MIX = {
+    'home': 1,
+    'register': 1,
+    'login': 2,
+    'logout': 1,
+    'profile': 8,
+    'update_profile': 2,
+    'users': 20,
+    'users_by_skill': 10,
+    'users_stream': 1,
+    'matches': 10,
+    'create_swap': 5,
+    'swaps': 10,
+    # Each stream holds a server thread until its next keepalive write
+    'swap_events': 0.2,
+    'update_swap': 4,
+    'delete_swap': 2,
+    'admin_stats': 3,
+    'admin_users': 3,
+    'admin_update_user': 1,
+    'admin_delete_user': 1,
+    'admin_swaps': 3,
+    'admin_delete_swap': 1,
+}
+
+# Server helpers, shared with benchmarks.serving_modes
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def server_command(mode, port, workers, threads):
+    bind = f'127.0.0.1:{port}'
+    if mode == 'sync':
+        return [sys.executable, '-m', 'gunicorn', '--preload', '--workers', str(workers),
+                '--threads', str(threads), '--bind', bind, '--log-level', 'warning', 'app:app']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--workers', str(workers),
+            '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning', '--no-access-log']
+
+def start_server(mode, workdir, port, workers, threads, env=None):
+    """Start gunicorn (sync) or uvicorn (async) in `workdir` and wait for it to listen"""
+    env = dict(os.environ, **(env or {}))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.environ.get('PYTHONPATH'), REPO_ROOT]))
+    # The database path is relative, so run the server from the seeded directory.
+    # Its own session lets stop_server() reach every child, hash pool included.
+    proc = subprocess.Popen(server_command(mode, port, workers, threads), cwd=workdir, env=env,
+                            start_new_session=True)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{mode} server exited with status {proc.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    stop_server(proc)
+    raise RuntimeError(f'{mode} server did not start')
+
+def stop_server(proc):
+    """Stop the server and anything it started"""
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        pass
+    # Reap stragglers, so none of them keeps the port or our stdout open
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+class Client:
+    """Keep-alive HTTP connection carrying one session cookie"""
+
+    def __init__(self, port):
+        self.port = port
+        self.cookie = None
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def request(self, method, path, body=None, keep_cookie=True):
+        """Return (status, parsed JSON body or None, statement count or None)"""
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            try:
+                self.conn.request(method, path, body, headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self.conn.close()
+                # The server may have dropped an idle keep-alive connection;
+                # retry once on a fresh one
+                stale = isinstance(e, (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError))
+                if attempt == 2 or not stale:
+                    raise
+        cookie = response.getheader('Set-Cookie')
+        if cookie and keep_cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        queries = response.getheader('X-Query-Count')
+        try:
+            payload = json.loads(data) if data and response.getheader('Content-Type', '').startswith('application/json') else None
+        except ValueError:
+            payload = None
+        return response.status, payload, int(queries) if queries is not None else None
+
+    def first_event(self, path):
+        """Open an event stream, read up to the first event, then hang up"""
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            conn.request('GET', path, headers={'Cookie': self.cookie} if self.cookie else {})
+            response = conn.getresponse()
+            if response.status == 200:
+                response.fp.readline()
+            return response.status, None, None
+        finally:
+            conn.close()
+
+class VirtualUser:
+    """One simulated client: a user session, an admin session and what it has seen"""
+
+    def __init__(self, port, index, user_count, seed):
+        self.index = index
+        self.rng = random.Random(seed + index)
+        self.email = f'user{2 + index % user_count}@example.com'
+        self.user_count = user_count
+        self.user = Client(port)
+        self.admin = Client(port)
+        self.sent = []          # swap request ids this user created
+        self.received = []      # pending swap request ids addressed to this user
+        self.registered = []    # user ids created by the register operation
+        self.seen_requests = []  # any swap request ids, for admin deletes
+        self.counter = 0
+        self.route = None
+
+    def log_in(self):
+        for client, email, password in ((self.user, self.email, datagen.PASSWORD),
+                                        (self.admin, ADMIN_EMAIL, ADMIN_PASSWORD)):
+            status, _, _ = client.request('POST', '/api/login', {'email': email, 'password': password})
+            if status != 200:
+                raise RuntimeError(f'login as {email} failed with status {status}')
+
+    def random_user_id(self):
+        # Generated users follow the admin, so ids run from 2
+        return self.rng.randint(2, self.user_count + 1)
+
+    def random_skill(self):
+        return self.rng.choices(datagen.SKILLS, datagen.zipf_weights(len(datagen.SKILLS)))[0]
+
+    def profile_body(self):
+        return {
+            'name': f'Bench {self.counter}',
+            'location': 'Remote',
+            'skills_offered': [self.random_skill() for _ in range(3)],
+            'skills_wanted': [self.random_skill() for _ in range(2)],
+            'availability': self.rng.choice(['weekends', 'evenings']),
+            'is_public': True,
+        }
+
+    def call(self, route, client, *args, **kwargs):
+        # Remember the route first, so a failed request is still attributed to it
+        self.route = route
+        return route, client.request(*args, **kwargs)
+
+    # Each operation returns (route, (status, body, statement count))
+    def home(self):
+        return self.call('GET /', self.user, 'GET', '/')
+
+    def register(self):
+        self.counter += 1
+        body = dict(self.profile_body(), email=f'bench-{self.index}-{self.counter}@example.com',
+                    password=datagen.PASSWORD)
+        # A throwaway client, so this virtual user keeps its own session
+        client = Client(self.user.port)
+        route, result = self.call('POST /api/register', client, 'POST', '/api/register', body)
+        client.conn.close()
+        if result[0] == 201:
+            self.registered.append(result[1]['user_id'])
+        return route, result
+
+    def login(self):
+        return self.call('POST /api/login', self.user, 'POST', '/api/login', {'email': self.email, 'password': datagen.PASSWORD})
+
+    def logout(self):
+        # Sessions are signed cookies, so keeping the old one keeps us logged in
+        return self.call('POST /api/logout', self.user, 'POST', '/api/logout', keep_cookie=False)
+
+    def profile(self):
+        return self.call('GET /api/profile', self.user, 'GET', '/api/profile')
+
+    def update_profile(self):
+        self.counter += 1
+        return self.call('PUT /api/profile', self.user, 'PUT', '/api/profile', self.profile_body())
+
+    def users(self):
+        return self.call('GET /api/users', self.user, 'GET', '/api/users?limit=50')
+
+    def users_by_skill(self):
+        return self.call('GET /api/users?skill', self.user, 'GET', f'/api/users?skill={quote(self.random_skill())}&limit=50')
+
+    def users_stream(self):
+        return self.call('GET /api/users?stream', self.user, 'GET', '/api/users?stream=ndjson&limit=500')
+
+    def matches(self):
+        return self.call('GET /api/matches', self.user, 'GET', '/api/matches')
+
+    def create_swap(self):
+        body = {'to_user_id': self.random_user_id(), 'my_skill': self.random_skill(),
+                'wanted_skill': self.random_skill()}
+        route, result = self.call('POST /api/swap-requests', self.user, 'POST', '/api/swap-requests', body)
+        if result[0] == 201:
+            self.sent.append(result[1]['request_id'])
+        return route, result
+
+    def swaps(self):
+        route, result = self.call('GET /api/swap-requests', self.user, 'GET', '/api/swap-requests?type=received&limit=50')
+        if result[0] == 200:
+            self.received = [req['id'] for req in result[1] if req['status'] == 'pending']
+            self.seen_requests = [req['id'] for req in result[1]]
+        return route, result
+
+    def swap_events(self):
+        self.route = 'GET /api/swap-requests/stream'
+        return self.route, self.user.first_event('/api/swap-requests/stream')
+
+    def update_swap(self):
+        if self.received:
+            request_id = self.received.pop()
+            body = {'status': self.rng.choice(['accepted', 'rejected'])}
+        elif self.sent:
+            request_id = self.rng.choice(self.sent)
+            body = {'rating': self.rng.randint(1, 5), 'feedback': 'Thanks!'}
+        else:
+            return self.swaps()
+        return self.call('PUT /api/swap-requests/<id>', self.user, 'PUT', f'/api/swap-requests/{request_id}', body)
+
+    def delete_swap(self):
+        if not self.sent:
+            return self.create_swap()
+        request_id = self.sent.pop()
+        return self.call('DELETE /api/swap-requests/<id>', self.user, 'DELETE', f'/api/swap-requests/{request_id}')
+
+    def admin_stats(self):
+        return self.call('GET /api/admin/stats', self.admin, 'GET', '/api/admin/stats')
+
+    def admin_users(self):
+        return self.call('GET /api/admin/users', self.admin, 'GET', '/api/admin/users?limit=50')
+
+    def admin_update_user(self):
+        user_id = self.random_user_id()
+        return self.call('PUT /api/admin/users/<id>', self.admin, 'PUT', f'/api/admin/users/{user_id}', {'is_public': self.rng.random() > 0.1})
+
+    def admin_delete_user(self):
+        # Only delete users this run created, so the seeded data set stays put
+        if not self.registered:
+            return self.register()
+        user_id = self.registered.pop()
+        return self.call('DELETE /api/admin/users/<id>', self.admin, 'DELETE', f'/api/admin/users/{user_id}')
+
+    def admin_swaps(self):
+        return self.call('GET /api/admin/swap-requests', self.admin, 'GET', '/api/admin/swap-requests?limit=50')
+
+    def admin_delete_swap(self):
+        if not self.seen_requests:
+            return self.swaps()
+        request_id = self.seen_requests.pop()
+        return self.call('DELETE /api/admin/swap-requests/<id>', self.admin, 'DELETE', f'/api/admin/swap-requests/{request_id}')
+
+def parse_mix(text):
+    """Parse 'op=weight,op=weight' into a mix dict"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}'; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def run_load(port, mix, concurrency, duration, user_count, seed):
+    """Run the virtual users; return {route: [(latency, status, statements), ...]}"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {}
+    lock = threading.Lock()
+    vusers = [VirtualUser(port, index, user_count, seed) for index in range(concurrency)]
+    for vuser in vusers:
+        vuser.log_in()
+
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def worker(vuser):
+        mine = {}
+        while time.perf_counter() < deadline:
+            operation = getattr(vuser, vuser.rng.choices(names, weights)[0])
+            sent = time.perf_counter()
+            try:
+                route, (status, _, statements) = operation()
+            except (OSError, http.client.HTTPException):
+                route, status, statements = vuser.route, None, None
+            mine.setdefault(route, []).append((time.perf_counter() - sent, status, statements))
+        with lock:
+            for route, results in mine.items():
+                samples.setdefault(route, []).extend(results)
+
+    threads = [threading.Thread(target=worker, args=(vuser,)) for vuser in vusers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+def summarize(results, elapsed):
+    latencies = sorted(latency for latency, _, _ in results)
+    statements = [count for _, _, count in results if count is not None]
+    statuses = {}
+    for _, status, _ in results:
+        key = f'{status // 100}xx' if status else 'failed'
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        'requests': len(results),
+        'requests_per_second': len(results) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_request': sum(statements) / len(statements) if statements else None,
+        'max_queries': max(statements) if statements else None,
+        'statuses': statuses,
+    }
+
+def build_report(samples, elapsed, args, dataset):
+    routes = {route: summarize(results, elapsed) for route, results in sorted(samples.items())}
+    everything = [sample for results in samples.values() for sample in results]
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'settings': {
+            'mode': args.mode, 'workers': args.workers, 'threads': args.threads,
+            'concurrency': args.concurrency, 'duration': args.duration, 'seed': args.seed,
+            'mix': args.mix,
+        },
+        'dataset': dataset,
+        'total': summarize(everything, elapsed),
+        'routes': routes,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def format_queries(value):
+    return f'{value:.1f}' if value is not None else '-'
+
+def print_report(report, baseline=None):
+    header = f"{'route':<38} {'req':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6} {'non-2xx':>8}"
+    if baseline:
+        header += f" {'p95 vs base':>12} {'req/s vs base':>14}"
+    print(header)
+    rows = list(report['routes'].items()) + [('TOTAL', report['total'])]
+    for route, stats in rows:
+        non_ok = stats['requests'] - stats['statuses'].get('2xx', 0) - stats['statuses'].get('3xx', 0)
+        line = (f"{route:<38} {stats['requests']:>6} {stats['requests_per_second']:>8.1f} {stats['p50_ms']:>8.1f} "
+                f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {format_queries(stats['queries_per_request']):>6} {non_ok:>8}")
+        if baseline:
+            base = baseline['total'] if route == 'TOTAL' else baseline['routes'].get(route)
+            if base and base['p95_ms'] and base['requests_per_second']:
+                line += (f" {(stats['p95_ms'] / base['p95_ms'] - 1) * 100:>+11.0f}%"
+                         f" {(stats['requests_per_second'] / base['requests_per_second'] - 1) * 100:>+13.0f}%")
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['sync', 'async'], default='sync')
+    parser.add_argument('--users', type=int, default=2000, help='users to generate')
+    parser.add_argument('--swaps', type=int, default=10000, help='swap requests to generate')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='operation weights, e.g. users=10,matches=5 (default: every route)')
+    parser.add_argument('--concurrency', type=int, default=16, help='virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of load')
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker (sync mode)')
+    parser.add_argument('--hash-method', help='password hash method for generated users')
+    parser.add_argument('--json', metavar='PATH', help='write the report as JSON')
+    parser.add_argument('--compare', metavar='PATH', help='show changes against an earlier JSON report')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='skill-swap-load-')
+    dataset = datagen.generate(os.path.join(workdir, 'skill_swap.db'), args.users, args.swaps,
+                               args.seed, hash_method=args.hash_method)
+    port = free_port()
+    proc = start_server(args.mode, workdir, port, args.workers, args.threads,
+                        env={'SKILL_SWAP_COUNT_QUERIES': '1'})
+    try:
+        samples, elapsed = run_load(port, args.mix, args.concurrency, args.duration, args.users, args.seed)
+    finally:
+        stop_server(proc)
+
+    report = build_report(samples, elapsed, args, dataset)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Measure login throughput at different password hashing work factors.
+
+Reports how many password checks (one per login) a single core can do per
+second for each method, plus the throughput of a process pool the size of
+PASSWORD_HASH_WORKERS. Use it to choose PASSWORD_HASH_METHOD.
+
+    python -m benchmarks.password_hashing
+    python -m benchmarks.password_hashing --methods pbkdf2:sha256:600000 scrypt:32768:8:1 --json results.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+]
+
+PASSWORD = 'correct horse battery staple'
+
+def _check_many(password_hash, count):
+    for _ in range(count):
+        check_password_hash(password_hash, PASSWORD)
+    return count
+
+def bench_single_core(password_hash, duration):
+    """Password checks per second on one core"""
+    checks = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        check_password_hash(password_hash, PASSWORD)
+        checks += 1
+    return checks / (time.perf_counter() - start)
+
+def bench_pool(password_hash, workers, per_worker):
+    """Password checks per second across a process pool"""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Warm the workers up so process start-up isn't measured
+        list(executor.map(_check_many, [password_hash] * workers, [1] * workers))
+        start = time.perf_counter()
+        total = sum(executor.map(_check_many, [password_hash] * workers, [per_worker] * workers))
+        return total / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS,
+                        help='Werkzeug hash methods to compare')
+    parser.add_argument('--duration', type=float, default=2.0,
+                        help='seconds to spend on each single-core measurement')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='process pool size for the pooled measurement')
+    parser.add_argument('--json', metavar='PATH', help='also write results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'method':<24} {'ms/login':>9} {'logins/s/core':>14} {'pool logins/s':>14}")
+    for method in args.methods:
+        password_hash = generate_password_hash(PASSWORD, method)
+        per_core = bench_single_core(password_hash, args.duration)
+        per_worker = max(1, int(per_core * args.duration / 2))
+        pooled = bench_pool(password_hash, args.workers, per_worker)
+        results.append({
+            'method': method,
+            'ms_per_login': 1000 / per_core,
+            'logins_per_second_per_core': per_core,
+            'pool_workers': args.workers,
+            'pool_logins_per_second': pooled,
+        })
+        print(f'{method:<24} {1000 / per_core:>9.1f} {per_core:>14.1f} {pooled:>14.1f}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
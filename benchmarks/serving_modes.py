@@ -0,0 +1,126 @@
+"""Compare the sync (gunicorn + Flask) and async (uvicorn + asgi.py) serving modes.
+
+Seeds a throwaway database, starts each server against it in turn, logs in
+as the admin and drives the read endpoints from a pool of keep-alive
+client threads. Reports requests/s and latency percentiles per endpoint.
+
+    python -m benchmarks.serving_modes
+    python -m benchmarks.serving_modes --users 5000 --concurrency 64 --duration 15 --json results.json
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.datagen import generate
+from benchmarks.loadgen import free_port, percentile, start_server, stop_server
+
+ENDPOINTS = [
+    '/api/users?limit=50',
+    '/api/users?skill=Python&limit=50',
+    '/api/swap-requests',
+    '/api/admin/stats',
+    '/api/admin/users?limit=50',
+]
+
+def login(port):
+    """Log in as the default admin and return the session cookie"""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', '/api/login', json.dumps({'email': 'admin@skillswap.com', 'password': 'admin123'}),
+                 {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f'login failed with status {response.status}')
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+def drive(port, path, cookie, concurrency, duration):
+    """Hit one endpoint from `concurrency` threads; return (latencies, errors, elapsed)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        mine = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            sent = time.perf_counter()
+            try:
+                conn.request('GET', path, headers={'Cookie': cookie})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                ok = False
+            if ok:
+                mine.append(time.perf_counter() - sent)
+            else:
+                failed += 1
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['sync', 'async'], choices=['sync', 'async'])
+    parser.add_argument('--users', type=int, default=2000, help='users to seed')
+    parser.add_argument('--swaps', type=int, default=10000, help='swap requests to seed')
+    parser.add_argument('--concurrency', type=int, default=32, help='client threads per endpoint')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds to drive each endpoint')
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker (sync mode)')
+    parser.add_argument('--json', metavar='PATH', help='also write results as JSON')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='skill-swap-bench-')
+    generate(os.path.join(workdir, 'skill_swap.db'), args.users, args.swaps)
+
+    results = []
+    print(f"{'mode':<6} {'endpoint':<36} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode in args.modes:
+        port = free_port()
+        proc = start_server(mode, workdir, port, args.workers, args.threads)
+        try:
+            cookie = login(port)
+            for path in ENDPOINTS:
+                drive(port, path, cookie, args.concurrency, min(1.0, args.duration))  # warm-up
+                latencies, errors, elapsed = drive(port, path, cookie, args.concurrency, args.duration)
+                latencies.sort()
+                result = {
+                    'mode': mode,
+                    'endpoint': path,
+                    'requests_per_second': len(latencies) / elapsed,
+                    'p50_ms': percentile(latencies, 50) * 1000,
+                    'p95_ms': percentile(latencies, 95) * 1000,
+                    'p99_ms': percentile(latencies, 99) * 1000,
+                    'errors': errors,
+                    'concurrency': args.concurrency,
+                    'workers': args.workers,
+                }
+                results.append(result)
+                print(f"{mode:<6} {path:<36} {result['requests_per_second']:>8.1f} {result['p50_ms']:>8.1f} "
+                      f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {errors:>7}")
+        finally:
+            stop_server(proc)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
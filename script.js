@@ -9,34 +9,74 @@ const API_BASE_URL = 'http://localhost:5000/api';
 
 // Helper function for API Calls
 async function apiCall(endpoint, method = 'GET', data = null, requiresAuth = true) {
+    const { result } = await apiRequest(endpoint, method, data, requiresAuth);
+    return result;
+}
+
+// Like apiCall, but resolves with the response too, for its headers
+async function apiRequest(endpoint, method = 'GET', data = null, requiresAuth = true) {
     const headers = {
         'Content-Type': 'application/json'
     };
-    if (requiresAuth && currentUser) {
-        headers['Authorization'] = `Bearer ${currentUser.token}`;
-    }
     const options = {
         method: method,
-        headers: headers
+        headers: headers,
+        // The API keeps the login in a session cookie
+        credentials: requiresAuth ? 'include' : 'same-origin'
     };
-    if (body) {
+    if (data) {
         options.body = JSON.stringify(data);
     }
 
     try {
         const response = await fetch(`${API_BASE_URL}/${endpoint}`, options);
-        const data = await response.json();
+        const result = await response.json();
         if (!response.ok) {
-            throw new Error(data.message || 'API call failed');
+            throw new Error(result.error || 'API call failed');
         }
 
-        return data;
+        return { response, result };
     } catch (error) {
         console.error('API call error:', error);
         alert(`Error: ${error.message}`);
         throw error; // Re-throw to handle it in the calling function
     }
 }
+
+// Listings are paged; follow X-Next-Cursor until the last page and
+// resolve with every item
+async function apiGetAll(endpoint, pageSize = 500) {
+    const items = [];
+    const separator = endpoint.includes('?') ? '&' : '?';
+    let cursor = null;
+    do {
+        let url = `${endpoint}${separator}limit=${pageSize}`;
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+        const { response, result } = await apiRequest(url);
+        items.push(...result);
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return items;
+}
+
+// Some admin actions are queued and answered with 202 and a job_id;
+// poll the job until it has run, resolving with it or reporting its error
+async function waitForJob(jobId, intervalMs = 1000) {
+    while (true) {
+        const job = await apiCall(`admin/jobs/${jobId}`);
+        if (job.status === 'done') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            const error = new Error(job.error || 'Job failed');
+            alert(`Error: ${error.message}`);
+            throw error;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
     
 // Initialize the app
 document.addEventListener('DOMContentLoaded', async function() {
@@ -372,7 +412,28 @@ function rateSwap(requestId) {
     }
 }
 
-function displayAdminPanel() {
+// Admin user rows in the shape the rest of this file uses
+function fromAdminUser(user) {
+    return {
+        id: user.id,
+        name: user.name,
+        location: user.location,
+        skillsOffered: user.skills_offered,
+        skillsWanted: user.skills_wanted,
+        availability: user.availability,
+        isPublic: Boolean(user.is_public),
+        createdAt: user.created_at
+    };
+}
+
+async function displayAdminPanel() {
+    // Admins manage the users stored by the API, every page of them
+    try {
+        users = (await apiGetAll('admin/users')).map(fromAdminUser);
+        saveData();
+    } catch (error) {
+        // already reported; keep showing the local copy
+    }
     updateAdminStats();
     displayAdminUsers();
     displayAdminSwaps();
@@ -439,8 +500,17 @@ function toggleUserStatus(userId) {
     }
 }
 
-function deleteUser(userId) {
+async function deleteUser(userId) {
     if (confirm('Are you sure you want to delete this user? This will also delete all their swap requests.')) {
+        try {
+            // The user is hidden right away and deleted by a background job
+            const result = await apiCall(`admin/users/${userId}`, 'DELETE');
+            if (result.job_id) {
+                await waitForJob(result.job_id);
+            }
+        } catch (error) {
+            return; // already reported
+        }
         users = users.filter(u => u.id !== userId);
         swapRequests = swapRequests.filter(req => req.from !== userId && req.to !== userId);
         saveData();
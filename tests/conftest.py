@@ -0,0 +1,98 @@
+"""Shared fixtures: every test gets its own database and fresh per-process state"""
+import contextlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Read by app at import time
+os.environ.setdefault('PHOTO_DIR', tempfile.mkdtemp(prefix='skill-swap-photos-'))
+os.environ.setdefault('JOB_WORKERS', '0')  # tests run queued jobs with run_jobs
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+os.environ.setdefault('SWAP_ARCHIVE_SCHEDULED', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as skill_swap  # noqa: E402
+
+PASSWORD = 'secret123'
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Path of a migrated database the app is pointed at"""
+    path = str(tmp_path / 'skill_swap.db')
+    monkeypatch.setattr(skill_swap, 'DATABASE', path)
+    monkeypatch.setattr(skill_swap, 'users_cache', skill_swap.ResultCache('users', skill_swap.CACHE_BACKENDS['memory']()))
+    monkeypatch.setattr(skill_swap, 'metrics', skill_swap.MetricsRegistry(skill_swap.METRICS_LATENCY_BUCKETS))
+    skill_swap.db_pool.close_all()
+    skill_swap.admin_cache.clear()
+    skill_swap.match_index.invalidate()
+    skill_swap.availability_index.invalidate()
+    skill_swap.init_db()
+    yield path
+    skill_swap.db_pool.close_all()
+
+@pytest.fixture
+def conn(db):
+    """A direct connection to the test database"""
+    conn = skill_swap.connect_db()
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def client(db):
+    return skill_swap.app.test_client()
+
+@pytest.fixture
+def make_user(db):
+    """Register a user; returns a test client logged in as them, with .user_id set"""
+    def make(name, **fields):
+        client = skill_swap.app.test_client()
+        body = {'name': name, 'email': f'{name.lower()}@example.com', 'password': PASSWORD}
+        body.update(fields)
+        response = client.post('/api/register', json=body)
+        assert response.status_code == 201, response.get_json()
+        client.user_id = response.get_json()['user_id']
+        return client
+    return make
+
+@pytest.fixture
+def admin(db):
+    """A test client logged in as the default admin"""
+    client = skill_swap.app.test_client()
+    response = client.post('/api/login', json={'email': 'admin@skillswap.com', 'password': 'admin123'})
+    assert response.status_code == 200, response.get_json()
+    client.user_id = response.get_json()['user']['id']
+    return client
+
+@pytest.fixture
+def run_jobs(db):
+    """Run queued jobs in this thread until none are ready"""
+    def run():
+        skill_swap.JobQueue(1).work(stop_when_idle=True)
+    return run
+
+@pytest.fixture
+def async_client(db, monkeypatch):
+    """Open a Starlette TestClient on asgi.application sharing a Flask client's session"""
+    import asgi
+    from starlette.testclient import TestClient
+
+    monkeypatch.setattr(asgi, 'DATABASE', db)
+    monkeypatch.setattr(asgi, 'async_db_pool', asgi.AsyncConnectionPool(skill_swap.DB_POOL_SIZE))
+    # The native routes look the cache up through app, so follow its fixture copy
+    monkeypatch.setattr(asgi, 'users_cache', skill_swap.users_cache)
+    with contextlib.ExitStack() as stack:
+        def open_client(flask_client):
+            client = stack.enter_context(TestClient(asgi.application))
+            cookie = flask_client.get_cookie(skill_swap.app.config['SESSION_COOKIE_NAME'])
+            if cookie:
+                client.cookies.set(cookie.key, cookie.value)
+            return client
+        yield open_client
+
+def counter(name, **labels):
+    """Current value of a counter in the /metrics registry; give labels in registration order"""
+    key = (name, tuple(labels.items()))
+    return skill_swap.metrics._counters.get(key, 0)
@@ -0,0 +1,38 @@
+from conftest import skill_swap
+
+def test_lru_eviction_and_expiry():
+    cache = skill_swap.TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+    expired = skill_swap.TTLCache(maxsize=2, ttl=-1)
+    expired.set('a', 1)
+    assert expired.get('a', 'gone') == 'gone'
+
+def test_admin_flag_is_cached_until_ttl(admin, conn):
+    assert admin.get('/api/admin/stats').status_code == 200
+
+    # A demotion made elsewhere shows up once the entry expires
+    conn.execute('UPDATE users SET is_admin = 0 WHERE id = ?', (admin.user_id,))
+    conn.commit()
+    assert admin.get('/api/admin/stats').status_code == 200
+    skill_swap.admin_cache.clear()
+    assert admin.get('/api/admin/stats').status_code == 403
+    assert skill_swap.admin_cache.get(admin.user_id) is False
+
+def test_cache_hit_skips_the_query(admin):
+    assert admin.get('/api/admin/stats').status_code == 200
+    queries = []
+    for conn in skill_swap.db_pool._idle:
+        conn.set_trace_callback(queries.append)
+
+    assert admin.get('/api/admin/stats').status_code == 200
+    assert queries
+    assert not [sql for sql in queries if 'is_admin' in sql]
+
+def test_non_admins_are_refused(make_user, client):
+    assert client.get('/api/admin/stats').status_code == 401
+    assert make_user('Someone').get('/api/admin/stats').status_code == 403
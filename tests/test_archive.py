@@ -0,0 +1,153 @@
+import sqlite3
+
+import pytest
+
+from conftest import skill_swap
+
+@pytest.fixture
+def swaps(make_user, conn):
+    """Alice's rated, accepted request to Bob made 200 days ago, and Carol's pending one to Bob"""
+    alice = make_user('Alice')
+    bob = make_user('Bob')
+    carol = make_user('Carol')
+    body = {'to_user_id': bob.user_id, 'my_skill': 'Go', 'wanted_skill': 'Python'}
+    closed = alice.post('/api/swap-requests', json=body).get_json()['request_id']
+    pending = carol.post('/api/swap-requests', json=body).get_json()['request_id']
+    assert bob.put(f'/api/swap-requests/{closed}', json={'status': 'accepted'}).status_code == 200
+    assert alice.put(f'/api/swap-requests/{closed}', json={'rating': 5}).status_code == 200
+
+    conn.execute("UPDATE swap_requests SET created_at = datetime('now', '-200 days')")
+    conn.commit()
+    return alice, bob, carol, closed, pending
+
+def listed_ids(client, url):
+    return [item['id'] for item in client.get(url).get_json()]
+
+def counters(admin, conn):
+    ratings = conn.execute('SELECT * FROM user_ratings ORDER BY user_id').fetchall()
+    return admin.get('/api/admin/stats').get_json(), [tuple(row) for row in ratings]
+
+def test_old_closed_requests_move_to_monthly_tables(swaps, conn):
+    _, _, _, closed, pending = swaps
+    month = conn.execute("SELECT strftime('%Y_%m', created_at) FROM swap_requests WHERE id = ?", (closed,)).fetchone()[0]
+
+    assert skill_swap.archive_swap_requests(conn, days=365) == 0
+    assert skill_swap.archive_swap_requests(conn, days=180) == 1
+
+    assert [row[0] for row in conn.execute('SELECT id FROM swap_requests')] == [pending]
+    assert skill_swap.archive_partitions(conn) == [f'swap_requests_archive_{month}']
+    archived = conn.execute(f'SELECT status, rating FROM swap_requests_archive_{month} WHERE id = ?', (closed,)).fetchone()
+    assert tuple(archived) == ('accepted', 5)
+    assert tuple(conn.execute('SELECT id, month FROM archived_swap_requests').fetchone()) == (closed, month)
+
+def test_history_includes_archived_requests(swaps, admin, conn):
+    alice, bob, _, closed, pending = swaps
+    skill_swap.archive_swap_requests(conn, days=180)
+
+    assert listed_ids(alice, '/api/swap-requests') == []
+    assert listed_ids(alice, '/api/swap-requests?history=1') == [closed]
+    assert sorted(listed_ids(bob, '/api/swap-requests?type=received&history=1')) == [closed, pending]
+    assert listed_ids(admin, '/api/admin/swap-requests') == [pending]
+    assert sorted(listed_ids(admin, '/api/admin/swap-requests?history=1')) == [closed, pending]
+
+def test_archiving_leaves_stats_and_ratings_alone(swaps, admin, conn):
+    closed = swaps[3]
+    before = counters(admin, conn)
+    skill_swap.archive_swap_requests(conn, days=180)
+    assert counters(admin, conn) == before
+
+    skill_swap.restore_swap_requests(conn, [closed])
+    conn.commit()
+    assert counters(admin, conn) == before
+
+def test_updating_an_archived_request_restores_it(swaps, conn):
+    alice, _, _, closed, _ = swaps
+    skill_swap.archive_swap_requests(conn, days=180)
+
+    response = alice.put(f'/api/swap-requests/{closed}', json={'feedback': 'Great teacher'})
+    assert response.status_code == 200
+    row = conn.execute('SELECT status, rating, feedback FROM swap_requests WHERE id = ?', (closed,)).fetchone()
+    assert tuple(row) == ('accepted', 5, 'Great teacher')
+    assert conn.execute('SELECT COUNT(*) FROM archived_swap_requests').fetchone()[0] == 0
+
+def test_deleting_an_archived_request_restores_it_first(swaps, admin, conn):
+    alice, bob, _, closed, _ = swaps
+    skill_swap.archive_swap_requests(conn, days=180)
+
+    assert alice.delete(f'/api/swap-requests/{closed}').status_code == 200
+    assert listed_ids(alice, '/api/swap-requests?history=1') == []
+    assert conn.execute('SELECT COUNT(*) FROM archived_swap_requests').fetchone()[0] == 0
+    # The triggers saw the delete, so the rating is gone with it
+    stats = admin.get('/api/admin/stats').get_json()
+    assert stats['swaps_by_status'] == {'pending': 1}
+    assert conn.execute('SELECT rating_count FROM user_ratings WHERE user_id = ?', (bob.user_id,)).fetchone()[0] == 0
+
+def test_archive_runs_as_an_admin_job(swaps, admin, conn, run_jobs):
+    response = admin.post('/api/admin/jobs', json={'kind': 'archive_swap_requests'})
+    assert response.status_code == 202
+
+    run_jobs()
+    job = admin.get(f"/api/admin/jobs/{response.get_json()['job_id']}").get_json()
+    assert (job['status'], job['result']) == ('done', {'archived': 1})
+    assert conn.execute('SELECT COUNT(*) FROM archived_swap_requests').fetchone()[0] == 1
+
+def test_deleting_a_user_removes_their_archived_requests(swaps, admin, conn, run_jobs):
+    alice, _, _, _, pending = swaps
+    skill_swap.archive_swap_requests(conn, days=180)
+
+    admin.delete(f'/api/admin/users/{alice.user_id}')
+    run_jobs()
+    assert listed_ids(admin, '/api/admin/swap-requests?history=1') == [pending]
+    assert conn.execute('SELECT COUNT(*) FROM archived_swap_requests').fetchone()[0] == 0
+
+def archived_count(conn):
+    return conn.execute('SELECT COUNT(*) FROM archived_swap_requests').fetchone()[0]
+
+def test_others_cannot_restore_an_archived_request(swaps, conn):
+    _, bob, carol, closed, _ = swaps
+    skill_swap.archive_swap_requests(conn, days=180)
+
+    assert carol.put(f'/api/swap-requests/{closed}', json={'feedback': 'Spam'}).status_code == 403
+    assert bob.put(f'/api/swap-requests/{closed}', json={'rating': 1}).status_code == 403
+    assert carol.delete(f'/api/swap-requests/{closed}').status_code == 403
+    assert bob.delete(f'/api/swap-requests/{closed}').status_code == 403
+    assert archived_count(conn) == 1
+
+def test_rejected_update_leaves_request_archived(swaps, conn):
+    alice, bob, _, closed, _ = swaps
+    skill_swap.archive_swap_requests(conn, days=180)
+    alice.post('/api/swap-requests', json={'to_user_id': bob.user_id, 'my_skill': 'Go', 'wanted_skill': 'Python'})
+
+    assert bob.put(f'/api/swap-requests/{closed}', json={'status': 'pending'}).status_code == 409
+    assert archived_count(conn) == 1
+
+def fail_swap_request_deletes(conn):
+    """Make every later delete from swap_requests fail"""
+    conn.execute("""
+        CREATE TRIGGER fail_swap_request_deletes BEFORE DELETE ON swap_requests
+        BEGIN SELECT RAISE(ABORT, 'delete failed'); END
+    """)
+    conn.commit()
+
+@pytest.mark.parametrize('op', ['delete_users', 'delete_swap_requests'])
+def test_failed_bulk_chunk_leaves_requests_archived(swaps, conn, op):
+    alice, _, _, closed, _ = swaps
+    skill_swap.archive_swap_requests(conn, days=180)
+    fail_swap_request_deletes(conn)
+
+    ids = [alice.user_id] if op == 'delete_users' else [closed]
+    with pytest.raises(sqlite3.DatabaseError):
+        skill_swap.run_bulk_operations(conn, [(op, ids)])
+    conn.rollback()
+    assert archived_count(conn) == 1
+    assert conn.execute('SELECT 1 FROM swap_requests WHERE id = ?', (closed,)).fetchone() is None
+
+def test_failed_user_deletion_leaves_requests_archived(swaps, admin, conn, run_jobs):
+    alice = swaps[0]
+    skill_swap.archive_swap_requests(conn, days=180)
+    fail_swap_request_deletes(conn)
+
+    job_id = admin.delete(f'/api/admin/users/{alice.user_id}').get_json()['job_id']
+    run_jobs()
+    assert admin.get(f'/api/admin/jobs/{job_id}').get_json()['status'] == 'queued'
+    assert archived_count(conn) == 1
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+import pytest
+
+from conftest import skill_swap
+
+@pytest.fixture
+def pair(make_user):
+    alice = make_user('Alice', skills_offered=['Go'])
+    bob = make_user('Bob', skills_offered=['Python'])
+    request_id = alice.post('/api/swap-requests', json={
+        'to_user_id': bob.user_id, 'my_skill': 'Go', 'wanted_skill': 'Python'
+    }).get_json()['request_id']
+    return alice, bob, request_id
+
+@pytest.mark.parametrize('path', [
+    '/api/users', '/api/users?skill=Python', '/api/users?limit=1', '/api/swap-requests?type=sent',
+])
+def test_native_routes_match_flask(pair, async_client, path):
+    alice, bob, request_id = pair
+    client = async_client(alice)
+
+    synced = alice.get(path)
+    response = client.get(path)
+    assert response.status_code == synced.status_code == 200
+    assert response.json() == synced.get_json()
+    assert response.headers.get('X-Next-Cursor') == synced.headers.get('X-Next-Cursor')
+
+@pytest.mark.parametrize('path', ['/api/admin/stats', '/api/admin/users', '/api/admin/swap-requests'])
+def test_native_admin_routes(pair, admin, async_client, path):
+    alice, bob, request_id = pair
+
+    assert async_client(admin).get(path).json() == admin.get(path).get_json()
+    assert async_client(alice).get(path).status_code == 403
+
+def test_native_routes_share_the_flask_cors_policy(pair, async_client):
+    alice = pair[0]
+    origin = {'Origin': 'http://localhost:3000'}
+    headers = ('Access-Control-Allow-Origin', 'Access-Control-Allow-Credentials')
+
+    synced = alice.get('/api/swap-requests', headers=origin)
+    response = async_client(alice).get('/api/swap-requests', headers=origin)
+    assert [response.headers.get(name) for name in headers] == [synced.headers.get(name) for name in headers]
+    assert response.headers['Access-Control-Allow-Origin'] == 'http://localhost:3000'
+    assert response.headers['Access-Control-Allow-Credentials'] == 'true'
+    exposed = {name.strip().lower() for name in response.headers['Access-Control-Expose-Headers'].split(',')}
+    assert exposed == {'x-next-cursor', 'link', 'etag'}
+
+    other = async_client(alice).get('/api/swap-requests', headers={'Origin': 'http://evil.example'})
+    assert 'Access-Control-Allow-Origin' not in other.headers
+
+def test_login_required(client, async_client):
+    assert async_client(client).get('/api/users').status_code == 401
+
+def test_other_routes_fall_through_to_flask(pair, async_client):
+    alice, bob, request_id = pair
+    client = async_client(bob)
+
+    response = client.put(f'/api/swap-requests/{request_id}', json={'status': 'accepted'})
+    assert response.status_code == 200
+    assert client.get('/api/swap-requests?type=received').json()[0]['status'] == 'accepted'
+
+def test_event_queue_wakes_the_loop_from_other_threads():
+    import asgi
+
+    async def consume():
+        events = skill_swap.swap_events.subscribe(7, asgi.LoopEventQueue(skill_swap.SSE_QUEUE_SIZE))
+        stream = asgi.swap_event_stream(7, events)
+        assert await stream.__anext__() == f'retry: {skill_swap.SSE_RETRY_MS}\n\n'
+        threading.Timer(0.05, skill_swap.swap_events.publish, ([7], {'type': 'resync'})).start()
+        message = await asyncio.wait_for(stream.__anext__(), 5)
+        await stream.aclose()
+        return message
+
+    assert asyncio.run(consume()) == 'event: resync\ndata: {"type": "resync"}\n\n'
+    assert 7 not in skill_swap.swap_events._subscribers
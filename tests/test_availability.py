@@ -0,0 +1,62 @@
+import threading
+
+from conftest import skill_swap
+
+def ranked(client, **args):
+    response = client.get('/api/users/by-availability', query_string=args)
+    assert response.status_code == 200
+    return [(user['name'], user['overlap_hours']) for user in response.get_json()], response
+
+def test_users_ranked_by_shared_hours(make_user):
+    me = make_user('Me', availability='weekdays')
+    make_user('Flexible', availability='flexible')
+    make_user('Mornings', availability_slots=skill_swap.weekly_slots(range(5), 9, 13))
+    make_user('Weekends', availability='weekends')
+    make_user('Hidden', availability='weekdays', is_public=False)
+
+    users, _ = ranked(me)
+    assert users == [('Flexible', 40), ('Mornings', 20)]
+
+def test_pages_and_filters(make_user):
+    me = make_user('Me', availability='flexible')
+    make_user('Teacher', availability='weekdays', skills_offered=['Python'])
+    make_user('Other', availability='evenings', skills_offered=['Go'])
+
+    users, response = ranked(me, limit=1)
+    assert users == [('Teacher', 40)]
+    assert 'offset=1' in response.headers['Link']
+    users, response = ranked(me, limit=1, offset=1)
+    assert users == [('Other', 20)]
+    assert 'Link' not in response.headers
+
+    users, _ = ranked(me, skill='Go')
+    assert users == [('Other', 20)]
+
+def test_profile_writes_patch_the_index(make_user):
+    me = make_user('Me', availability='weekdays')
+    other = make_user('Other', availability='weekends')
+    assert ranked(me)[0] == []
+
+    assert other.put('/api/profile', json={'name': 'Other', 'availability': 'weekdays'}).status_code == 200
+    assert ranked(me)[0] == [('Other', 40)]
+
+def test_stale_index_reloads_in_background(make_user, conn, monkeypatch):
+    me = make_user('Me', availability='weekdays')
+    other = make_user('Other', availability='weekdays')
+    assert ranked(me)[0] == [('Other', 40)]
+
+    # A write from another process shows up once the reload finishes
+    conn.execute('UPDATE users SET is_public = 0 WHERE id = ?', (other.user_id,))
+    conn.commit()
+    index = skill_swap.availability_index
+    index._loaded_at -= skill_swap.MATCH_INDEX_MAX_AGE
+    # Hold the rebuild until the stale copy has answered
+    built = threading.Event()
+    build = index._build
+    monkeypatch.setattr(index, '_build', lambda conn: built.wait(5) and build(conn))
+    assert ranked(me)[0] == [('Other', 40)]
+
+    reloader = index._reloader
+    built.set()
+    reloader.join()
+    assert ranked(me)[0] == []
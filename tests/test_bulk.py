@@ -0,0 +1,84 @@
+import pytest
+
+from conftest import skill_swap
+
+@pytest.fixture
+def people(make_user):
+    alice = make_user('Alice', skills_offered=['Go'], skills_wanted=['Python'])
+    bob = make_user('Bob', skills_offered=['Python'], skills_wanted=['Go'])
+    carol = make_user('Carol')
+    request_id = alice.post('/api/swap-requests', json={
+        'to_user_id': bob.user_id, 'my_skill': 'Go', 'wanted_skill': 'Python'
+    }).get_json()['request_id']
+    return alice, bob, carol, request_id
+
+def bulk(admin, *operations, **args):
+    return admin.post('/api/admin/bulk', query_string=args,
+                      json={'operations': [{'op': op, 'ids': ids} for op, ids in operations]})
+
+def browse(client):
+    return {user['name'] for user in client.get('/api/users').get_json()}
+
+def statuses(result):
+    return {item['id']: item['status'] for item in result['results']}
+
+def test_hide_and_show_users(people, admin):
+    alice, bob, carol, _ = people
+    response = bulk(admin, ('hide_users', [alice.user_id, bob.user_id, admin.user_id, 999]))
+    assert response.status_code == 200
+    [result] = response.get_json()['operations']
+    assert statuses(result) == {alice.user_id: 'hidden', bob.user_id: 'hidden', admin.user_id: 'skipped', 999: 'not_found'}
+    assert result['counts'] == {'hidden': 2, 'skipped': 1, 'not_found': 1}
+    assert {'Alice', 'Bob'}.isdisjoint(browse(carol))
+    assert alice.get('/api/matches').get_json() == []
+
+    bulk(admin, ('show_users', [alice.user_id]))
+    assert 'Alice' in browse(carol)
+
+def test_operations_run_in_order(people, admin, conn):
+    alice, bob, carol, request_id = people
+    response = bulk(admin, ('delete_swap_requests', [request_id, 999]), ('delete_users', [alice.user_id, carol.user_id]))
+    deleted_requests, deleted_users = response.get_json()['operations']
+
+    assert statuses(deleted_requests) == {request_id: 'deleted', 999: 'not_found'}
+    assert deleted_users['counts'] == {'deleted': 2}
+    assert conn.execute('SELECT COUNT(*) FROM users WHERE is_admin = 0').fetchone()[0] == 1
+    assert conn.execute('SELECT COUNT(*) FROM user_skills WHERE user_id = ?', (alice.user_id,)).fetchone()[0] == 0
+
+@pytest.mark.parametrize('op', ['delete_users', 'delete_swap_requests'])
+def test_deleted_requests_reach_the_other_party(people, admin, op):
+    alice, bob, carol, request_id = people
+    events = skill_swap.swap_events.subscribe(bob.user_id)
+    try:
+        bulk(admin, (op, [alice.user_id] if op == 'delete_users' else [request_id]))
+        assert events.get_nowait() == {'type': 'deleted', 'request_id': request_id}
+        assert events.empty()
+    finally:
+        skill_swap.swap_events.unsubscribe(bob.user_id, events)
+
+def test_chunks_commit_as_they_go(people, admin, monkeypatch):
+    alice, bob, carol, _ = people
+    monkeypatch.setattr(skill_swap, 'BULK_CHUNK_SIZE', 1)
+    [result] = bulk(admin, ('hide_users', [alice.user_id, bob.user_id, carol.user_id])).get_json()['operations']
+    assert result['counts'] == {'hidden': 3}
+
+def test_async_runs_as_a_job(people, admin, run_jobs):
+    alice, bob, carol, _ = people
+    response = bulk(admin, ('hide_users', [alice.user_id]), **{'async': '1'})
+    assert response.status_code == 202
+
+    run_jobs()
+    job = admin.get(f"/api/admin/jobs/{response.get_json()['job_id']}").get_json()
+    assert job['status'] == 'done'
+    assert job['result']['operations'][0]['counts'] == {'hidden': 1}
+
+@pytest.mark.parametrize('body', [
+    {}, {'operations': []}, {'operations': [{'op': 'drop_tables', 'ids': [1]}]},
+    {'operations': [{'op': 'hide_users', 'ids': ['1']}]}, {'operations': [{'op': 'hide_users', 'ids': [0]}]},
+])
+def test_invalid_bodies(admin, body):
+    assert admin.post('/api/admin/bulk', json=body).status_code == 400
+
+def test_admins_only(people):
+    alice = people[0]
+    assert bulk(alice, ('hide_users', [alice.user_id])).status_code == 403
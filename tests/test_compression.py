@@ -0,0 +1,70 @@
+import gzip
+
+import brotli
+import pytest
+
+from conftest import skill_swap
+
+@pytest.fixture
+def viewer(make_user):
+    for number in range(15):
+        make_user(f'User{number}', skills_offered=['Python', 'Go'], location='Berlin')
+    return make_user('Viewer')
+
+DECODERS = {'br': brotli.decompress, 'gzip': gzip.decompress}
+
+@pytest.mark.parametrize('encoding', ['br', 'gzip'])
+def test_large_responses_are_compressed(viewer, encoding):
+    plain = viewer.get('/api/users', headers={'Accept-Encoding': 'identity'})
+    response = viewer.get('/api/users', headers={'Accept-Encoding': encoding})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert response.headers['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert DECODERS[encoding](response.get_data()) == plain.get_data()
+
+def test_small_responses_are_not_compressed(make_user):
+    alice = make_user('Alice')
+    response = alice.get('/api/profile', headers={'Accept-Encoding': 'br'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_each_encoding_has_its_own_etag(viewer):
+    etags = {
+        encoding: viewer.get('/api/users', headers={'Accept-Encoding': encoding}).headers['ETag']
+        for encoding in ('identity', 'br', 'gzip')
+    }
+    base = etags['identity'].strip('"')
+    assert etags == {'identity': f'"{base}"', 'br': f'"{base}-br"', 'gzip': f'"{base}-gz"'}
+
+def test_if_none_match_ignores_the_encoding_suffix(viewer):
+    etag = viewer.get('/api/users', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    response = viewer.get('/api/users', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+    # A change to the listing makes every encoding's tag stale
+    viewer.put('/api/profile', json={'name': 'Renamed'})
+    assert viewer.get('/api/users', headers={'If-None-Match': etag}).status_code == 200
+
+def test_fields_projection(viewer):
+    users = viewer.get('/api/users?fields=id,name').get_json()
+    assert all(set(user) == {'id', 'name'} for user in users)
+    assert viewer.get('/api/users?fields=id,password_hash').status_code == 400
+
+def test_async_mode_matches_encoding_and_etags(viewer, async_client):
+    client = async_client(viewer)
+    synced = viewer.get('/api/users', headers={'Accept-Encoding': 'br'})
+    response = client.get('/api/users', headers={'Accept-Encoding': 'br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.headers['ETag'] == synced.headers['ETag']
+    assert response.content == brotli.decompress(synced.get_data())
+
+    revalidated = client.get('/api/users', headers={'Accept-Encoding': 'br', 'If-None-Match': synced.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == synced.headers['ETag']
+
+def test_encoded_etag_round_trips():
+    assert skill_swap.decoded_etag(skill_swap.encoded_etag('abc', 'br')) == 'abc'
+    assert skill_swap.encoded_etag('abc', None) == 'abc'
@@ -0,0 +1,55 @@
+from conftest import skill_swap
+
+IDENTITY = {'Accept-Encoding': 'identity'}
+
+def revalidate(client, path, **headers):
+    return client.get(path, headers=dict(IDENTITY, **headers))
+
+def test_profile_revalidates_until_changed(make_user):
+    alice = make_user('Alice')
+    first = revalidate(alice, '/api/profile')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Last-Modified' in first.headers
+
+    cached = revalidate(alice, '/api/profile', **{'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+    assert cached.get_data() == b''
+    assert cached.headers['ETag'] == first.headers['ETag']
+
+    assert alice.put('/api/profile', json={'name': 'Alice B'}).status_code == 200
+    changed = revalidate(alice, '/api/profile', **{'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != first.headers['ETag']
+    assert changed.get_json()['name'] == 'Alice B'
+
+def test_listing_etag_follows_other_users(make_user):
+    alice = make_user('Alice')
+    etag = revalidate(alice, '/api/users').headers['ETag']
+    assert revalidate(alice, '/api/users', **{'If-None-Match': etag}).status_code == 304
+
+    make_user('Bob')
+    assert revalidate(alice, '/api/users', **{'If-None-Match': etag}).status_code == 200
+
+def test_etag_varies_by_caller_and_query(make_user):
+    alice, bob = make_user('Alice'), make_user('Bob')
+    etag = revalidate(alice, '/api/users').headers['ETag']
+
+    assert revalidate(bob, '/api/users', **{'If-None-Match': etag}).status_code == 200
+    assert revalidate(alice, '/api/users?skill=Go', **{'If-None-Match': etag}).status_code == 200
+
+def test_if_modified_since(make_user):
+    alice = make_user('Alice')
+    last_modified = revalidate(alice, '/api/profile').headers['Last-Modified']
+
+    assert revalidate(alice, '/api/profile', **{'If-Modified-Since': last_modified}).status_code == 304
+    assert revalidate(alice, '/api/profile', **{
+        'If-Modified-Since': 'Mon, 01 Jan 2001 00:00:00 GMT'
+    }).status_code == 200
+
+def test_star_matches_any_version(make_user):
+    alice = make_user('Alice')
+    assert revalidate(alice, '/api/profile', **{'If-None-Match': '*'}).status_code == 304
+
+def test_make_etag_is_stable():
+    assert skill_swap.make_etag('users', 3, 1, 'a=b') == skill_swap.make_etag('users', 3, 1, 'a=b')
+    assert skill_swap.make_etag('users', 3, 1) != skill_swap.make_etag('users', 4, 1)
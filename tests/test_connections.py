@@ -0,0 +1,37 @@
+from conftest import skill_swap
+
+def test_connections_are_configured(conn):
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == skill_swap.DB_BUSY_TIMEOUT_MS
+
+def test_requests_reuse_pooled_connections(make_user, monkeypatch):
+    viewer = make_user('Viewer')
+    opened = []
+    connect_db = skill_swap.connect_db
+    monkeypatch.setattr(skill_swap, 'connect_db', lambda: opened.append(1) or connect_db())
+
+    for _ in range(5):
+        assert viewer.get('/api/users').status_code == 200
+    assert opened == []
+
+def test_release_rolls_back_open_transactions(db):
+    pool = skill_swap.ConnectionPool(1)
+    conn = pool.acquire()
+    conn.execute("INSERT INTO skills (name) VALUES ('Unfinished')")
+    pool.release(conn)
+
+    conn = pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM skills WHERE name = 'Unfinished'").fetchone()[0] == 0
+    pool.close_all()
+
+def test_pool_keeps_at_most_max_idle(db):
+    pool = skill_swap.ConnectionPool(1)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+
+    assert pool._idle == [first]
+    assert pool.acquire() is first
+    pool.close_all()
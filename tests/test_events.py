@@ -0,0 +1,73 @@
+import json
+import threading
+
+import pytest
+
+from conftest import skill_swap
+
+def test_broker_fans_out_to_both_users():
+    broker = skill_swap.SwapEventBroker(10)
+    alice, bob, carol = broker.subscribe(1), broker.subscribe(2), broker.subscribe(3)
+
+    broker.publish([1, 2, 1], {'type': 'created'})
+    assert alice.get_nowait() == bob.get_nowait() == {'type': 'created'}
+    assert alice.empty() and carol.empty()
+
+    broker.unsubscribe(1, alice)
+    broker.publish([1], {'type': 'updated'})
+    assert alice.empty()
+
+def test_slow_subscriber_gets_resync():
+    broker = skill_swap.SwapEventBroker(2)
+    events = broker.subscribe(1)
+    for number in range(3):
+        broker.publish([1], {'type': 'updated', 'number': number})
+
+    assert events.get_nowait() == {'type': 'resync'}
+    assert events.empty()
+
+def read_event(chunks):
+    """Next non-keepalive SSE message from a streamed response"""
+    for chunk in chunks:
+        text = chunk.decode()
+        if text.startswith('event:'):
+            name, data = text.strip().split('\n')
+            return name[len('event: '):], json.loads(data[len('data: '):])
+
+@pytest.fixture
+def pair(make_user):
+    return make_user('Alice'), make_user('Bob')
+
+def test_stream_delivers_swap_request_changes(pair):
+    alice, bob = pair
+    response = bob.get('/api/swap-requests/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.response
+    assert next(chunks).decode() == f'retry: {skill_swap.SSE_RETRY_MS}\n\n'
+
+    request_id = alice.post('/api/swap-requests', json={
+        'to_user_id': bob.user_id, 'my_skill': 'Go', 'wanted_skill': 'Python'
+    }).get_json()['request_id']
+    event_type, event = read_event(chunks)
+    assert event_type == 'created'
+    assert event['request']['id'] == request_id
+
+    assert alice.delete(f'/api/swap-requests/{request_id}').status_code == 200
+    assert read_event(chunks) == ('deleted', {'type': 'deleted', 'request_id': request_id})
+    response.close()
+
+def test_sync_streams_are_capped(pair, monkeypatch):
+    alice, bob = pair
+    monkeypatch.setattr(skill_swap, 'sync_stream_slots', threading.BoundedSemaphore(1))
+
+    first = alice.get('/api/swap-requests/stream', buffered=False)
+    refused = bob.get('/api/swap-requests/stream')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == str(skill_swap.SSE_RETRY_MS // 1000)
+
+    # Closing the response frees the slot and the subscription
+    first.close()
+    assert not skill_swap.swap_events._subscribers.get(alice.user_id)
+    second = bob.get('/api/swap-requests/stream', buffered=False)
+    assert second.status_code == 200
+    second.close()
@@ -0,0 +1,143 @@
+import logging
+
+import pytest
+
+from conftest import skill_swap
+
+@pytest.fixture
+def pair(make_user):
+    """A sender and a recipient; returns (sender, recipient, request body)"""
+    sender = make_user('Sender', skills_offered=['Go'], skills_wanted=['Python'])
+    recipient = make_user('Recipient', skills_offered=['Python'], skills_wanted=['Go'])
+    return sender, recipient, {'to_user_id': recipient.user_id, 'my_skill': 'Go', 'wanted_skill': 'Python'}
+
+def pending_count(conn):
+    return conn.execute("SELECT COUNT(*) FROM swap_requests WHERE status = 'pending'").fetchone()[0]
+
+def test_repeated_key_replays_response(pair, conn):
+    sender, recipient, body = pair
+    headers = {'Idempotency-Key': 'abc'}
+
+    first = sender.post('/api/swap-requests', json=body, headers=headers)
+    second = sender.post('/api/swap-requests', json=body, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert second.get_json() == first.get_json()
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert pending_count(conn) == 1
+
+def test_key_reused_for_other_request_is_refused(pair):
+    sender, recipient, body = pair
+    headers = {'Idempotency-Key': 'abc'}
+
+    assert sender.post('/api/swap-requests', json=body, headers=headers).status_code == 201
+    response = sender.post('/api/swap-requests', json=dict(body, my_skill='Rust'), headers=headers)
+    assert response.status_code == 422
+
+def test_keys_are_per_user(pair, make_user):
+    sender, recipient, body = pair
+    other = make_user('Other')
+    headers = {'Idempotency-Key': 'abc'}
+
+    assert sender.post('/api/swap-requests', json=body, headers=headers).status_code == 201
+    response = other.post('/api/swap-requests', json=body, headers=headers)
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+
+def claim(conn, user_id, key, age):
+    """An unfinished claim made `age` seconds ago, as a crashed worker leaves it"""
+    conn.execute('''
+        INSERT INTO idempotency_keys (user_id, key, fingerprint, created_at)
+        VALUES (?, ?, 'other', datetime('now', ?))
+    ''', (user_id, key, f'-{age} seconds'))
+    conn.commit()
+
+def test_claim_in_progress_conflicts(pair, conn):
+    sender, recipient, body = pair
+    assert sender.post('/api/swap-requests', json=body, headers={'Idempotency-Key': 'abc'}).status_code == 201
+    # Back to a fresh claim still being worked on
+    conn.execute('UPDATE idempotency_keys SET status = NULL, response = NULL')
+    conn.commit()
+
+    response = sender.post('/api/swap-requests', json=body, headers={'Idempotency-Key': 'abc'})
+    assert response.status_code == 409
+
+def test_abandoned_claim_is_taken_over(pair, conn):
+    sender, recipient, body = pair
+    claim(conn, sender.user_id, 'abc', skill_swap.IDEMPOTENCY_CLAIM_LEASE + 5)
+
+    response = sender.post('/api/swap-requests', json=body, headers={'Idempotency-Key': 'abc'})
+    assert response.status_code == 201
+    assert pending_count(conn) == 1
+    stored = conn.execute('SELECT status FROM idempotency_keys WHERE key = ?', ('abc',)).fetchone()
+    assert stored['status'] == 201
+
+def test_late_finish_keeps_stored_outcome(pair, conn):
+    sender, recipient, body = pair
+    assert sender.post('/api/swap-requests', json=body, headers={'Idempotency-Key': 'abc'}).status_code == 201
+
+    # A late finish from the original owner doesn't overwrite the stored response
+    conn.execute(skill_swap.FINISH_IDEMPOTENCY_KEY_QUERY, (500, b'late', sender.user_id, 'abc'))
+    conn.execute(skill_swap.RELEASE_IDEMPOTENCY_KEY_QUERY, (sender.user_id, 'abc'))
+    conn.commit()
+    stored = conn.execute('SELECT status FROM idempotency_keys WHERE key = ?', ('abc',)).fetchone()
+    assert stored['status'] == 201
+
+class PruningConnection:
+    """Deletes every idempotency key just before the stored one is read back"""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, *args):
+        if 'SELECT fingerprint' in sql:
+            self.conn.execute('DELETE FROM idempotency_keys')
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+def test_key_pruned_after_failed_claim_is_claimed_again(pair, conn, monkeypatch):
+    sender, recipient, body = pair
+    claim(conn, sender.user_id, 'abc', 0)
+    get_db = skill_swap.get_db
+    monkeypatch.setattr(skill_swap, 'get_db', lambda: PruningConnection(get_db()))
+
+    response = sender.post('/api/swap-requests', json=body, headers={'Idempotency-Key': 'abc'})
+    assert response.status_code == 201
+    assert pending_count(conn) == 1
+
+def test_invalid_key_is_rejected(pair):
+    sender, recipient, body = pair
+    response = sender.post('/api/swap-requests', json=body, headers={'Idempotency-Key': 'x' * 256})
+    assert response.status_code == 400
+
+def test_decorator_keeps_view_metadata():
+    view = skill_swap.app.view_functions['create_swap_requests_batch']
+    assert view.__name__ == 'create_swap_requests_batch'
+    assert view.__doc__ == skill_swap.create_swap_requests_batch.__doc__
+
+def test_batch_replays(pair, conn):
+    sender, recipient, body = pair
+    batch = {'requests': [body, dict(body, to_user_id=999)]}
+    headers = {'Idempotency-Key': 'batch'}
+
+    first = sender.post('/api/swap-requests/batch', json=batch, headers=headers)
+    assert first.get_json()['counts'] == {'created': 1, 'not_found': 1}
+    second = sender.post('/api/swap-requests/batch', json=batch, headers=headers)
+    assert second.get_json() == first.get_json()
+    assert pending_count(conn) == 1
+
+def test_unique_pending_migration_reports_duplicates(pair, conn, caplog):
+    sender, recipient, body = pair
+    conn.execute('DROP INDEX idx_swap_requests_pending')
+    for _ in range(3):
+        conn.execute('''
+            INSERT INTO swap_requests (from_user_id, to_user_id, my_skill, wanted_skill)
+            VALUES (?, ?, 'Go', 'Python')
+        ''', (sender.user_id, recipient.user_id))
+    conn.commit()
+
+    with caplog.at_level(logging.WARNING, logger=skill_swap.app.logger.name):
+        skill_swap.migration_unique_pending_requests(conn)
+    conn.commit()
+    assert pending_count(conn) == 1
+    assert 'Deleted 2 duplicate pending swap requests' in caplog.text
@@ -0,0 +1,80 @@
+import json
+
+from conftest import PASSWORD, skill_swap
+
+CSV = '''name,email,password,skills_offered,skills_wanted,availability,is_public
+Ann,ann@example.com,{password},"Python, Go",SQL,weekdays,1
+Ben,ben@example.com,{password},Go,,evenings,0
+NoMail,,{password},,,,
+Admin,admin@skillswap.com,{password},,,,
+New,new@example.com,,,,,
+'''.format(password=PASSWORD)
+
+def import_csv(admin, body, **args):
+    response = admin.post('/api/admin/users/import', data=body.encode(), content_type='text/csv',
+                          query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_import_creates_users_and_reports_errors(admin, client, conn):
+    summary = import_csv(admin, CSV)
+    assert (summary['created'], summary['updated'], summary['failed']) == (2, 0, 3)
+    assert [error['line'] for error in summary['errors']] == [4, 5, 6]
+    assert 'admin accounts' in summary['errors'][1]['error']
+
+    assert client.post('/api/login', json={'email': 'ann@example.com', 'password': PASSWORD}).status_code == 200
+    profile = client.get('/api/profile').get_json()
+    assert (profile['skills_offered'], profile['skills_wanted']) == (['Python', 'Go'], ['SQL'])
+    assert skill_swap.get_user_skills(conn, [profile['id']])[profile['id']]['offered'] == ['Python', 'Go']
+
+def test_reimport_updates_in_place(admin, conn):
+    import_csv(admin, CSV)
+    summary = import_csv(admin, 'name,email,location\nAnn Lee,ann@example.com,Berlin\n')
+    assert (summary['created'], summary['updated'], summary['failed']) == (0, 1, 0)
+
+    row = conn.execute("SELECT name, location FROM users WHERE email = 'ann@example.com'").fetchone()
+    assert tuple(row) == ('Ann Lee', 'Berlin')
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE email = 'ann@example.com'").fetchone()[0] == 1
+
+def test_batches_commit_as_they_go(admin, conn, monkeypatch):
+    monkeypatch.setattr(skill_swap, 'IMPORT_BATCH_SIZE', 2)
+    rows = ''.join(f'User{number},user{number}@example.com,{PASSWORD}\n' for number in range(5))
+    summary = import_csv(admin, 'name,email,password\n' + rows)
+
+    assert summary['created'] == 5
+    assert conn.execute('SELECT COUNT(*) FROM users WHERE is_admin = 0').fetchone()[0] == 5
+
+def test_imported_users_are_browsable(admin, make_user):
+    import_csv(admin, CSV)
+    viewer = make_user('Viewer')
+
+    names = [user['name'] for user in viewer.get('/api/users?skill=Python').get_json()]
+    assert names == ['Ann']
+
+def test_export_round_trips(admin):
+    import_csv(admin, CSV)
+    response = admin.get('/api/admin/users/export?format=jsonl')
+    assert response.headers['Content-Disposition'] == 'attachment; filename=users.jsonl'
+    users = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    ann = next(user for user in users if user['email'] == 'ann@example.com')
+    assert ann['skills_offered'] == ['Python', 'Go']
+    assert ann['availability_slots'] == skill_swap.AVAILABILITY_PRESETS['weekdays']
+    assert 'password_hash' not in ann
+
+    csv_export = admin.get('/api/admin/users/export').get_data(as_text=True)
+    assert csv_export.splitlines()[0] == ','.join(skill_swap.EXPORT_FIELDS)
+
+def test_cli_moves_users_with_their_hashes(admin, tmp_path, client):
+    import_csv(admin, CSV)
+    runner = skill_swap.app.test_cli_runner()
+    target = tmp_path / 'users.jsonl'
+    result = runner.invoke(args=['export-users', str(target), '--with-password-hashes'])
+    assert result.exit_code == 0, result.output
+
+    exported = [json.loads(line) for line in target.read_text().splitlines()]
+    assert all(user['password_hash'] for user in exported)
+    result = runner.invoke(args=['import-users', str(target)])
+    assert result.exit_code == 0, result.output
+    assert '0 created, 2 updated, 0 failed' in result.output
+    assert client.post('/api/login', json={'email': 'ben@example.com', 'password': PASSWORD}).status_code == 200
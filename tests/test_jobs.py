@@ -0,0 +1,171 @@
+import pytest
+
+from conftest import skill_swap, counter
+
+@pytest.fixture
+def handler(monkeypatch):
+    """Register a job kind for the test; returns a decorator taking the handler"""
+    def register(func):
+        monkeypatch.setitem(skill_swap.JOB_HANDLERS, 'test', func)
+        return func
+    return register
+
+def job_row(conn, job_id):
+    return conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+def make_due(conn, job_id):
+    conn.execute("UPDATE jobs SET run_after = datetime('now') WHERE id = ?", (job_id,))
+    conn.commit()
+
+def test_job_runs_and_stores_result(conn, handler, run_jobs):
+    seen = []
+
+    @handler
+    def record(conn, payload, lease):
+        seen.append(payload)
+        return {'ok': True}
+
+    job_id = skill_swap.enqueue_job(conn, 'test', {'n': 1})
+    assert job_row(conn, job_id)['status'] == 'queued'
+
+    run_jobs()
+    job = job_row(conn, job_id)
+    assert seen == [{'n': 1}]
+    assert (job['status'], job['attempts'], job['result']) == ('done', 1, '{"ok":true}')
+    assert counter('skillswap_jobs_total', kind='test', outcome='done') == 1
+
+def test_higher_priority_runs_first(conn, handler, run_jobs):
+    order = []
+    handler(lambda conn, payload, lease: order.append(payload['name']))
+
+    skill_swap.enqueue_job(conn, 'test', {'name': 'low'}, skill_swap.JOB_PRIORITY_LOW)
+    skill_swap.enqueue_job(conn, 'test', {'name': 'normal'})
+    skill_swap.enqueue_job(conn, 'test', {'name': 'high'}, skill_swap.JOB_PRIORITY_HIGH)
+    run_jobs()
+    assert order == ['high', 'normal', 'low']
+
+def test_failures_retry_with_backoff_then_fail(conn, handler, run_jobs):
+    @handler
+    def broken(conn, payload, lease):
+        conn.execute("INSERT INTO skills (name) VALUES ('Rolled back')")
+        raise RuntimeError('boom')
+
+    job_id = skill_swap.enqueue_job(conn, 'test', {}, max_attempts=2)
+    run_jobs()
+    job = job_row(conn, job_id)
+    assert (job['status'], job['attempts'], job['error']) == ('queued', 1, 'RuntimeError: boom')
+    delay = conn.execute("SELECT CAST(round((julianday(?) - julianday('now')) * 86400) AS INTEGER)",
+                         (job['run_after'],)).fetchone()[0]
+    assert delay == pytest.approx(skill_swap.JOB_RETRY_DELAY_SECONDS, abs=2)
+    assert conn.execute("SELECT 1 FROM skills WHERE name = 'Rolled back'").fetchone() is None
+
+    # Not due yet, so another pass leaves it alone
+    run_jobs()
+    assert job_row(conn, job_id)['attempts'] == 1
+
+    make_due(conn, job_id)
+    run_jobs()
+    job = job_row(conn, job_id)
+    assert (job['status'], job['attempts']) == ('failed', 2)
+    assert job['finished_at'] is not None
+    assert counter('skillswap_jobs_total', kind='test', outcome='retried') == 1
+    assert counter('skillswap_jobs_total', kind='test', outcome='failed') == 1
+
+def test_lost_lease_discards_the_work(conn, handler):
+    @handler
+    def reclaimed(job_conn, payload, lease):
+        # Another worker took the job over after this one's lease ran out
+        conn.execute('UPDATE jobs SET attempts = attempts + 1 WHERE id = ?', (lease.job_id,))
+        conn.commit()
+        job_conn.execute("INSERT INTO skills (name) VALUES ('Rolled back')")
+
+    job_id = skill_swap.enqueue_job(conn, 'test', {})
+    job_conn = skill_swap.connect_db()
+    try:
+        assert skill_swap.JobQueue(1).run_next(job_conn)
+    finally:
+        job_conn.close()
+
+    job = job_row(conn, job_id)
+    assert (job['status'], job['attempts'], job['result']) == ('running', 2, None)
+    assert conn.execute("SELECT 1 FROM skills WHERE name = 'Rolled back'").fetchone() is None
+    assert counter('skillswap_jobs_total', kind='test', outcome='lost') == 1
+
+def test_expired_leases_are_requeued(conn, handler):
+    handler(lambda conn, payload, lease: None)
+    job_id = skill_swap.enqueue_job(conn, 'test', {})
+    conn.execute('''
+        UPDATE jobs SET status = 'running', attempts = 1, locked_until = datetime('now', '-1 minute')
+        WHERE id = ?
+    ''', (job_id,))
+    conn.commit()
+
+    skill_swap.expire_job_leases(conn)
+    job = job_row(conn, job_id)
+    assert (job['status'], job['locked_until']) == ('queued', None)
+    assert job['error'] == 'Lease expired before the job finished'
+
+def test_admin_delete_hides_user_then_deletes(make_user, admin, conn, run_jobs):
+    alice = make_user('Alice', skills_offered=['Go'], skills_wanted=['Python'])
+    bob = make_user('Bob', skills_offered=['Python'], skills_wanted=['Go'])
+    alice.post('/api/swap-requests', json={'to_user_id': bob.user_id, 'my_skill': 'Go', 'wanted_skill': 'Python'})
+
+    response = admin.delete(f'/api/admin/users/{alice.user_id}')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    assert 'Alice' not in {user['name'] for user in bob.get('/api/users').get_json()}
+    assert bob.get('/api/matches').get_json() == []
+    assert conn.execute('SELECT 1 FROM users WHERE id = ?', (alice.user_id,)).fetchone() is not None
+
+    run_jobs()
+    assert conn.execute('SELECT 1 FROM users WHERE id = ?', (alice.user_id,)).fetchone() is None
+    assert conn.execute('SELECT COUNT(*) FROM swap_requests').fetchone()[0] == 0
+    job = admin.get(f'/api/admin/jobs/{job_id}').get_json()
+    assert job['status'] == 'done'
+    assert job['payload'] == {'user_id': alice.user_id}
+    assert job['result'] == {'deleted_swap_requests': 1}
+
+    assert admin.delete('/api/admin/users/999').status_code == 404
+
+def test_admin_queues_and_lists_jobs(admin, run_jobs):
+    assert admin.post('/api/admin/jobs', json={'kind': 'delete_user'}).status_code == 400
+    response = admin.post('/api/admin/jobs', json={'kind': 'rebuild_stats'})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    [queued] = admin.get('/api/admin/jobs?status=queued').get_json()
+    assert (queued['id'], queued['kind'], queued['priority']) == (job_id, 'rebuild_stats', skill_swap.JOB_PRIORITY_LOW)
+
+    run_jobs()
+    assert admin.get('/api/admin/jobs?status=queued').get_json() == []
+    assert [job['id'] for job in admin.get('/api/admin/jobs?status=done').get_json()] == [job_id]
+    assert admin.get('/api/admin/jobs?status=bogus').status_code == 400
+    assert admin.get('/api/admin/jobs/999').status_code == 404
+
+def test_admin_retries_failed_job(admin, conn, handler, run_jobs):
+    calls = []
+
+    @handler
+    def flaky(conn, payload, lease):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+
+    job_id = skill_swap.enqueue_job(conn, 'test', {}, max_attempts=1)
+    assert admin.post(f'/api/admin/jobs/{job_id}/retry').status_code == 409
+    run_jobs()
+    assert job_row(conn, job_id)['status'] == 'failed'
+
+    response = admin.post(f'/api/admin/jobs/{job_id}/retry')
+    assert response.status_code == 202
+    job = job_row(conn, job_id)
+    assert (job['status'], job['attempts'], job['finished_at']) == ('queued', 0, None)
+
+    run_jobs()
+    assert job_row(conn, job_id)['status'] == 'done'
+    assert admin.post('/api/admin/jobs/999/retry').status_code == 404
+
+def test_jobs_require_admin(make_user):
+    alice = make_user('Alice')
+    assert alice.get('/api/admin/jobs').status_code == 403
+    assert alice.post('/api/admin/jobs', json={'kind': 'rebuild_stats'}).status_code == 403
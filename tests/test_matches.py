@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from conftest import skill_swap
+
+@pytest.fixture
+def me(make_user):
+    return make_user('Me', skills_offered=['Go'], skills_wanted=['Python'], availability='weekdays')
+
+def teacher(make_user, name, **fields):
+    return make_user(name, skills_offered=['Python'], skills_wanted=['Go'], **fields)
+
+def scores(client):
+    response = client.get('/api/matches')
+    assert response.status_code == 200
+    return {match['name']: match['score'] for match in response.get_json()}
+
+def test_only_reciprocal_public_matches(me, make_user):
+    teacher(make_user, 'Mutual')
+    make_user('OneWay', skills_offered=['Python'], skills_wanted=['Rust'])
+    teacher(make_user, 'Hidden', is_public=False)
+
+    assert set(scores(me)) == {'Mutual'}
+
+def test_availability_bonus_follows_shared_hours(me, make_user):
+    # Different presets: flexible covers every weekday hour, weekends none
+    teacher(make_user, 'Flexible', availability='flexible')
+    teacher(make_user, 'Weekends', availability='weekends')
+    # Half of my 40 weekday hours: Monday to Friday 9-13
+    teacher(make_user, 'Mornings', availability_slots=skill_swap.weekly_slots(range(5), 9, 13))
+
+    bonus = skill_swap.MATCH_AVAILABILITY_BONUS
+    assert scores(me) == {'Flexible': 2 + bonus, 'Mornings': 2 + bonus / 2, 'Weekends': 2}
+
+def test_stale_index_reloads_in_background(me, make_user, conn, monkeypatch):
+    mutual = teacher(make_user, 'Mutual')
+    assert set(scores(me)) == {'Mutual'}
+
+    # Another process hides the user; this one only sees it after a reload
+    conn.execute('UPDATE users SET is_public = 0 WHERE id = ?', (mutual.user_id,))
+    conn.commit()
+    index = skill_swap.match_index
+    index._loaded_at -= skill_swap.MATCH_INDEX_MAX_AGE
+    # Hold the rebuild until the stale copy has answered
+    built = threading.Event()
+    build = index._build
+    monkeypatch.setattr(index, '_build', lambda conn: built.wait(5) and build(conn))
+    assert set(scores(me)) == {'Mutual'}
+
+    reloader = index._reloader
+    built.set()
+    reloader.join()
+    assert scores(me) == {}
+
+def test_writes_during_a_load_are_replayed(me, make_user, conn, monkeypatch):
+    mutual = teacher(make_user, 'Mutual')
+    index = skill_swap.match_index
+    build = index._build
+
+    def build_then_write(conn):
+        built = build(conn)
+        index.set_public(mutual.user_id, False)
+        return built
+
+    monkeypatch.setattr(index, '_build', build_then_write)
+    index.load(conn)
+    assert scores(me) == {}
+
+def test_invalidate_during_a_load_wins(me, conn, monkeypatch):
+    index = skill_swap.match_index
+    build = index._build
+
+    def build_then_invalidate(conn):
+        built = build(conn)
+        index.invalidate()
+        return built
+
+    monkeypatch.setattr(index, '_build', build_then_invalidate)
+    index.load(conn)
+    assert index._loaded_at is None
@@ -0,0 +1,33 @@
+import pytest
+
+from conftest import counter, skill_swap
+
+def test_metrics_need_admin(client, make_user, admin):
+    assert client.get('/metrics').status_code == 401
+    assert make_user('Someone').get('/metrics').status_code == 403
+
+    response = admin.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+
+def test_metrics_token(client, monkeypatch):
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape'}).status_code == 401
+    monkeypatch.setattr(skill_swap, 'METRICS_TOKEN', 'scrape')
+
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape'}).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+def test_requests_and_sql_are_recorded(make_user, admin):
+    viewer = make_user('Viewer')
+    assert viewer.get('/api/users').status_code == 200
+
+    assert counter('skillswap_sql_statements_total', route='/api/users') > 0
+    text = admin.get('/metrics').get_data(as_text=True)
+    assert 'skillswap_http_request_duration_seconds_count{route="/api/users",method="GET",status="200"} 1' in text
+
+@pytest.mark.parametrize('path', ['/api/users', '/api/swap-requests'])
+def test_server_timing_header(make_user, monkeypatch, path):
+    monkeypatch.setattr(skill_swap, 'SERVER_TIMING', True)
+    viewer = make_user('Viewer')
+
+    assert 'db;dur=' in viewer.get(path).headers['Server-Timing']
@@ -0,0 +1,35 @@
+import sqlite3
+
+import pytest
+
+from conftest import skill_swap
+
+def test_fresh_database_is_at_latest_version(conn):
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(skill_swap.MIGRATIONS)
+
+def test_migrating_again_changes_nothing(conn):
+    schema = conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name').fetchall()
+
+    skill_swap.migrate_db(conn)
+    assert conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name').fetchall() == schema
+
+def test_failed_migration_rolls_back(tmp_path, monkeypatch):
+    def broken(conn):
+        conn.execute('CREATE TABLE half_done (id INTEGER)')
+        raise sqlite3.OperationalError('boom')
+
+    monkeypatch.setattr(skill_swap, 'MIGRATIONS', skill_swap.MIGRATIONS[:2] + [broken])
+    conn = sqlite3.connect(tmp_path / 'broken.db', isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            skill_swap.migrate_db(conn)
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == 2
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone()
+    finally:
+        conn.close()
+
+def test_hot_queries_avoid_full_scans(db):
+    result = skill_swap.app.test_cli_runner().invoke(args=['explain-queries'])
+    assert result.exit_code == 0, result.output
+    assert 'No full table scans' in result.output
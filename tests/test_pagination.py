@@ -0,0 +1,73 @@
+import json
+
+from conftest import skill_swap
+
+def walk(client, path, limit):
+    """Every item of a listing, following X-Next-Cursor; returns (items, pages)"""
+    items, pages, cursor = [], 0, None
+    while True:
+        args = {'limit': limit}
+        if cursor:
+            args['cursor'] = cursor
+        response = client.get(path, query_string=args)
+        assert response.status_code == 200, response.get_json()
+        items.extend(response.get_json())
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            assert 'Link' not in response.headers
+            return items, pages
+        assert f'cursor={cursor}' in response.headers['Link']
+
+def test_cursor_walks_every_admin_user_once(make_user, admin):
+    for number in range(7):
+        make_user(f'User{number}')
+
+    items, pages = walk(admin, '/api/admin/users', 3)
+    # Newest first
+    assert pages == 3
+    assert [item['name'] for item in items] == [f'User{number}' for number in reversed(range(7))]
+
+def test_default_page_size(make_user, admin, monkeypatch):
+    monkeypatch.setattr(skill_swap, 'DEFAULT_PAGE_SIZE', 2)
+    for number in range(3):
+        make_user(f'User{number}')
+
+    response = admin.get('/api/admin/users')
+    assert len(response.get_json()) == 2
+    assert 'X-Next-Cursor' in response.headers
+
+def test_swap_requests_page(make_user):
+    me = make_user('Me')
+    for number in range(5):
+        other = make_user(f'Other{number}')
+        assert me.post('/api/swap-requests', json={
+            'to_user_id': other.user_id, 'my_skill': 'Go', 'wanted_skill': 'Python'
+        }).status_code == 201
+
+    items, pages = walk(me, '/api/swap-requests', 2)
+    assert pages == 3
+    assert len({item['id'] for item in items}) == 5
+
+def test_stream_returns_everything_after_the_cursor(make_user, admin):
+    for number in range(4):
+        make_user(f'User{number}')
+    cursor = admin.get('/api/admin/users', query_string={'limit': 2}).headers['X-Next-Cursor']
+
+    response = admin.get('/api/admin/users', query_string={'stream': 'ndjson', 'cursor': cursor})
+    names = [json.loads(line)['name'] for line in response.get_data(as_text=True).splitlines()]
+    assert names == ['User1', 'User0']
+
+def test_bad_page_args(admin):
+    assert admin.get('/api/admin/users?limit=0').status_code == 400
+    assert admin.get('/api/admin/users?limit=x').status_code == 400
+    assert admin.get('/api/admin/users?cursor=nonsense').status_code == 400
+    assert admin.get('/api/admin/users?stream=xml').status_code == 400
+
+def test_paging_headers_exposed_to_the_frontend(make_user, admin):
+    for number in range(2):
+        make_user(f'User{number}')
+
+    response = admin.get('/api/admin/users?limit=1', headers={'Origin': 'http://localhost:3000'})
+    exposed = {header.strip().lower() for header in response.headers['Access-Control-Expose-Headers'].split(',')}
+    assert {'x-next-cursor', 'link', 'etag'} <= exposed
@@ -0,0 +1,47 @@
+import threading
+
+from werkzeug.security import generate_password_hash
+
+from conftest import PASSWORD, skill_swap
+
+def login(client, email, password=PASSWORD):
+    return client.post('/api/login', json={'email': email, 'password': password})
+
+def test_login_checks_the_password(make_user, client):
+    make_user('Alice')
+
+    assert login(client, 'alice@example.com').status_code == 200
+    assert login(client, 'alice@example.com', 'wrong').status_code == 401
+    assert login(client, 'nobody@example.com').status_code == 401
+
+def test_stored_hash_uses_configured_method(make_user, conn):
+    alice = make_user('Alice')
+
+    stored = conn.execute('SELECT password_hash FROM users WHERE id = ?', (alice.user_id,)).fetchone()[0]
+    assert stored.startswith(skill_swap.PASSWORD_HASH_METHOD + '$')
+
+def test_login_upgrades_old_hashes(make_user, client, conn):
+    alice = make_user('Alice')
+    conn.execute('UPDATE users SET password_hash = ? WHERE id = ?',
+                 (generate_password_hash(PASSWORD, 'pbkdf2:sha256:500'), alice.user_id))
+    conn.commit()
+
+    assert login(client, 'alice@example.com').status_code == 200
+    stored = conn.execute('SELECT password_hash FROM users WHERE id = ?', (alice.user_id,)).fetchone()[0]
+    assert not skill_swap.needs_rehash(stored)
+    assert login(client, 'alice@example.com').status_code == 200
+
+def test_saturated_pool_turns_logins_away(make_user, client, monkeypatch):
+    make_user('Alice')
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(skill_swap, '_hash_slots', slots)
+
+    response = login(client, 'alice@example.com')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    response = client.post('/api/register', json={'name': 'Bob', 'email': 'bob@example.com', 'password': PASSWORD})
+    assert response.status_code == 503
+
+    slots.release()
+    assert login(client, 'alice@example.com').status_code == 200
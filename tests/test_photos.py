@@ -0,0 +1,65 @@
+import base64
+import hashlib
+import io
+
+from PIL import Image
+
+from conftest import skill_swap
+
+def image_bytes(fmt='PNG', size=(120, 80), color=(200, 30, 30, 255), mode='RGBA'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+def upload(client, data):
+    return client.post('/api/profile/photo', data=data, content_type='application/octet-stream')
+
+def test_upload_is_stored_once_and_served_forever(make_user, client):
+    alice, bob = make_user('Alice'), make_user('Bob')
+    data = image_bytes()
+    response = upload(alice, data)
+    assert response.status_code == 201
+    url = response.get_json()['profile_photo']
+    assert url == f'/api/photos/{hashlib.sha256(data).hexdigest()}.png'
+    assert upload(bob, data).get_json()['profile_photo'] == url
+    assert alice.get('/api/profile').get_json()['profile_photo'] == url
+
+    served = client.get(url)
+    assert served.get_data() == data
+    assert served.mimetype == 'image/png'
+    assert served.headers['Cache-Control'] == skill_swap.PHOTO_CACHE_CONTROL
+    assert client.get(url, headers={'If-None-Match': served.headers['ETag']}).status_code == 304
+
+def test_thumbnails_are_square_jpegs_on_white(make_user, client):
+    alice = make_user('Alice')
+    # Fully transparent, so the thumbnail shows the background
+    thumbnails = upload(alice, image_bytes(color=(0, 0, 0, 0))).get_json()['thumbnails']
+
+    for size, url in thumbnails.items():
+        response = client.get(url)
+        assert response.status_code == 200
+        with Image.open(io.BytesIO(response.get_data())) as thumbnail:
+            assert (thumbnail.format, thumbnail.size) == ('JPEG', (int(size), int(size)))
+            assert min(thumbnail.getpixel((0, 0))) > 250
+
+def test_data_uri_profile_photo_moves_to_the_store(make_user):
+    data = image_bytes('JPEG', mode='RGB', color=(10, 20, 30))
+    alice = make_user('Alice', profile_photo='data:image/jpeg;base64,' + base64.b64encode(data).decode())
+
+    url = alice.get('/api/profile').get_json()['profile_photo']
+    assert url.startswith('/api/photos/') and url.endswith('.jpg')
+    assert alice.get(url).get_data() == data
+
+def test_rejects_what_is_not_a_usable_image(make_user, monkeypatch):
+    alice = make_user('Alice')
+    assert upload(alice, b'not an image').status_code == 400
+    monkeypatch.setattr(skill_swap, 'PHOTO_MAX_PIXELS', 100)
+    assert upload(alice, image_bytes()).status_code == 400
+
+    response = alice.put('/api/profile', json={'name': 'Alice', 'profile_photo': 'x' * 5000})
+    assert response.status_code == 400
+
+def test_unknown_photos(client):
+    assert client.get(f"/api/photos/{'0' * 64}.png").status_code == 404
+    assert client.get('/api/photos/nothex.png').status_code == 404
+    assert client.get(f"/api/photos/{'0' * 64}/64.jpg").status_code == 404
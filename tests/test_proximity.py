@@ -0,0 +1,40 @@
+import pytest
+
+@pytest.fixture
+def viewer(make_user):
+    make_user('Bea', location='Berlin', skills_offered=['Go'])
+    make_user('Ben', location='berlin, germany', skills_offered=['Python'])
+    make_user('Hanna', location='Hamburg', skills_offered=['Python'])
+    make_user('Max', location='München')
+    make_user('Nowhere', location='Atlantis')
+    return make_user('Viewer', location='Berlin')
+
+def nearby(client, **args):
+    response = client.get('/api/users', query_string=args)
+    assert response.status_code == 200, response.get_json()
+    return {user['name'] for user in response.get_json()}
+
+def test_radius_around_a_place(viewer):
+    assert nearby(viewer, near='Berlin') == {'Bea', 'Ben'}
+    assert nearby(viewer, near='Berlin', radius=300) == {'Bea', 'Ben', 'Hanna'}
+
+def test_coordinates_and_aliases(viewer):
+    assert nearby(viewer, near='52.52,13.405', radius=10) == {'Bea', 'Ben'}
+    assert nearby(viewer, near='Munich') == {'Max'}
+
+def test_combines_with_skill(viewer):
+    assert nearby(viewer, near='Berlin', radius=300, skill='Python') == {'Ben', 'Hanna'}
+
+def test_moving_updates_the_index(viewer, make_user):
+    mover = make_user('Mover', location='Paris')
+    assert 'Mover' not in nearby(viewer, near='Berlin')
+
+    assert mover.put('/api/profile', json={'name': 'Mover', 'location': 'Berlin'}).status_code == 200
+    assert 'Mover' in nearby(viewer, near='Berlin')
+
+@pytest.mark.parametrize('args', [
+    {'near': 'Atlantis'}, {'near': 'Berlin', 'radius': 0}, {'near': 'Berlin', 'radius': 'far'},
+    {'near': '95,10'},
+])
+def test_invalid_near(viewer, args):
+    assert viewer.get('/api/users', query_string=args).status_code == 400
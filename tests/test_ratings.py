@@ -0,0 +1,64 @@
+import pytest
+
+from conftest import skill_swap
+
+@pytest.fixture
+def swap(make_user):
+    """An accepted request from a learner to a teacher; returns (learner, teacher, request id)"""
+    learner = make_user('Learner', skills_offered=['Go'], skills_wanted=['Python'])
+    teacher = make_user('Teacher', skills_offered=['Python'], skills_wanted=['Go'])
+    response = learner.post('/api/swap-requests', json={
+        'to_user_id': teacher.user_id, 'my_skill': 'Go', 'wanted_skill': 'Python'
+    })
+    request_id = response.get_json()['request_id']
+    assert teacher.put(f'/api/swap-requests/{request_id}', json={'status': 'accepted'}).status_code == 200
+    return learner, teacher, request_id
+
+def user_rating(conn, user_id):
+    return tuple(conn.execute('SELECT rating_count, rating_sum FROM user_ratings WHERE user_id = ?',
+                              (user_id,)).fetchone())
+
+def test_sender_rating_credits_recipient(swap, conn):
+    learner, teacher, request_id = swap
+
+    assert learner.put(f'/api/swap-requests/{request_id}', json={'rating': 4}).status_code == 200
+    assert user_rating(conn, teacher.user_id) == (1, 4)
+    assert user_rating(conn, learner.user_id) == (0, 0)
+
+    assert learner.put(f'/api/swap-requests/{request_id}', json={'rating': 2}).status_code == 200
+    assert user_rating(conn, teacher.user_id) == (1, 2)
+
+def test_recipient_cannot_rate_themselves(swap, conn):
+    learner, teacher, request_id = swap
+
+    response = teacher.put(f'/api/swap-requests/{request_id}', json={'rating': 5})
+    assert response.status_code == 403
+    assert user_rating(conn, teacher.user_id) == (0, 0)
+    # Feedback alone is still open to both parties
+    assert teacher.put(f'/api/swap-requests/{request_id}', json={'feedback': 'Fun'}).status_code == 200
+
+def test_rating_must_be_in_range(swap):
+    learner, _, request_id = swap
+    for rating in (0, 6, 4.5, '5'):
+        assert learner.put(f'/api/swap-requests/{request_id}', json={'rating': rating}).status_code == 400
+
+def test_leaderboard_and_rebuild_agree(swap, conn):
+    learner, teacher, request_id = swap
+    learner.put(f'/api/swap-requests/{request_id}', json={'rating': 5})
+
+    board = learner.get('/api/leaderboard').get_json()
+    assert [user['id'] for user in board] == [teacher.user_id]
+    assert board[0]['rating_count'] == 1
+    assert [user['id'] for user in learner.get('/api/leaderboard?skill=python').get_json()] == [teacher.user_id]
+
+    before = conn.execute('SELECT * FROM user_ratings ORDER BY user_id').fetchall()
+    skill_swap.rebuild_ratings(conn)
+    conn.commit()
+    assert conn.execute('SELECT * FROM user_ratings ORDER BY user_id').fetchall() == before
+
+def test_deleting_a_rated_request_removes_its_rating(swap, conn):
+    learner, teacher, request_id = swap
+    learner.put(f'/api/swap-requests/{request_id}', json={'rating': 5})
+
+    assert learner.delete(f'/api/swap-requests/{request_id}').status_code == 200
+    assert user_rating(conn, teacher.user_id) == (0, 0)
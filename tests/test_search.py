@@ -0,0 +1,61 @@
+import pytest
+
+from conftest import skill_swap
+
+@pytest.fixture
+def viewer(make_user):
+    make_user('Marta Quiñones', location='Zürich', skills_offered=['Python', 'Django'])
+    make_user('Paul', location='Berlin', skills_offered=['Go'], skills_wanted=['Python'])
+    make_user('Python Pete', skills_offered=['Python'], is_public=False)
+    return make_user('Viewer', skills_offered=['Python'])
+
+def search(client, q, **args):
+    response = client.get('/api/users/search', query_string=dict(args, q=q))
+    assert response.status_code == 200, response.get_json()
+    return response
+
+def names(response):
+    return [user['name'] for user in response.get_json()]
+
+def test_matches_any_column_public_only(viewer):
+    assert set(names(search(viewer, 'python'))) == {'Marta Quiñones', 'Paul'}
+    assert names(search(viewer, 'berlin')) == ['Paul']
+
+def test_all_terms_must_match_and_last_is_prefix(viewer):
+    assert names(search(viewer, 'python berl')) == ['Paul']
+    assert names(search(viewer, 'djan')) == ['Marta Quiñones']
+
+def test_accents_are_folded(viewer):
+    assert names(search(viewer, 'zurich quinones')) == ['Marta Quiñones']
+
+def test_typos_are_corrected(viewer):
+    assert names(search(viewer, 'djnago')) == ['Marta Quiñones']
+    assert names(search(viewer, 'xyzzy')) == []
+
+def test_highlights_escape_and_mark(viewer, make_user):
+    make_user('<b>Django</b> Fan', skills_offered=['Rust'])
+    [result] = search(viewer, 'django fan').get_json()
+    assert result['highlights']['name'] == '&lt;b&gt;<mark>Django</mark>&lt;/b&gt; <mark>Fan</mark>'
+
+def test_profile_updates_reach_the_index(viewer, make_user):
+    rita = make_user('Rita', skills_offered=['Haskell'])
+    assert names(search(viewer, 'haskell')) == ['Rita']
+
+    assert rita.put('/api/profile', json={'name': 'Rita', 'skills_offered': ['Elixir']}).status_code == 200
+    assert names(search(viewer, 'haskell')) == []
+    assert names(search(viewer, 'elixir')) == ['Rita']
+
+def test_pages_with_offset(viewer):
+    first = search(viewer, 'python', limit=1)
+    assert 'offset=1' in first.headers['Link']
+    second = search(viewer, 'python', limit=1, offset=1)
+    assert 'Link' not in second.headers
+    assert set(names(first) + names(second)) == {'Marta Quiñones', 'Paul'}
+
+def test_q_is_required(viewer):
+    assert viewer.get('/api/users/search').status_code == 400
+
+def test_edit_distance_counts_transpositions():
+    assert skill_swap.edit_distance('djnago', 'django', 2) == 1
+    assert skill_swap.edit_distance('kitten', 'sitting', 5) == 3
+    assert skill_swap.edit_distance('abc', 'xyzuvw', 1) == 2
@@ -0,0 +1,61 @@
+import sqlite3
+
+from conftest import skill_swap
+
+def test_parse_skills_strips_and_drops_duplicates():
+    assert skill_swap.parse_skills(' Python, python ,,Go') == ['Python', 'Go']
+    assert skill_swap.parse_skills(['Go', 'GO', ' ']) == ['Go']
+    assert skill_swap.parse_skills(None) == []
+
+def test_profile_reads_normalized_skills(make_user, conn):
+    alice = make_user('Alice', skills_offered=['Python', 'SQL'], skills_wanted='Go')
+
+    profile = alice.get('/api/profile').get_json()
+    assert profile['skills_offered'] == ['Python', 'SQL']
+    assert profile['skills_wanted'] == ['Go']
+    rows = conn.execute('''
+        SELECT s.name, us.direction FROM user_skills us JOIN skills s ON s.id = us.skill_id
+        WHERE us.user_id = ? ORDER BY us.direction, us.position
+    ''', (alice.user_id,)).fetchall()
+    assert [tuple(row) for row in rows] == [('Python', 'offered'), ('SQL', 'offered'), ('Go', 'wanted')]
+
+def test_skills_are_shared_case_insensitively(make_user, conn):
+    make_user('Alice', skills_offered=['Python'])
+    make_user('Bob', skills_offered=['python'])
+
+    assert conn.execute("SELECT count(*) FROM skills WHERE name = 'PYTHON'").fetchone()[0] == 1
+
+def test_skill_filter_matches_whole_names(make_user):
+    viewer = make_user('Viewer')
+    make_user('Java', skills_offered=['Java'])
+    make_user('Script', skills_offered=['JavaScript'])
+
+    names = [user['name'] for user in viewer.get('/api/users?skill=java').get_json()]
+    assert names == ['Java']
+    assert viewer.get('/api/users?skill=Cobol').get_json() == []
+
+def test_profile_update_replaces_skills(make_user):
+    alice = make_user('Alice', skills_offered=['Python'])
+
+    response = alice.put('/api/profile', json={'name': 'Alice', 'skills_offered': ['Rust'], 'skills_wanted': []})
+    assert response.status_code == 200
+    assert alice.get('/api/profile').get_json()['skills_offered'] == ['Rust']
+
+def test_csv_skills_are_backfilled_on_upgrade(tmp_path, monkeypatch):
+    path = str(tmp_path / 'legacy.db')
+    legacy = sqlite3.connect(path)
+    skill_swap.migration_base_schema(legacy)
+    legacy.execute('''
+        INSERT INTO users (name, email, password_hash, skills_offered, skills_wanted)
+        VALUES ('Old', 'old@example.com', 'x', 'Python, Go', 'SQL')
+    ''')
+    legacy.commit()
+    legacy.close()
+
+    monkeypatch.setattr(skill_swap, 'DATABASE', path)
+    skill_swap.init_db()
+    conn = skill_swap.connect_db()
+    try:
+        assert skill_swap.get_user_skills(conn, [1]) == {1: {'offered': ['Python', 'Go'], 'wanted': ['SQL']}}
+    finally:
+        conn.close()
@@ -0,0 +1,41 @@
+from conftest import skill_swap
+
+def stats(admin):
+    response = admin.get('/api/admin/stats')
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_counters_follow_writes(make_user, admin, conn):
+    alice = make_user('Alice')
+    bob = make_user('Bob')
+    make_user('Hidden', is_public=False)
+    body = {'my_skill': 'Go', 'wanted_skill': 'Python'}
+    first = alice.post('/api/swap-requests', json=dict(body, to_user_id=bob.user_id)).get_json()['request_id']
+    bob.post('/api/swap-requests', json=dict(body, to_user_id=alice.user_id))
+    assert bob.put(f'/api/swap-requests/{first}', json={'status': 'accepted'}).status_code == 200
+
+    result = stats(admin)
+    assert (result['total_users'], result['active_users']) == (3, 2)
+    assert result['total_swaps'] == 2
+    assert result['pending_swaps'] == 1
+    assert result['swaps_by_status'] == {'accepted': 1, 'pending': 1}
+    [today] = result['swaps_by_day']
+    assert today['total'] == 2
+    assert today['by_status'] == {'accepted': 1, 'pending': 1}
+
+    assert alice.delete(f'/api/swap-requests/{first}').status_code == 200
+    assert admin.put(f'/api/admin/users/{bob.user_id}', json={'is_public': False}).status_code == 200
+    triggered = stats(admin)
+
+    skill_swap.rebuild_stats(conn)
+    conn.commit()
+    assert stats(admin) == triggered
+
+def test_admins_are_not_counted(admin):
+    result = stats(admin)
+    assert (result['total_users'], result['active_users'], result['total_swaps']) == (0, 0, 0)
+    assert result['swaps_by_day'] == []
+
+def test_days_must_be_an_integer(admin):
+    assert admin.get('/api/admin/stats?days=x').status_code == 400
+    assert admin.get('/api/admin/stats?days=0').status_code == 200
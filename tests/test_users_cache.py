@@ -0,0 +1,77 @@
+import pytest
+
+from conftest import counter, skill_swap
+
+def lookups(result):
+    return counter('skillswap_cache_lookups_total', cache='users', result=result)
+
+@pytest.fixture
+def viewer(make_user):
+    make_user('Alice', skills_offered=['Python'])
+    make_user('Bob', skills_offered=['Go'])
+    return make_user('Viewer')
+
+def test_pages_are_shared_and_exclude_the_caller(viewer, make_user):
+    other = make_user('Other')
+
+    assert [user['name'] for user in viewer.get('/api/users').get_json()] == ['Other', 'Bob', 'Alice', 'Admin']
+    assert [user['name'] for user in other.get('/api/users').get_json()] == ['Viewer', 'Bob', 'Alice', 'Admin']
+    assert (lookups('miss'), lookups('hit')) == (1, 1)
+
+def test_pages_keep_cursors_and_limits(viewer):
+    first = viewer.get('/api/users?limit=2')
+    assert [user['name'] for user in first.get_json()] == ['Bob', 'Alice']
+    cursor = first.headers['X-Next-Cursor']
+    second = viewer.get(f'/api/users?limit=2&cursor={cursor}')
+    assert [user['name'] for user in second.get_json()] == ['Admin']
+    assert 'X-Next-Cursor' not in second.headers
+
+def test_write_invalidates_only_matching_pages(viewer, make_user):
+    viewer.get('/api/users?skill=Python')
+    viewer.get('/api/users?skill=Go')
+
+    make_user('Carol', skills_offered=['Python'])
+    assert [user['name'] for user in viewer.get('/api/users?skill=Python').get_json()] == ['Carol', 'Alice']
+    assert [user['name'] for user in viewer.get('/api/users?skill=Go').get_json()] == ['Bob']
+    assert (lookups('miss'), lookups('hit')) == (3, 1)
+
+def test_write_from_another_process_invalidates(viewer, conn):
+    etag = viewer.get('/api/users').headers['ETag']
+
+    # Another worker process: its own cache instance, same database
+    elsewhere = skill_swap.ResultCache('users', skill_swap.MemoryCacheBackend(10, 60))
+    bob_id = conn.execute("SELECT id FROM users WHERE name = 'Bob'").fetchone()[0]
+    conn.execute("UPDATE users SET name = 'Robert' WHERE id = ?", (bob_id,))
+    elsewhere.invalidate(conn, skill_swap.user_listing_tags(conn, [bob_id]))
+    conn.commit()
+
+    response = viewer.get('/api/users', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'Robert' in [user['name'] for user in response.get_json()]
+
+def test_rolled_back_write_leaves_entries_valid(viewer, conn):
+    viewer.get('/api/users')
+    skill_swap.users_cache.invalidate(conn, {'browse'})
+    conn.rollback()
+
+    viewer.get('/api/users')
+    assert lookups('hit') == 1
+
+def test_async_mode_serves_the_same_cached_pages(viewer, async_client):
+    synced = viewer.get('/api/users?limit=2&fields=id,name')
+    client = async_client(viewer)
+    response = client.get('/api/users?limit=2&fields=id,name')
+
+    assert response.status_code == 200
+    assert response.json() == synced.get_json()
+    assert response.headers['X-Next-Cursor'] == synced.headers['X-Next-Cursor']
+    assert (lookups('miss'), lookups('hit')) == (1, 1)
+
+def test_sqlite_backend_round_trips_entries(tmp_path):
+    backend = skill_swap.SqliteCacheBackend(str(tmp_path / 'cache.db'), 2, 60)
+    for key in ('a', 'b', 'c'):
+        backend.set(key, [[1], [{'key': key}]])
+    assert backend.get('c') == [[1], [{'key': 'c'}]]
+    # Least recently used past maxsize is evicted
+    assert backend.get('a') is None